@@ -109,6 +109,7 @@ class muxpGUI:
         self.dsf_sceneryPack = "" #Name of the scenery Pack of dsf file to be processed
         self.conflictStrategy = "" #Strategy how to handle conflict with already existing updates in dsf-file
         self.activatePack = 1 #set to 1/True if after writing of updated dsf file user is queried to directly activate pack in scenery_Packs.ini
+        self.dsfCacheSize = 0 #size limit in MB of cache with decoded dsf files in folder dsf_cache next to config file; 0 for no cache
 
         self.button_selected = None  # keeps track of selected button in GUI
 
@@ -300,6 +301,15 @@ class muxpGUI:
             log.info("activatePack set to: {}".format(self.activatePack))
         else:
             self.activatePack = 0
+        if "dsfCacheSize" in c:
+            try:
+                self.dsfCacheSize = int(c['dsfCacheSize'])
+            except ValueError:
+                log.error("dsfCacheSize is not of type int; no cache used")
+                self.dsfCacheSize = 0
+            log.info("dsfCacheSize set to: {} MB".format(self.dsfCacheSize))
+        else:
+            self.dsfCacheSize = 0
         return 0 #no error
 
 
@@ -529,6 +539,8 @@ class muxpGUI:
             f.write("activatePack:  {}\n".format(self.activatePack))
             f.write("dsfSourcePack: {}\n".format(self.dsf_sceneryPack))
             f.write("conflictStrategy: {}\n".format(self.conflictStrategy))
+            if self.dsfCacheSize:
+                f.write("dsfCacheSize: {}\n".format(self.dsfCacheSize))
 
 
     def SelectDSF(self, scenery_packs):
@@ -951,7 +963,13 @@ class muxpGUI:
                 copy2(dsf_filename, dsf_output_filename + ".muxp.original")
         log.info("Loading dsf file {}".format(dsf_filename))
         self.current_action = "read"
-        self.dsf.read(dsf_filename)
+        meshonly = all(c["command"] != "update_network_levels" for c in update["commands"])  # other commands just change mesh, so objects, polygons and networks are only extracted when accessed
+        if self.dsfCacheSize:  # decoded values (e.g. decompressed atoms of 7z dsf files) are taken from cache when same file is read again
+            dsf_cache = XPLNEcache(path.join(path.dirname(path.abspath(self.runfile)), "dsf_cache"), self.dsfCacheSize << 20)
+        else:
+            dsf_cache = None
+        self.dsf.read(dsf_filename, memorymap=True, lazy=True, meshonly=meshonly, cache=dsf_cache)  # uncompressed dsf files are memory mapped without copying atoms, pools are decoded when accessed
+        log.info("Read metrics: {}".format(self.dsf.getMetrics(True)))  # time, bytes and counts per phase of reading
         
         ############## START PROCESSING MUXP FILE ON DSF FILE ################
         muxp_process_error = self.processMuxp(dsf_filename, update)  ### Returns return value of processing
@@ -992,6 +1010,8 @@ class muxpGUI:
             #   in that case, the backup-file should be kept in order to be able to test the latest update again
             #   and again without starting from scratch. HOWEVER: a previous current file will be LOST
             copy2(dsf_output_filename, dsf_output_filename+".muxp.backup")
+            if path.exists(dsf_output_filename + DSFINDEXEXTENSION):  # copy2 keeps modification time, so sidecar index still fits to backup
+                copy2(dsf_output_filename + DSFINDEXEXTENSION, dsf_output_filename + ".muxp.backup" + DSFINDEXEXTENSION)
         
         ############## CHECK WRITE LOCATION AND WRITE UPDATED DSF FILE ##################
         if dsf_filename.find("X-Plane 11 Global Scenery") >= 0: #X-Plane default scenery selected, so file need to be written to muxp Folder
@@ -1008,7 +1028,8 @@ class muxpGUI:
                 log.info("Created new 10grid folder in muxpfolder: {}".format(writefolder))
             #dsf_output_filename = writefolder + "/" + update["tile"] +".dsf" ## already set above
         log.info("Writing updated dsf file to: {}".format(dsf_output_filename))
-        self.dsf.write(dsf_output_filename)
+        self.dsf.write(dsf_output_filename, index=True)  # sidecar index of atoms is used by getDSFproperties in conflict checks and by read of next update
+        log.info("Write metrics: {}".format(self.dsf.getMetrics(True)))
 
         ################### SAVE USED MUXP FILE IN INSTALLED-MUXPS-FOLDER ##########
         installed_muxp_files_dir = self.muxpfolder + "/Installed MUXP Files"  ######## TBD: DEFINE DIR GLOBALLY #####
@@ -1119,7 +1140,7 @@ class muxpGUI:
             if c["command"] == "update_elevation_in_poly":
                 if c["elevation"] is not None:
                     log.info("Updating elevation to: {} in polygon: {}".format(c["elevation"], c["coordinates"]))
-                    for t in a.atrias: #go through all trias in area
+                    for t in a.atrias.near(c["coordinates"]): #go through all trias in area near polygon
                         for i, p in enumerate(t[0:3]): #all their points
                             if PointInPoly(p[0:2], c["coordinates"]):
                                 log.info("For tria memory id {}: with coords: {} set elevation from: {}  to: {}".format(hex(id(t[i])), t[i][0:2], t[i][2],  c["elevation"]))
@@ -1210,6 +1231,7 @@ class muxpGUI:
                                 if distance(self.dsf.V32[p[0]][p[1]][:2], elevp[:2]) < min_dist: #new minimum found
                                     min_dist = distance((self.dsf.V32[p[0]][p[1]][:2]), elevp[:2])
                                     self.dsf.V32[p[0]][p[1]][2] = elevp[2] # update elevation for network vertex
+                                    self.dsf.poolChanged(p[0], 32)  # vertex changed in place, so pool is encoded again
                             log.info("    Updated vertex pool {} id {} to: {}".format(p[0], p[1], self.dsf.V32[p[0]][p[1]]))
                 ##### TBD: kml-export with roads ###
                 
@@ -157,6 +157,9 @@ def kmlExport2(dsf, boundaries, extract, filename):
             f.write("</Folder>\n")
 
         ########### Export Trias per Patch ##############
+        vertices = [v for p_num in patchTrias for t in patchTrias[p_num] for v in t[:3]]  # vertices of all trias in order of export
+        elevs = dsf.getElevations([v[0] for v in vertices], [v[1] for v in vertices], [v[2] for v in vertices])  # 3rd Value is height from Vertex to be considered in case different from -32xxx
+        e = 0  # index of elevation of first vertex of next tria
         for p_num in patchTrias:
             p = dsf.Patches[p_num]
             if p.flag == 1:
@@ -194,10 +197,8 @@ def kmlExport2(dsf, boundaries, extract, filename):
                     upcoords += upxa
                     upi += 1                    
                 f.write("    <Placemark><name>T{} {}</name><styleUrl>#{}</styleUrl><Polygon><outerBoundaryIs><LinearRing><coordinates>\n".format(tcount, upcoords, style))  ##upcords NEW/Experimental
-                h = [] #stores heigth of vertices in triangles
-                h.append(int(dsf.getVertexElevation(t[0][0], t[0][1], t[0][2])))  #3rd Value is height from Vertex to be consideredn in case differnet from -32xxx
-                h.append(int(dsf.getVertexElevation(t[1][0], t[1][1], t[1][2])))
-                h.append(int(dsf.getVertexElevation(t[2][0], t[2][1], t[2][2])))
+                h = [int(elevs[e]), int(elevs[e + 1]), int(elevs[e + 2])] #stores heigth of vertices in triangles
+                e += 3
                 f.write("        {0},{1},{2} {3},{4},{5} {6},{7},{8} {0},{1},{2}\n".format(t[0][0], t[0][1], h[0], t[1][0], t[1][1], h[1], t[2][0], t[2][1], h[2]))
                 f.write("    </coordinates></LinearRing></outerBoundaryIs></Polygon></Placemark>\n")
                 tcount += 1
@@ -26,19 +26,274 @@ from xplnedsf2 import *
 from logging import getLogger
 from muxp_math import *
 from copy import deepcopy
-from math import acos
+from math import acos, floor
+from bisect import bisect_left
 from obj_ex_import import *
-    
+
+
+class muxpTrias(list):
+    """
+    List of area trias (see muxpArea.atrias) with a spatial index: a uniform grid of the bounding boxes of the trias
+    and a table of their vertex coordinates (rounded to 7 decimals).
+    The index is updated when trias are appended or removed, so that trias near points, segments or polygons
+    and vertices at coordinates are found without going through all trias of the area.
+    Found trias and vertices are returned in the order of the list.
+    Vertices are still stored in each tria. When x or y of vertices is changed in place, update() or refresh() is required.
+    Each tria keeps its sequence number as id while it is in the list. Trias to be removed are marked with discard()
+    and then removed all together with compact(), which avoids a search in the list for each removed tria.
+    """
+    def __init__(self, trias=(), cellsize=0.002, margin=0.00001, tolerance=0.001):
+        list.__init__(self)
+        self.cellsize = cellsize  # width and height of grid cells in degrees
+        self.margin = margin  # bounding boxes are extended by margin, as coordinates of vertices might still be matched slightly
+        self.tolerance = tolerance  # bounding boxes are also extended relative to their size, to find points on trias with tolerance
+        self.clear()
+        self.extend(trias)
+
+    def _cellRange_(self, minx, maxx, miny, maxy):  # returns indices of grid cells (x_min, x_max, y_min, y_max) covered by rectangle
+        return floor(minx / self.cellsize), floor(maxx / self.cellsize), floor(miny / self.cellsize), floor(maxy / self.cellsize)
+
+    def _index_(self, t, seq=None):  # adds tria t to index and returns its sequence number; new number if seq is None
+        if seq is None:
+            seq = self._next_
+            self._next_ += 1
+        xs, ys = (t[0][0], t[1][0], t[2][0]), (t[0][1], t[1][1], t[2][1])
+        ext = self.margin + self.tolerance * (max(xs) - min(xs) + max(ys) - min(ys))
+        cells = self._cellRange_(min(xs) - ext, max(xs) + ext, min(ys) - ext, max(ys) + ext)
+        keys = [(round(v[0], 7), round(v[1], 7)) for v in t[:3]]  # coordinates rounded to range of cm
+        self._entries_[seq] = cells, t, keys
+        self._ids_.setdefault(id(t), set()).add(seq)
+        for k in range(3):
+            self._vertices_.setdefault(keys[k], {}).setdefault(seq, []).append(k)
+            if keys[k] == keys[(k + 1) % 3]:
+                self._flat_.add(seq)
+        if (cells[1] - cells[0] + 1) * (cells[3] - cells[2] + 1) > 64:  # very large trias are not stored in all their cells
+            self._large_[seq] = t
+            return seq
+        for x in range(cells[0], cells[1] + 1):
+            for y in range(cells[2], cells[3] + 1):
+                self._grid_.setdefault((x, y), {})[seq] = t
+        return seq
+
+    def _unindex_(self, seq):  # removes tria with sequence number seq from index
+        cells, t, keys = self._entries_.pop(seq)
+        self._ids_[id(t)].discard(seq)
+        if not self._ids_[id(t)]:
+            del self._ids_[id(t)]
+        for key in keys:
+            if key in self._vertices_:  # might be removed already for same key at other vertex
+                self._vertices_[key].pop(seq, None)
+                if not self._vertices_[key]:
+                    del self._vertices_[key]
+        self._flat_.discard(seq)
+        if self._large_.pop(seq, None) is not None:
+            return
+        for x in range(cells[0], cells[1] + 1):
+            for y in range(cells[2], cells[3] + 1):
+                cell = self._grid_[(x, y)]
+                del cell[seq]
+                if not cell:
+                    del self._grid_[(x, y)]
+
+    def update(self, i):
+        """
+        Updates the index for tria at index i in list, required if its vertices were changed, moved or swapped.
+        """
+        seq = self._seqs_[i]
+        self._unindex_(seq)
+        self._index_(self[i], seq)
+
+    def refresh(self):
+        """
+        Updates the index for all trias with vertices moved in place since they were added or updated. Ids of trias are kept.
+        """
+        for i, seq in enumerate(self._seqs_):
+            if seq not in self._dead_ and [(round(v[0], 7), round(v[1], 7)) for v in self[i][:3]] != self._entries_[seq][2]:
+                self._unindex_(seq)
+                self._index_(self[i], seq)
+
+    def reindex(self):
+        """
+        Builds the index again, required if coordinates of vertices were moved after their trias were added.
+        """
+        self.compact()
+        trias = list(self)
+        self.clear()
+        self.extend(trias)
+
+    def _nearSeqs_(self, points):  # returns ascending sequence numbers of trias with bounding box in grid cells of rectangle around points
+        x0, x1, y0, y1 = self._cellRange_(min(p[0] for p in points), max(p[0] for p in points), min(p[1] for p in points), max(p[1] for p in points))
+        seqs = set()
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self._grid_):  # fewer cells are filled than in rectangle
+            for (x, y), cell in self._grid_.items():
+                if x0 <= x <= x1 and y0 <= y <= y1:
+                    seqs.update(cell)
+        else:
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    if (x, y) in self._grid_:
+                        seqs.update(self._grid_[(x, y)])
+        for seq in self._large_:
+            cells = self._entries_[seq][0]
+            if cells[0] <= x1 and cells[1] >= x0 and cells[2] <= y1 and cells[3] >= y0:
+                seqs.add(seq)
+        return sorted(seqs)
+
+    def near(self, points):
+        """
+        Returns list of trias that might intersect the bounding rectangle of points (list of [x, y]) in the order of the list.
+        All trias intersecting the rectangle are included, also trias with points within tolerance (relative to their size) to it.
+        """
+        return [self._entries_[seq][1] for seq in self._nearSeqs_(points)]
+
+    def nearIndices(self, points):
+        """
+        Returns ascending indices to trias in list that might intersect the bounding rectangle of points, see near().
+        """
+        return self.indicesOf(self._nearSeqs_(points))
+
+    def idAt(self, i):
+        """
+        Returns id (sequence number) of tria at index i in list.
+        """
+        return self._seqs_[i]
+
+    def indicesOf(self, ids):
+        """
+        Returns list of indices in list for trias with given ids, which must be in the list (and not marked by discard()).
+        """
+        return [bisect_left(self._seqs_, seq) for seq in ids]
+
+    def _vertexRefs_(self, keys):  # returns sorted list of (sequence number, vertex number, key) for all vertices at keys
+        refs = []
+        for key in set(keys):
+            for seq, positions in self._vertices_.get(key, {}).items():
+                refs.extend((seq, k, key) for k in positions)
+        refs.sort()
+        return refs
+
+    def verticesAtCoords(self, coords):
+        """
+        Returns list of all vertices of trias with same coordinates (rounded to 7 decimals) as in list of coords (list of [x,y]).
+        Vertices are listed in order of their trias, vertices used by several trias are listed several times.
+        """
+        return [self._entries_[seq][1][k] for seq, k, _ in self._vertexRefs_((round(c[0], 7), round(c[1], 7)) for c in coords)]
+
+    def vertexGroups(self):
+        """
+        Yields for all coordinates (rounded to 7 decimals) with vertices these coordinates and list of vertices at them.
+        """
+        for key in list(self._vertices_):
+            yield key, [self._entries_[seq][1][k] for seq, k, _ in self._vertexRefs_([key])]
+
+    def coordKeys(self, i):
+        """
+        Returns coordinates of the vertices of tria at index i in list, rounded to 7 decimals as in the index.
+        """
+        return self._entries_[self._seqs_[i]][2]
+
+    def flatTrias(self):
+        """
+        Returns list of trias with two vertices at same coordinates (rounded to 7 decimals) in order of the list.
+        """
+        return [self._entries_[seq][1] for seq in sorted(self._flat_)]
+
+    def discard(self, t):
+        """
+        Marks tria t (the tria itself, not an equal one) as removed and takes it out of the index in constant time.
+        Returns False if t is not in the list or already marked. Marked trias stay in the list until compact() is called.
+        """
+        seqs = self._ids_.get(id(t))
+        if not seqs:
+            return False
+        seq = min(seqs)
+        self._unindex_(seq)
+        self._dead_.add(seq)
+        return True
+
+    def compact(self):
+        """
+        Removes all trias marked by discard() from the list in one pass. Order and ids of the remaining trias are kept.
+        """
+        if not self._dead_:
+            return
+        kept = [(seq, t) for seq, t in zip(self._seqs_, self) if seq not in self._dead_]
+        list.__setitem__(self, slice(None), [t for seq, t in kept])
+        self._seqs_ = [seq for seq, t in kept]
+        self._dead_ = set()
+
+    def append(self, t):
+        list.append(self, t)
+        self._seqs_.append(self._index_(t))
+
+    def extend(self, trias):
+        for t in trias:
+            self.append(t)
+
+    def __iadd__(self, trias):
+        self.extend(trias)
+        return self
+
+    def remove(self, t):  # removes first tria equal to t, raises ValueError if there is none
+        del self[self.index(t)]
+
+    def pop(self, i=-1):
+        t = self[i]
+        del self[i]
+        return t
+
+    def __delitem__(self, i):
+        for seq in (self._seqs_[i] if isinstance(i, slice) else [self._seqs_[i]]):
+            if seq in self._dead_:  # already removed from index by discard()
+                self._dead_.discard(seq)
+            else:
+                self._unindex_(seq)
+        del self._seqs_[i]
+        list.__delitem__(self, i)
+
+    def clear(self):
+        list.clear(self)
+        self._grid_ = {}  # for each grid cell (x, y) dictionary of trias in that cell with their sequence numbers as keys
+        self._large_ = {}  # trias covering too many cells to be stored in grid with their sequence numbers as keys
+        self._entries_ = {}  # for each sequence number range of cells covered by bounding box of tria, tria itself and rounded coordinates of its vertices
+        self._vertices_ = {}  # for rounded coordinates (x, y) dictionary with vertex numbers in trias at them by sequence number of tria
+        self._flat_ = set()  # sequence numbers of trias with two vertices at same rounded coordinates
+        self._ids_ = {}  # for id() of each tria object the sequence numbers under which it is in list
+        self._dead_ = set()  # sequence numbers of trias marked by discard(), still to be removed from list by compact()
+        self._seqs_ = []  # sequence number for tria at same position in list; ascending as trias are only appended
+        self._next_ = 0  # sequence number for next tria added
+
+    def __setitem__(self, i, t):  # changing order of trias requires to build the index again
+        list.__setitem__(self, i, t)
+        self.reindex()
+
+    def insert(self, i, t):
+        list.insert(self, i, t)
+        self.reindex()
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self.reindex()
+
+    def reverse(self):
+        list.reverse(self)
+        self.reindex()
+
+    def __reduce_ex__(self, protocol):  # copies and pickles are plain lists of trias
+        return list, (list(self),)
+
+
 class muxpArea:
     
     def __init__(self, dsf, logname):
         self.dsf = dsf #dsf from which area is extracted
         self.log = getLogger(logname + "." + __name__) #logging based on pre-defined logname
         self.apatches = set() #set of patches that are relevant for that area
-        self.atrias = [] #area as array, of triangles where
+        self.atrias = muxpTrias() #area as array, of triangles where
                   # [0 - 2] list of all coordinates of tria vertices including s/t ##### ONLY REFERENCE NO DEEPCOPY / BETTER JUST DEEPCOPY of x,y corrds ?????
                   # [3 - 5] list of pool and vertex id in pool in dsf -- they stay even, if coordinates are changed or trias split; allows reference to original trias/values/scaling
                   # [6] index to patch tria was in dsf
+                  # trias near coordinates are found via grid index of muxpTrias
         self.elevation_scalings = dict()  # dictionary of scalings for elevation relevant in that area; pair of (factor, base) are keys in dict and value is number of patch for which it exists
         self.elev_factor_min, self.elev_base_min = (999999, 999999)  # minimum values in existing mesh used for defining according new pools in update
 
@@ -50,36 +305,43 @@ class muxpArea:
         """
         self.log.info("Extracting area latS: {}, latN: {}, lonW: {}, lonE:{} from dsf.".format(latS, latN, lonW, lonE))
         triaCount = 0 #counts all trias in dsf
-        for p in self.dsf.Patches:
-            trias = p.triangles()
-            tremoved = [] #trias that should be removed
-            for t in trias:
-                # get for each tria the bounding rectangle in miny, maxy, minx, maxxx
-                minx = min(self.dsf.V[t[0][0]][t[0][1]][0], self.dsf.V[t[1][0]][t[1][1]][0], self.dsf.V[t[2][0]][t[2][1]][0])
-                maxx = max(self.dsf.V[t[0][0]][t[0][1]][0], self.dsf.V[t[1][0]][t[1][1]][0], self.dsf.V[t[2][0]][t[2][1]][0])
-                miny = min(self.dsf.V[t[0][0]][t[0][1]][1], self.dsf.V[t[1][0]][t[1][1]][1], self.dsf.V[t[2][0]][t[2][1]][1])
-                maxy = max(self.dsf.V[t[0][0]][t[0][1]][1], self.dsf.V[t[1][0]][t[1][1]][1], self.dsf.V[t[2][0]][t[2][1]][1])
-                #now check if bounding rectangle of tria intersects with area
-                if not (minx < lonW and maxx < lonW): #x-range of box is not completeley West of area     
-                    if not (minx > lonE and maxx > lonE): #x-range of box is not completele East of area
-                        if not (miny < latS and maxy < latS): #y-range is not completele South of area
-                            if not (miny > latN and maxy > latN): #y-range is not conmpletele North of ares
-                                ### NEW 15.08.20: DEEPCOPY 2 LINES BELOW TO HAVE REALLY UNIQUE VERTICES NOT RELATING TO SAME IN DSF !!!
-                                self.atrias.append([deepcopy(self.dsf.V[t[0][0]][t[0][1]]), deepcopy(self.dsf.V[t[1][0]][t[1][1]]), deepcopy(self.dsf.V[t[2][0]][t[2][1]])])
-                                self.atrias[-1].extend(deepcopy(t))  #so we have an intersection of tria box with area and append the tria
-                                self.atrias[-1].append(self.dsf.Patches.index(p))
-                                current_patch_index = self.dsf.Patches.index(p)
-                                self.apatches.add(current_patch_index)
-                                ### self.log.info("Scaling: {}   just multiplier: {}".format(self.dsf.Scalings[t[0][0]], self.dsf.Scalings[t[0][0]][0]))
-                                self.elevation_scalings[(self.dsf.Scalings[t[0][0]][2][0], self.dsf.Scalings[t[0][0]][2][1])] = current_patch_index
-                                self.elevation_scalings[(self.dsf.Scalings[t[1][0]][2][0], self.dsf.Scalings[t[1][0]][2][1])] = current_patch_index
-                                self.elevation_scalings[(self.dsf.Scalings[t[2][0]][2][0], self.dsf.Scalings[t[2][0]][2][1])] = current_patch_index
-                                tremoved.append(t)
-                                self.log.debug("Tria {} with latS: {}  latN: {}  lonW: {} and lonE: {} in area.".format(t, miny, maxy, minx, maxx))
-                triaCount += 1
-            for t in tremoved:
-                trias.remove(t)
-            p.trias2cmds(trias) #updates dsf patch with trias not including removed ones
+        poolBounds = self.dsf.getPoolBounds() #trias can only be in area if bounds of their pools are; other pools are not decoded when dsf was read lazy
+        areaPools = set(p for p, b in enumerate(poolBounds) if b is None or not (b[1] < lonW or b[0] > lonE or b[3] < latS or b[2] > latN))
+        if NUMPYINSTALLED: #bounding rectangles of all trias are checked at once, only trias in area are copied
+            for patch_index, (triaArray, inArea) in enumerate(self._areaTriaMasks_(latS, latN, lonW, lonE, poolBounds, areaPools)):
+                triaCount += len(triaArray)
+                if not inArea.any(): #patches without trias in area keep their commands (and cached triangle array)
+                    continue
+                for t in triaArray[inArea].tolist():
+                    self._appendDsfTria_(t, patch_index)
+                self.dsf.Patches[patch_index].trias2cmds(triaArray[~inArea]) #updates dsf patch with trias not including removed ones
+        else:
+            for patch_index, p in enumerate(self.dsf.Patches):
+                trias = p.triangles()
+                tkept = [] #trias that remain in patch, others are moved to area
+                for t in trias:
+                    triaCount += 1
+                    if t[0][0] not in areaPools and t[1][0] not in areaPools and t[2][0] not in areaPools: #check if tria with vertices from different pools lies between their bounds
+                        b = [poolBounds[t[0][0]], poolBounds[t[1][0]], poolBounds[t[2][0]]]
+                        if max(b[0][1], b[1][1], b[2][1]) < lonW or min(b[0][0], b[1][0], b[2][0]) > lonE or max(b[0][3], b[1][3], b[2][3]) < latS or min(b[0][2], b[1][2], b[2][2]) > latN:
+                            tkept.append(t)
+                            continue
+                    # get for each tria the bounding rectangle in miny, maxy, minx, maxxx
+                    minx = min(self.dsf.V[t[0][0]][t[0][1]][0], self.dsf.V[t[1][0]][t[1][1]][0], self.dsf.V[t[2][0]][t[2][1]][0])
+                    maxx = max(self.dsf.V[t[0][0]][t[0][1]][0], self.dsf.V[t[1][0]][t[1][1]][0], self.dsf.V[t[2][0]][t[2][1]][0])
+                    miny = min(self.dsf.V[t[0][0]][t[0][1]][1], self.dsf.V[t[1][0]][t[1][1]][1], self.dsf.V[t[2][0]][t[2][1]][1])
+                    maxy = max(self.dsf.V[t[0][0]][t[0][1]][1], self.dsf.V[t[1][0]][t[1][1]][1], self.dsf.V[t[2][0]][t[2][1]][1])
+                    #now check if bounding rectangle of tria intersects with area
+                    if not (minx < lonW and maxx < lonW): #x-range of box is not completeley West of area
+                        if not (minx > lonE and maxx > lonE): #x-range of box is not completele East of area
+                            if not (miny < latS and maxy < latS): #y-range is not completele South of area
+                                if not (miny > latN and maxy > latN): #y-range is not conmpletele North of ares
+                                    self._appendDsfTria_(t, patch_index) #so we have an intersection of tria box with area and append the tria
+                                    self.log.debug("Tria {} with latS: {}  latN: {}  lonW: {} and lonE: {} in area.".format(t, miny, maxy, minx, maxx))
+                                    continue
+                    tkept.append(t)
+                if len(tkept) < len(trias): #patches without trias in area keep their commands (and cached triangle array)
+                    p.trias2cmds(tkept) #updates dsf patch with trias not including removed ones
         self.log.info("  ... dsf has {} trias and {} trias from {} different patches are now in the extracted area.".format(triaCount, len(self.atrias), len(self.apatches)))
         self.elev_factor_min, self.elev_base_min = (999999, 999999)  # start with high numbers for searching for min
         for e in self.elevation_scalings.keys():
@@ -90,6 +352,45 @@ class muxpArea:
         return
     
     
+    def _appendDsfTria_(self, t, patch_index):  # appends tria t (pairs of pool and vertex index) of dsf patch with patch_index to area trias
+        ### NEW 15.08.20: COPIES OF VERTICES TO HAVE REALLY UNIQUE VERTICES NOT RELATING TO SAME IN DSF !!!
+        self.atrias.append([self.dsf.V[t[0][0]][t[0][1]][:], self.dsf.V[t[1][0]][t[1][1]][:], self.dsf.V[t[2][0]][t[2][1]][:],
+                            t[0][:], t[1][:], t[2][:], patch_index])
+        self.apatches.add(patch_index)
+        ### self.log.info("Scaling: {}   just multiplier: {}".format(self.dsf.Scalings[t[0][0]], self.dsf.Scalings[t[0][0]][0]))
+        for v in t:
+            self.elevation_scalings[(self.dsf.Scalings[v[0]][2][0], self.dsf.Scalings[v[0]][2][1])] = patch_index
+
+    def _areaTriaMasks_(self, latS, latN, lonW, lonE, poolBounds, areaPools):
+        """
+        Returns for each patch of dsf its triangle array and a boolean mask for the trias with bounding rectangle intersecting the area.
+        Bounding rectangles are computed with numpy for the trias of all patches at once (requires numpy).
+        Coordinates are only taken from pools of trias that might lie in area according to poolBounds.
+        """
+        arrays = [p.triangleArray() for p in self.dsf.Patches]
+        if not arrays:
+            return []
+        trias = np.concatenate(arrays)
+        pools = trias[:, :, 0]
+        candidates = np.isin(pools, list(areaPools)).any(axis=1)  # trias with vertices from pools in area
+        others = np.flatnonzero(~candidates)  # check if tria with vertices from different pools lies between their bounds
+        if len(others):
+            bounds = np.array([[np.nan] * 4 if b is None else b for b in poolBounds], np.float64)[pools[others]]
+            candidates[others] = ~((bounds[:, :, 1].max(axis=1) < lonW) | (bounds[:, :, 0].min(axis=1) > lonE) |
+                                   (bounds[:, :, 3].max(axis=1) < latS) | (bounds[:, :, 2].min(axis=1) > latN))
+        inArea = np.zeros(len(trias), bool)
+        candidates = np.flatnonzero(candidates)
+        if len(candidates):
+            used = np.unique(pools[candidates])
+            coords = [np.array([v[:2] for v in self.dsf.V[p]], np.float64).reshape(-1, 2) for p in used]  # x, y of vertices in used pools
+            lengths = np.array([len(c) for c in coords], np.int64)
+            first = np.zeros(used[-1] + 1, np.int64)  # index of first vertex of used pools in concatenated coords
+            first[used] = np.cumsum(lengths) - lengths
+            c = np.concatenate(coords)[first[pools[candidates]] + trias[candidates, :, 1]]  # coordinates of vertices of candidates
+            inArea[candidates] = ((c[:, :, 0].max(axis=1) >= lonW) & (c[:, :, 0].min(axis=1) <= lonE) &
+                                  (c[:, :, 1].max(axis=1) >= latS) & (c[:, :, 1].min(axis=1) <= latN))
+        return list(zip(arrays, np.split(inArea, np.cumsum([len(a) for a in arrays])[:-1])))
+
     def insertMeshArea(self):
         """
         Insert mesh area in dsf again from which it was extracted.
@@ -104,9 +405,13 @@ class muxpArea:
                 patchTrias[t[6]] = [ [t[3], t[4], t[5]] ]
         for p in patchTrias:
             self.log.info("For patch no. {} trias will be added: {}".format(p, patchTrias[p]))
-            dsftrias = self.dsf.Patches[p].triangles()
-            dsftrias.extend(patchTrias[p])
-            self.dsf.Patches[p].trias2cmds(dsftrias)
+            if NUMPYINSTALLED: #as array the trias stay cached in patch
+                dsftrias = np.concatenate((self.dsf.Patches[p].triangleArray(), np.array(patchTrias[p], np.int32).reshape(-1, 3, 2)))
+            else:
+                dsftrias = self.dsf.Patches[p].triangles()
+                dsftrias.extend(patchTrias[p])
+            size = self.dsf.Patches[p].trias2cmds(dsftrias)
+            self.log.info("  ... commands of patch no. {} are now encoded in {} bytes.".format(p, size))
 
     def validate_mesh(self):
         """
@@ -118,26 +423,16 @@ class muxpArea:
             if not IsClockwise([t[0][:2], t[1][:2], t[2][:2]]):
                 self.log.warning("Tria {} is anticlockwise and will be set to clockwise now.".format(t))
                 self.atrias[nt][0], self.atrias[nt][2] = self.atrias[nt][2],  self.atrias[nt][0]
+                self.atrias.update(nt)  # vertices changed their position in tria
         # Checking different elevations for same coords
         ############## TBD: SHOULD THIS NOT BE DONE WHEN MATCHING THEM FOR CONVERSION TO DSF #####################
         different_elevations = 0  # assume no differences exist
-        cdict = {}  # set up dictionary with all coords, value is list with max. elevation at first element and
-        # indices-tuples (nt, nv) to all vertices at this coordinates as following elements
-        for nt, t in enumerate(self.atrias):
-            for nv, v in enumerate(t[:3]):
-                if (round(v[0], 7), round(v[1], 7)) in cdict:
-                    current_max_elevation = cdict[(round(v[0], 7), round(v[1], 7))][0]
-                    if v[2] < current_max_elevation:
-                        self.atrias[nt][nv][2] = current_max_elevation
-                        different_elevations += 1
-                    elif v[2] > current_max_elevation:  # current elevation is highest
-                        cdict[(round(v[0], 7), round(v[1], 7))][0] = v[2]
-                        for index_tuple in cdict[(round(v[0], 7), round(v[1], 7))][1:]:  # adapt all previous vertices
-                            self.atrias[index_tuple[0]][index_tuple[1]][2] = v[2]
-                        different_elevations += 1
-                    cdict[(round(v[0], 7), round(v[1], 7))].append((nt, nv))
-                else:
-                    cdict[(round(v[0], 7), round(v[1], 7))] = [v[2], (nt, nv)]  # set elevation and index for these coordinates
+        for coords, vertices in self.atrias.vertexGroups():  # vertices at same coords are taken from index of area trias
+            max_elevation = max(v[2] for v in vertices)
+            for v in vertices:
+                if v[2] != max_elevation:
+                    v[2] = max_elevation
+                    different_elevations += 1
         if different_elevations:
             self.log.warning("{} DIFFERING ELEVATIONS at vertices found; updated to max. elevation found at each coordinates".format(different_elevations))
             #### tbd to set always on the same value in area, e.g. always highest found  ####
@@ -152,15 +447,7 @@ class muxpArea:
         Returns all vertices that have same lon/lat coordinates as given in list of coords (list of [x,y])
         """
         self.log.info("Searching vertices for coords: {}".format(coords))
-        cdict = {}  #set up dictonary with all coords o to find additional in area with same coords
-        vertices = [] #list of vertices 
-        for c in coords:
-            cdict[(round(c[0], 7), round(c[1], 7))] = True  # coords round to range of cm
-        for t in self.atrias:
-            for v in t[:3]:
-                self.log.debug("Checking vertex: ({}, {})".format(round(v[0],7), round(v[1],7)))
-                if (round(v[0], 7), round(v[1], 7)) in cdict:
-                    vertices.append(v)  # add tuple of vertex at coords to make sure to get all vertices at the coords
+        vertices = self.atrias.verticesAtCoords(coords)  # coords round to range of cm; all vertices at the coords are found via index of area trias
         self.log.info("{} vertices on {} coords found.".format(len(vertices), len(coords)))
         return vertices    #returns set of all vertices which ar on coords
 
@@ -184,43 +471,35 @@ class muxpArea:
             for c in coords:
                 cdict[(round(c[0], 7), round(c[1], 7))] = c[2]  # This is the elevation that shall all vertices at rounded (cm) coords receive
         self.log.info("Unique elevation has been retrieved for trias and is is set to: {}".format(cdict))
-        for t in self.atrias:
-            for v in t[:3]:
-                self.log.debug("Checking vertex: ({}, {})".format(round(v[0], 7), round(v[1], 7)))
-                if (round(v[0], 7), round(v[1], 7)) in cdict:
-                    old_elev = v[2]
-                    v[2] = cdict[(round(v[0], 7), round(v[1], 7))]
-                    self.log.info("  Setting at: {} unique elevation from: {} to: {}".format(v[:2], old_elev, v[2]))
-                    vertices += 1
+        for v in self.atrias.verticesAtCoords(cdict.keys()):  # just vertices at the coords from index of area trias
+            if (round(v[0], 7), round(v[1], 7)) in cdict:
+                old_elev = v[2]
+                v[2] = cdict[(round(v[0], 7), round(v[1], 7))]
+                self.log.info("  Setting at: {} unique elevation from: {} to: {}".format(v[:2], old_elev, v[2]))
+                vertices += 1
         self.log.info("{} vertices on {} coords set to unique elevation".format(vertices, len(coords)))
 
     def remove_flat_triangles(self):
         """
         Removes all area triangles that have no inside area i.e. two vertices are identical
         """
-        removed_triangles = []
-        for t in self.atrias:
-            for v in range(3):
-                if (round(t[v][0], 7), round(t[v][1], 7)) == (round(t[(v+1)%3][0], 7), round(t[(v+1)%3][1], 7)):
-                    removed_triangles.append(t)
-                    break  # NEW 8.2.2021: to avoid to add t several times in case tria is one point
+        removed_triangles = self.atrias.flatTrias()  # index of area trias knows trias with two vertices at same rounded coords
         for t in removed_triangles:
             self.log.info("Flat triangle {} is removed".format(t))
-            self.atrias.remove(t)
+            self.atrias.discard(t)
+        self.atrias.compact()
 
     def mesh_elevation(self, p, epsilon=0.0001):
         """
         Returns elevation of a point = (x, y) in meters calculated based on it's position within the mesh.
         epsilon is the allowed tolerance in percent to count p inside tria, default is 0.01 percent
         """
-        for t in self.atrias:
+        for t in (self.atrias.near([p]) if epsilon <= self.atrias.tolerance else self.atrias):  # trias near p include those within tolerance
             a, b = PointLocationInTria(p, [t[0][:2], t[1][:2], t[2][:2]])
             c = 1 - a - b
             if -epsilon <= a <= 1 + epsilon and -epsilon <= b <= 1 + epsilon and -epsilon <= c <= 1 + epsilon:  # means p is inside t
                 if t[0][2] < -32767 or t[1][2] < -32767 or t[2][2] < -32767:  # we have raster elevation at a vertex
-                    elev = []
-                    for i in range(3):
-                        elev.append(self.dsf.getVertexElevation(t[i][0], t[i][1]))
+                    elev = self.dsf.getElevations([t[i][0] for i in range(3)], [t[i][1] for i in range(3)])
                     return elev[2] + a * (elev[0] - elev[2]) + b * (elev[1] - elev[2])
                 else:  # no raster elevation
                     return t[2][2] + a * (t[0][2] - t[2][2]) + b * (t[1][2] - t[2][2])
@@ -452,7 +731,7 @@ class muxpArea:
         if not IsClockwise(p):
             self.log.warning("Polygon is not clockwise --> it is reversed!!!")
             p.reverse()
-        for t in self.atrias: #go through all trias in area
+        for t in self.atrias.near(p): #go through all trias in area that might intersect p, others are not changed
             tria = [t[0][0:2], t[1][0:2], t[2][0:2]]
             o, i, b = [], [], [] #need to be reset, in case p was lying completely inside a privous tria  
             shifts = 0 #counting how many shifts for next vertex in p have been performed ot find vertex outside tria as starting point
@@ -545,10 +824,9 @@ class muxpArea:
             #### tbd: adapt elevation for all trias (only outer if p own mesh) and create for inner trias new terrain patches if terrain given
         for ot in old_trias: #and remove old ones
             self.log.info("Following Tria is removed: {}".format(ot))
-            try: #as we might cross same tria several times there might several removals for same tria
-                self.atrias.remove(ot)
-            except ValueError:
+            if not self.atrias.discard(ot): #as we might cross same tria several times there might several removals for same tria
                 self.log.info("   was already removed...")
+        self.atrias.compact() #removed trias are now deleted from list in one go
         
         ########### TBD: Better set elevation outside, to also distinguish there for profile elevation ... #######################
         if elev != None: #Adapt elevevation of border vertices
@@ -579,7 +857,7 @@ class muxpArea:
         cPs = [] #functions returns a list of vertices that are lying on intersection line v to w (either created or used within accuracy)
         new_trias = [] #trias to be added when cutting in patch
         old_trias = [] #old trias to be removed when cutting in patch
-        for t in self.atrias: #go through all trias in area
+        for t in self.atrias.near([v, w]): #go through all trias in area that might intersect segment
             iv = [] #list of intersection vertices between line vw and edges of triangle t, could be between 0 and 3
             for edge in range(3): # go through edges of tria by index numbers
                 cuttingPoint = intersection(v, w, t[edge][0:2], t[(edge+1)%3][0:2]) # modulo 3 returns to first vertex to close tria
@@ -623,7 +901,8 @@ class muxpArea:
         for nt in new_trias:
             self.atrias.append(nt) #update area trias by appending new trias
         for ot in old_trias:
-            self.atrias.remove(ot) #update area trias by by removing trias that are replaced by new ones
+            self.atrias.discard(ot) #update area trias by by removing trias that are replaced by new ones
+        self.atrias.compact()
         self.log.info("  ... this cut returned {} cutting points.".format(len(cPs)))
         return cPs
     
@@ -633,19 +912,24 @@ class muxpArea:
         """
         self.log.info("Searching all trias in area in/intersecting poly: {}".format(poly))
         s = set()
-        for t_index in range(len(self.atrias)):
-            t = self.atrias[t_index]
-            for i in range(3):  # 3 sides of triangle
-                for j in range(len(poly) - 1):  # sides of poly
-                    if intersection(t[i], t[(i+1)%3], poly[j], poly[j + 1]):  # current triangle intersects with an poly line
-                        s.add(t_index) 
-            if PointInPoly(t[0],poly):  # Check also that not complete Tria lies in poly by checking for first vertex of Tria
-                s.add(t_index)  
-            if isPointInTria(poly[0], t):  # Check also that not complete poly lies in current tria by checking for first vertex of poly
-                s.add(t_index) 
+        for t_index in self.atrias.nearIndices(poly):  # only trias with bounding box intersecting the one of poly need to be checked
+            if self.isTriaInPoly(self.atrias[t_index], poly):
+                s.add(t_index)
         self.log.info("   ... {} trias of area found that belong to mesh triangles intersecting or within boundary.".format(len(s)))
         return s
 
+    def isTriaInPoly(self, t, poly):
+        """
+        Returns True if tria t is intersecting or completely within poly, or poly lies completely in t.
+        """
+        for i in range(3):  # 3 sides of triangle
+            for j in range(len(poly) - 1):  # sides of poly
+                if intersection(t[i], t[(i+1)%3], poly[j], poly[j + 1]):  # current triangle intersects with an poly line
+                    return True
+        if PointInPoly(t[0],poly):  # Check also that not complete Tria lies in poly by checking for first vertex of Tria
+            return True
+        return bool(isPointInTria(poly[0], t))  # Check also that not complete poly lies in current tria by checking for first vertex of poly
+
     def ensureClockwiseTria(self, tria):
         """
         Checks if vertices of tria (in form of self.atria) is clockwise.
@@ -668,9 +952,7 @@ class muxpArea:
         else:
             tria_indeces = self.triasInPoly(poly)
         for tx in tria_indeces:
-            p = [] #list of points in tria
-            for i in range(3): #get points of tria in p
-                p.append( ( round(self.atrias[tx][i][0],7), round(self.atrias[tx][i][1],7)) )
+            p = self.atrias.coordKeys(tx) #list of points in tria, rounded in index of area trias
             for i in range(3): #go through edges
                 if (p[i][0], p[i][1], p[(i+1)%3][0], p[(i+1)%3][1]) in edges:
                     edges[ (p[i][0], p[i][1], p[(i+1)%3][0], p[(i+1)%3][1]) ].append([tx, i])
@@ -748,61 +1030,83 @@ class muxpArea:
         ######################### has same elevation in both trias ----> Solve when creating dsf vertices with different elelvation....
         """
         Limits the length of the edges poly to limit in meter.
+        Long edges are split in rounds until new trias have no long edges. After the first round only the edges of
+        new trias need to be checked, as the other edges in poly were checked before and did not change.
         """
         self.log.info("Limit length of edges in poly {} to {}m.".format(poly, limit))
-        edges = self.edges(poly)
-        big_trias = {} #dictionary containg trias with long edges (key is index to tria in self.atrias and value is list of edge indices for edges too long)
-        for pq, edge_refs in edges.items(): #key in dictionary ar coordinates of vertex p and q of edge, value is list with reference to tria where this edge is
-            d = distance([pq[0], pq[1]], [pq[2], pq[3]])
-            #if d > limit and (PointInPoly([pq[0], pq[1]], poly) or PointInPoly([pq[2], pq[3]], poly)): #select long edges only if at least one vertex is inside poly
-            if d > limit and edgeInPoly([pq[0], pq[1]], [pq[2], pq[3]], poly): #select only edges longer than limit and inside or at least intersecting poly
+        inpoly = set(self.atrias.idAt(tx) for tx in self.triasInPoly(poly)) #ids of trias in/intersecting poly
+        worklist = sorted(inpoly) #ids of trias in poly having edges not checked yet
+        checked = set() #edges checked already as coordinates of p and q in both orders, rounded to 7 digits as in edges()
+        while worklist:
+            #trias are gone through in the order of the set of indices returned by triasInPoly() in order to get the same structure for all trias
+            order = list(set(self.atrias.indicesOf(sorted(inpoly))))
+            rank = dict(zip(order, range(len(order))))
+            long_edges = {} #dictionary of long edges with coordinates of vertex p and q as key, value is list with reference to trias where this edge is
+            for tx in sorted(self.atrias.indicesOf(worklist), key=rank.get):
+                p = self.atrias.coordKeys(tx)
+                for i in range(3): #go through edges
+                    pq = (p[i][0], p[i][1], p[(i+1)%3][0], p[(i+1)%3][1])
+                    qp = (p[(i+1)%3][0], p[(i+1)%3][1], p[i][0], p[i][1])
+                    if pq in long_edges:
+                        long_edges[pq].append([tx, i])
+                    elif qp in long_edges: #check if edge is with other vertex order in dictionary
+                        long_edges[qp].append([tx, i])
+                    elif pq not in checked:
+                        checked.update((pq, qp))
+                        d = distance([pq[0], pq[1]], [pq[2], pq[3]])
+                        if d > limit and edgeInPoly([pq[0], pq[1]], [pq[2], pq[3]], poly): #select only edges longer than limit and inside or at least intersecting poly
+                            long_edges[pq] = [[tx, i]]
+            big_trias = {} #dictionary containg trias with long edges (key is index to tria in self.atrias and value is list of edge indices for edges too long)
+            for edge_refs in long_edges.values():
                 for e in edge_refs:
                     if e[0] in big_trias:
                         big_trias[e[0]].append(e[1])
                     else:
                         big_trias[e[0]] = [ e[1] ]
-        old_trias = [] #list of trias with long edges to be removed
-        new_trias = [] #list of trias with shorter edges to be created
-        for tx, le in big_trias.items():
-            t = self.atrias[tx]
-            if len(le) == 1: #In tria t with index tx one edge with index le is too long
-                cP = [0.5 * ( t[(le[0]+1)%3][0] + t[le[0]][0] ), 0.5 * ( t[(le[0]+1)%3][1] + t[le[0]][1] ) ]
-                new_v = createFullCoords(cP[0], cP[1], t)
-                new_trias.append([ t[le[0]], new_v, t[(le[0]+2)%3], t[3], t[4], t[5], t[6]])
-                new_trias.append([ new_v, t[(le[0]+1)%3], t[(le[0]+2)%3], t[3], t[4], t[5], t[6]])
-                old_trias.append(t)
-            elif len(le) == 2: #In tria t two edges are too long, meaning it is important which was detected first to have same structure for all trias
-                cP0 = [ 0.5 * ( t[(le[0]+1)%3][0] + t[le[0]][0] ), 0.5 * ( t[(le[0]+1)%3][1] + t[le[0]][1] ) ]
-                cP1 = [ 0.5 * ( t[(le[1]+1)%3][0] + t[le[1]][0] ), 0.5 * ( t[(le[1]+1)%3][1] + t[le[1]][1] ) ]
-                new_v0 = createFullCoords(cP0[0], cP0[1], t)
-                new_v1 = createFullCoords(cP1[0], cP1[1], t)
-                if (le[0]+1)%3 == le[1]: #second cutting point is on the following edge
-                    new_trias.append([ t[le[0]], new_v0, t[(le[0]+2)%3], t[3], t[4], t[5], t[6]])
-                    new_trias.append([ new_v0, t[(le[0]+1)%3], new_v1, t[3], t[4], t[5], t[6]])
-                    new_trias.append([ new_v1, t[(le[0]+2)%3], new_v0, t[3], t[4], t[5], t[6]])
-                else: #second cutting point is two edges away (=the edge before)
-                    new_trias.append([ new_v0, t[(le[0]+1)%3], t[(le[0]+2)%3], t[3], t[4], t[5], t[6]])
-                    new_trias.append([ new_v0, t[(le[0]+2)%3], new_v1, t[3], t[4], t[5], t[6]])
-                    new_trias.append([ new_v0, new_v1, t[le[0]], t[3], t[4], t[5], t[6]])
-                old_trias.append(t)
-            elif len(le) == 3: #In tria t all three edges are tool long
-                cP = [] #list for all three new Cutting points
-                new_v =[] #list for all three new vertex coordinates
-                for i in range(3): # inserted structure for 3 long vertices is always the same regardless which cP is inserted first
-                    cP.append([0.5 * ( t[(i+1)%3][0] + t[i][0] ), 0.5 * ( t[(i+1)%3][1] + t[i][1] ) ])
-                    new_v.append(createFullCoords(cP[-1][0], cP[-1][1], t))
-                for i in range(3):
-                    new_trias.append([ t[i], new_v[i], new_v[(i+2)%3], t[3], t[4], t[5], t[6]])
-                new_trias.append([new_v[i], new_v[(i+1)%3], new_v[(i+2)%3], t[3], t[4], t[5], t[6]])
-                old_trias.append(t)
-        for nt in new_trias:
-            self.atrias.append(nt) #update area trias by appending new trias
-        for ot in old_trias:
-            self.atrias.remove(ot) #update area trias by by removing trias that are replaced by new ones
-        self.log.info("  ... limiting replaced {} trias with {} new trias having shorter edges.".format(len(old_trias), len(new_trias)))
-        if len(new_trias) > 0: #New trias could still have longer edges
-            self.limitEdges(poly, limit) #shorten again
-        ########## This funciton might be improved to go only through edges in new_trias instead starting from scratch in recursions
+            old_trias = [] #list of trias with long edges to be removed
+            new_trias = [] #list of trias with shorter edges to be created
+            for tx, le in big_trias.items():
+                t = self.atrias[tx]
+                if len(le) == 1: #In tria t with index tx one edge with index le is too long
+                    cP = [0.5 * ( t[(le[0]+1)%3][0] + t[le[0]][0] ), 0.5 * ( t[(le[0]+1)%3][1] + t[le[0]][1] ) ]
+                    new_v = createFullCoords(cP[0], cP[1], t)
+                    new_trias.append([ t[le[0]], new_v, t[(le[0]+2)%3], t[3], t[4], t[5], t[6]])
+                    new_trias.append([ new_v, t[(le[0]+1)%3], t[(le[0]+2)%3], t[3], t[4], t[5], t[6]])
+                    old_trias.append(t)
+                elif len(le) == 2: #In tria t two edges are too long, meaning it is important which was detected first to have same structure for all trias
+                    cP0 = [ 0.5 * ( t[(le[0]+1)%3][0] + t[le[0]][0] ), 0.5 * ( t[(le[0]+1)%3][1] + t[le[0]][1] ) ]
+                    cP1 = [ 0.5 * ( t[(le[1]+1)%3][0] + t[le[1]][0] ), 0.5 * ( t[(le[1]+1)%3][1] + t[le[1]][1] ) ]
+                    new_v0 = createFullCoords(cP0[0], cP0[1], t)
+                    new_v1 = createFullCoords(cP1[0], cP1[1], t)
+                    if (le[0]+1)%3 == le[1]: #second cutting point is on the following edge
+                        new_trias.append([ t[le[0]], new_v0, t[(le[0]+2)%3], t[3], t[4], t[5], t[6]])
+                        new_trias.append([ new_v0, t[(le[0]+1)%3], new_v1, t[3], t[4], t[5], t[6]])
+                        new_trias.append([ new_v1, t[(le[0]+2)%3], new_v0, t[3], t[4], t[5], t[6]])
+                    else: #second cutting point is two edges away (=the edge before)
+                        new_trias.append([ new_v0, t[(le[0]+1)%3], t[(le[0]+2)%3], t[3], t[4], t[5], t[6]])
+                        new_trias.append([ new_v0, t[(le[0]+2)%3], new_v1, t[3], t[4], t[5], t[6]])
+                        new_trias.append([ new_v0, new_v1, t[le[0]], t[3], t[4], t[5], t[6]])
+                    old_trias.append(t)
+                elif len(le) == 3: #In tria t all three edges are tool long
+                    cP = [] #list for all three new Cutting points
+                    new_v =[] #list for all three new vertex coordinates
+                    for i in range(3): # inserted structure for 3 long vertices is always the same regardless which cP is inserted first
+                        cP.append([0.5 * ( t[(i+1)%3][0] + t[i][0] ), 0.5 * ( t[(i+1)%3][1] + t[i][1] ) ])
+                        new_v.append(createFullCoords(cP[-1][0], cP[-1][1], t))
+                    for i in range(3):
+                        new_trias.append([ t[i], new_v[i], new_v[(i+2)%3], t[3], t[4], t[5], t[6]])
+                    new_trias.append([new_v[i], new_v[(i+1)%3], new_v[(i+2)%3], t[3], t[4], t[5], t[6]])
+                    old_trias.append(t)
+            for nt in new_trias:
+                self.atrias.append(nt) #update area trias by appending new trias
+            inpoly.difference_update(self.atrias.idAt(tx) for tx in big_trias)
+            for ot in old_trias:
+                self.atrias.discard(ot) #update area trias by by removing trias that are replaced by new ones
+            self.atrias.compact()
+            self.log.info("  ... limiting replaced {} trias with {} new trias having shorter edges.".format(len(old_trias), len(new_trias)))
+            first = len(self.atrias) - len(new_trias) #new trias could still have longer edges, so they are checked in next round if in poly
+            worklist = [self.atrias.idAt(first + n) for n, nt in enumerate(new_trias) if self.isTriaInPoly(nt, poly)]
+            inpoly.update(worklist)
 
     def extractMeshToObjFile(self, poly, filename, type_def, file_info="# MUXP Mesh extract"):
         """
@@ -821,6 +1125,7 @@ class muxpArea:
             polysouter, polysinner, borderv = self.CutPoly(poly)  # just cut shape in mesh
             select_from_cut = True
 
+        export_trias = []  # trias to be exported
         for t in self.atrias:  # go through all trias in area
             if not t[6]:  # Patch not defined for that tria
                 self.log.error("Patch does not exist for tria: {} --> not exported!!".format(t))
@@ -830,23 +1135,27 @@ class muxpArea:
                         (PointInPoly(t[0][0:2], poly) and PointInPoly(t[1][0:2], poly) and PointInPoly(t[2][0:2], poly)):
                     # in case of cut select trias with center point inside poly in case of default type select
                     # all all trias with all vertices inside poly (no cut)
-                    terrain_id = self.dsf.Patches[t[6]].defIndex
-                    #self.log.info("Tria with flag {} and terrain {} to be exported: {}".format(self.dsf.Patches[t[6]].flag, terrain_id, t))
-                    if terrain_id not in extract_atrias.keys():
-                        extract_atrias[terrain_id] = [deepcopy(t)]
-                    else:
-                        extract_atrias[terrain_id].append(deepcopy(t))  # deepcopy, to be able to change elevation
-                    for v in range(3):
-                        extract_atrias[terrain_id][-1][v][2] = self.dsf.getVertexElevation(*t[v][:3])  #### NEW: use elevation, no raster value
-                        vc = (round(t[v][0], 7), round(t[v][1], 7))
-                        vn = (round(t[v][3], 4), round(t[v][4], 4))
-                        if vc not in vertices:
-                            vertices[vc] = [self.dsf.getVertexElevation(*t[v][:3]), len(vertices)]
-                            # use always the elevation, but have info if raster elevation was used
-                            if t[v][2] == -32768:
-                                v_raster_elev[vc] = True
-                        if vn not in normals:
-                            normals[vn] = len(normals)
+                    export_trias.append(t)
+        elevs = self.dsf.getElevations([v[0] for t in export_trias for v in t[:3]], [v[1] for t in export_trias for v in t[:3]],
+                                       [v[2] for t in export_trias for v in t[:3]])  # elevations of all vertices in one call
+        for nt, t in enumerate(export_trias):
+            terrain_id = self.dsf.Patches[t[6]].defIndex
+            #self.log.info("Tria with flag {} and terrain {} to be exported: {}".format(self.dsf.Patches[t[6]].flag, terrain_id, t))
+            if terrain_id not in extract_atrias.keys():
+                extract_atrias[terrain_id] = [deepcopy(t)]
+            else:
+                extract_atrias[terrain_id].append(deepcopy(t))  # deepcopy, to be able to change elevation
+            for v in range(3):
+                extract_atrias[terrain_id][-1][v][2] = elevs[3 * nt + v]  #### NEW: use elevation, no raster value
+                vc = (round(t[v][0], 7), round(t[v][1], 7))
+                vn = (round(t[v][3], 4), round(t[v][4], 4))
+                if vc not in vertices:
+                    vertices[vc] = [elevs[3 * nt + v], len(vertices)]
+                    # use always the elevation, but have info if raster elevation was used
+                    if t[v][2] == -32768:
+                        v_raster_elev[vc] = True
+                if vn not in normals:
+                    normals[vn] = len(normals)
 
         with open(filename, "w", encoding="utf8", errors="ignore") as f:
             center_lines_offset = 0  # in case of non centric export we have not v and vn for CENTER COORDINATES
@@ -958,7 +1267,8 @@ class muxpArea:
                 if PointInPoly(t[0][0:2], poly) and PointInPoly(t[1][0:2], poly) and PointInPoly(t[2][0:2], poly):
                     trias_to_be_removed.append(t)
             for t in trias_to_be_removed:
-                self.atrias.remove(t)  # tria is removed to be later replaced by trias from .obj
+                self.atrias.discard(t)  # tria is removed to be later replaced by trias from .obj
+            self.atrias.compact()
 
         elif type_def.find("same_cut") >= 0:  # coordinates define same cut as for extraction, so just cut and insert
             # Works only if used on exact the same mesh!
@@ -993,7 +1303,8 @@ class muxpArea:
                 if PointInPoly(tria_center(*t[:3]), obj_outline):  # remove trias with center inside our imported mesh
                     trias_to_be_removed.append(t)
             for t in trias_to_be_removed:
-                self.atrias.remove(t)  # tria is removed to be later replaced by trias from .obj
+                self.atrias.discard(t)  # tria is removed to be later replaced by trias from .obj
+            self.atrias.compact()
 
         # insert all trias from .obj file in trias of that MUXP area
         for t in obj_trias:
@@ -1007,9 +1318,11 @@ class muxpArea:
 
             if type_def.find("smooth") >= 0:
                 match_border_with_existing_vertices(borderv, self.atrias, obj_trias)  # IMPORTANT: SWAPPED trias, here atrias will receive coords/elevaton from obj_trias
+                self.atrias.refresh()  # as coordinates of area trias might have been moved
                 self.smooth_cut(command_data, obj_outline)
             else:  # no smoothing defined
                 match_border_with_existing_vertices(borderv, obj_trias, self.atrias)  # the loaded mesh will take elevation from existing mesh at the border
+                self.atrias.refresh()  # as coordinates of obj trias already added to area trias might have been moved
 
         elif type_def.find("same_outline_inside_polygon") >= 0:  # removal of trias already done above
             borderland = obj_outline  # exact match, no borderland; just border of the outer edges of inserted mesh
@@ -1066,42 +1379,45 @@ class muxpArea:
         normal_dict = {}  # dictionary that contains for (x, y) coords a  list with the sum of face normal vectors
         nl_dict = {} ### JUST Treturn acos(dot_product(v1, v2) / length_prodESTING ####
         # of attached trias in [0:3]
+        normal_trias = []  # trias in poly for which normals are calculated
         for t in self.atrias:  # go through all trias in area
             if self.dsf.Patches[t[6]].flag:  # for the moment only export physical triangles !!!!!!
                 if PointInPoly(t[0][:2], poly) or PointInPoly(t[1][:2], poly) or PointInPoly(t[2][:2], poly):
                     ### TO BE OPTIMIZED: REMEMBER WHICH POINTS ARE IN POLY TO AVOID SAME CHECK BELOW ######
-                    tc = [(round(t[0][0], 7), round(t[0][1], 7), round(self.dsf.getVertexElevation(*t[0][:3]), 2)),
-                          (round(t[1][0], 7), round(t[1][1], 7), round(self.dsf.getVertexElevation(*t[1][:3]), 2)),
-                          (round(t[2][0], 7), round(t[2][1], 7), round(self.dsf.getVertexElevation(*t[2][:3]), 2))]
-                    u = distance_vector(tc[2], tc[0])  # span tria with u, v vectors starting at 3rd point in tria
-                    v = distance_vector(tc[2], tc[1])
-                    self.log.info("tria: {}".format(tc))
-                    self.log.info("  u: {}   v: {}".format(u, v))  # TO BE REMOVED -- TESTING ONLY -- #############
-                    # COULD BE MORE EFFICIENT TO CALCULATE DISTANCE AS THIS IS JUST FOR X AND Y SEPARATE !!! ##########
-                    tn = [u[1]*v[2] - u[2]*v[1], u[2]*v[0] - u[0]*v[2], u[0]*v[1] - u[1]*v[0]]  # normal vector for tria t
-                    tn_length = sqrt(tn[0]**2 + tn[1]**2 + tn[2]**2)
-                    if tn_length:  # avoid division by zero
-                        l = 1 / sqrt(tn[0]**2 + tn[1]**2 + tn[2]**2)  # set length of each face vector to 1
+                    normal_trias.append(t)
+        elevs = self.dsf.getElevations([v[0] for t in normal_trias for v in t[:3]], [v[1] for t in normal_trias for v in t[:3]],
+                                       [v[2] for t in normal_trias for v in t[:3]])  # elevations of all vertices in one call
+        for nt, t in enumerate(normal_trias):
+            tc = [(round(t[i][0], 7), round(t[i][1], 7), round(elevs[3 * nt + i], 2)) for i in range(3)]
+            u = distance_vector(tc[2], tc[0])  # span tria with u, v vectors starting at 3rd point in tria
+            v = distance_vector(tc[2], tc[1])
+            self.log.info("tria: {}".format(tc))
+            self.log.info("  u: {}   v: {}".format(u, v))  # TO BE REMOVED -- TESTING ONLY -- #############
+            # COULD BE MORE EFFICIENT TO CALCULATE DISTANCE AS THIS IS JUST FOR X AND Y SEPARATE !!! ##########
+            tn = [u[1]*v[2] - u[2]*v[1], u[2]*v[0] - u[0]*v[2], u[0]*v[1] - u[1]*v[0]]  # normal vector for tria t
+            tn_length = sqrt(tn[0]**2 + tn[1]**2 + tn[2]**2)
+            if tn_length:  # avoid division by zero
+                l = 1 / sqrt(tn[0]**2 + tn[1]**2 + tn[2]**2)  # set length of each face vector to 1
+            else:
+                l = 1
+                self.log.warning("Zero length normal vector for tria: {}".format(t))
+            #l = 2  # tn is already created to reflect half size of the tria itself, so okay for weighting
+            # tn[1] *= -1  # According to dsf spec the y coordinate is positive for going south, by calc above it is negative BUT actually it is positive for North
+            if tn[2] < 0:  # make sure that z-vector is always showing upside
+                l *= -1
+            tnn = [l * tn[0], l*tn[1], l*tn[2]]  # face normal on tria t normalized to length 1
+            self.log.info("  Normal vector for tria (weighted by tria size): {}".format(tnn))
+            for i in range(3):
+                vc2 = tc[i][0:2]  # just first two coordinates of tria vertices
+                if PointInPoly(vc2, poly):
+                    # following line calculates angle of tria at vertex vc2 for weighting vertex normal
+                    angle = v_angle([tc[(i-1)%3][0] - tc[i][0], tc[(i-1)%3][1] - tc[i][1], tc[(i-1)%3][2] - tc[i][2]], [tc[(i+1)%3][0] - tc[i][0], tc[(i+1)%3][1] - tc[i][1], tc[(i+1)%3][2] - tc[i][2]])
+                    if vc2 not in normal_dict:
+                        normal_dict[vc2] = [angle*tnn[0], angle*tnn[1], angle*tnn[2]]
+                        nl_dict[vc2] = [tnn]
                     else:
-                        l = 1
-                        self.log.warning("Zero length normal vector for tria: {}".format(t))
-                    #l = 2  # tn is already created to reflect half size of the tria itself, so okay for weighting
-                    # tn[1] *= -1  # According to dsf spec the y coordinate is positive for going south, by calc above it is negative BUT actually it is positive for North
-                    if tn[2] < 0:  # make sure that z-vector is always showing upside
-                        l *= -1
-                    tnn = [l * tn[0], l*tn[1], l*tn[2]]  # face normal on tria t normalized to length 1
-                    self.log.info("  Normal vector for tria (weighted by tria size): {}".format(tnn))
-                    for i in range(3):
-                        vc2 = tc[i][0:2]  # just first two coordinates of tria vertices
-                        if PointInPoly(vc2, poly):
-                            # following line calculates angle of tria at vertex vc2 for weighting vertex normal
-                            angle = v_angle([tc[(i-1)%3][0] - tc[i][0], tc[(i-1)%3][1] - tc[i][1], tc[(i-1)%3][2] - tc[i][2]], [tc[(i+1)%3][0] - tc[i][0], tc[(i+1)%3][1] - tc[i][1], tc[(i+1)%3][2] - tc[i][2]])
-                            if vc2 not in normal_dict:
-                                normal_dict[vc2] = [angle*tnn[0], angle*tnn[1], angle*tnn[2]]
-                                nl_dict[vc2] = [tnn]
-                            else:
-                                normal_dict[vc2] = [normal_dict[vc2][0] + angle*tnn[0], normal_dict[vc2][1] + angle*tnn[1], normal_dict[vc2][2] + angle*tnn[2]]
-                                nl_dict[vc2].append(tnn)
+                        normal_dict[vc2] = [normal_dict[vc2][0] + angle*tnn[0], normal_dict[vc2][1] + angle*tnn[1], normal_dict[vc2][2] + angle*tnn[2]]
+                        nl_dict[vc2].append(tnn)
 
         for v in normal_dict:  # setting all vertex normals in dict to length 1
             vn = normal_dict[v]
@@ -1179,6 +1495,7 @@ class muxpArea:
                                 ### We want on each coordinate same elevation, so let's adapt the lower elevated one to the higher (to avoid staying with unpredictable raster value for default -32768)
                                 if ev[2] < v[2]:
                                     self.dsf.V[poolID4v][ev_index][2] = v[2] #adapt lower existing vertex elevation with elevation of higher new vertex
+                                    self.dsf.poolChanged(poolID4v) #vertex changed in place
                                 else:
                                     v[2] = ev[2] #adapt lower new vertex with elevation of existing higher one
                                 self.log.info("      Now new vertex has elevation {}m".format(self.dsf.V[poolID4v][ev_index][2]))
@@ -1371,7 +1688,11 @@ class muxpArea:
         old_trias = []
         if not trias:
             trias = self.atrias
-        for enum_t, t in enumerate(trias):
+        if isinstance(trias, muxpTrias):  # only trias near v from index of area trias
+            candidates = [(i, trias[i]) for i in trias.nearIndices([v])]
+        else:
+            candidates = enumerate(trias)
+        for enum_t, t in candidates:
             for e in range(3):
                 e_part, o_part, dist = edgeDistance(v, t[e][:2], t[(e+1)%3][:2])
                 if e_part > 0 and e_part < 1: #v must be between two vertices of edge
@@ -1389,8 +1710,12 @@ class muxpArea:
             self.log.info("   Tria removed: {}".format(ot))
             if ot[0][2] > 0 or ot[1][2] > 0 or ot[2][2] > 0: ########## ERROR CHECKING ---> TO BE REMOVED ###############
                 self.log.error("          REMOVED TRIA ABOVE ALREADY HAVING ELEVATION")
-            if ot in trias: ###### NEW 05.04.2020 ############## WHY REQUIRED after setting relative_mindist from 0.001 to 0.00001??? NOW STILL REQUIRE ??? ############
+            if isinstance(trias, muxpTrias):
+                trias.discard(ot) #update area trias by removing trias that are replaced by new ones; False if already removed
+            elif ot in trias: ###### NEW 05.04.2020 ############## WHY REQUIRED after setting relative_mindist from 0.001 to 0.00001??? NOW STILL REQUIRE ??? ############
                 trias.remove(ot) #update area trias by by removing trias that are replaced by new ones
+        if isinstance(trias, muxpTrias):
+            trias.compact()
         return
 
     def assign_spline_elevation(self, spline_points, vertices, place_holder_removal=0):
@@ -1442,7 +1767,11 @@ class muxpArea:
             self.log.error("Given distance must not be zero!")
             return []
 
-        for t in self.atrias:
+        corners = []  # corners of the areas between poly and stretched poly, in which vertices are smoothed
+        for i in range(len(poly)):
+            i_next = (i + 1) % len(poly)
+            corners.extend([stretched_poly[i], stretched_poly[i_next], poly[i], [stretched_poly[i_next][0] + poly[i][0] - stretched_poly[i][0], stretched_poly[i_next][1] + poly[i][1] - stretched_poly[i][1]]])
+        for t in self.atrias.near(corners):
             for v in t[:3]:
                 for i in range(len(poly)):
                     i_next = (i + 1) % len(poly)
@@ -0,0 +1,107 @@
+#******************************************************************************
+#
+# bench_scaling.py        for muxp
+# ---------------------------------------------------------
+# Benchmark of reading a dsf file and of writing it with all pools changed,
+# which both scale or de-scale every pool with XPLNEDSF._scaleV_.
+# Uses a synthetic tile with 100 pools of 10000 vertices and 5 planes
+# (1M vertices), a 1201x1201 raster and 400 patches.
+#
+# Run from the muxp folder with:  python tests/bench_scaling.py [old_xplnedsf2.py]
+# With the path of another version of xplnedsf2.py (e.g. extracted with
+# git show <commit>:xplnedsf2.py > old_xplnedsf2.py) both versions are timed
+# and their written files are compared.
+#
+#******************************************************************************
+
+import sys
+import logging
+from importlib.util import spec_from_file_location, module_from_spec
+from os import path
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+HERE = path.dirname(path.abspath(__file__))
+RUNS = 3 #best of RUNS is taken for read
+
+
+def loadModule(file, name): #returns module loaded from python file
+    spec = spec_from_file_location(name, file)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def buildTile(X, npools = 100, nverts = 10000, rasterwidth = 1201, npatches = 400, seed = 1): #returns synthetic XPLNEDSF of module X
+    rnd = Random(seed)
+    dsf = X.XPLNEDSF(statusfunction=None)
+    dsf.Properties = {'sim/west': '10', 'sim/east': '11', 'sim/south': '50', 'sim/north': '51', 'sim/planet': 'earth', 'sim/creation_agent': 'bench_scaling'}
+    dsf.DefTerrains = {0: 'terrain_Water', 1: 'lib/g10/terrain10/grass.ter'}
+    dsf.DefRasters = {0: 'elevation'}
+    for p in range(npools):
+        gx, gy = p % 10, p // 10
+        dsf.Scalings.append([[0.1, 10 + gx / 10], [0.1, 50 + gy / 10], [2000.0, -100.0], [2.0, -1.0], [2.0, -1.0]])
+        pool = []
+        x, y = rnd.randrange(65536), rnd.randrange(65536)
+        for i in range(nverts):
+            if rnd.random() < 0.7: #mostly neighbouring vertices as in real meshes
+                x = (x + rnd.randrange(-50, 50)) % 65536
+                y = (y + rnd.randrange(-50, 50)) % 65536
+            else:
+                x, y = rnd.randrange(65536), rnd.randrange(65536)
+            pool.append([x, y, rnd.randrange(65536), 32768 if rnd.random() < 0.6 else rnd.randrange(65536), 32768])
+        dsf.V.append(pool)
+    dsf.V.append([]) #empty pool at end as in standard dsf files
+    dsf.Scalings.append([])
+    dsf._scaleV_(16, False)
+    for k in range(npatches):
+        pool = rnd.randrange(npools)
+        patch = X.XPLNEpatch(1, 0.0, -1.0, None, rnd.randrange(2))
+        cmds = [[1, pool]]
+        for j in range(rnd.randrange(3, 12)):
+            cmds.append([23] + [rnd.randrange(nverts) for i in range(3 * rnd.randrange(1, 60))])
+        patch.cmds = cmds
+        dsf.Patches.append(patch)
+    raster = X.XPLNEraster()
+    raster.ver, raster.bpp, raster.flags, raster.width, raster.height, raster.scale, raster.offset = 0, 2, 5, rasterwidth, rasterwidth, 1.0, 0.0
+    raster.data = [[float(rnd.randrange(-200, 3000)) for y in range(raster.height)] for x in range(raster.width)]
+    dsf.Raster.append(raster)
+    for k in ['DAEH', 'PORP', 'NFED', 'TRET', 'TJBO', 'YLOP', 'WTEN', 'NMED', 'DOEG', 'LOOP', 'LACS', '23OP', '23CS', 'SMED', 'IMED', 'DMED', 'SDMC']:
+        dsf._Atoms_[k] = [] if k in dsf._AtomOfAtoms_ or k in dsf._MultiAtoms_ else b''
+    return dsf
+
+
+def bench(X, infile, outfile): #returns best read time and time to write with all pools changed for module X
+    times = []
+    for run in range(RUNS):
+        dsf = X.XPLNEDSF(statusfunction=None)
+        start = perf_counter()
+        dsf.read(infile)
+        times.append(perf_counter() - start)
+    for pool in dsf.V[:-1]: #every pool changed, so every pool is de-scaled and encoded
+        pool[0][2] += 1e-3
+    start = perf_counter()
+    dsf.write(outfile)
+    return min(times), perf_counter() - start
+
+
+if __name__ == '__main__':
+    logging.disable(logging.CRITICAL)
+    versions = [('current', path.join(path.dirname(HERE), 'xplnedsf2.py'))]
+    if len(sys.argv) > 1:
+        versions.insert(0, ('other', sys.argv[1]))
+    modules = [(name, loadModule(file, 'xplnedsf2_' + name)) for name, file in versions]
+    print("numpy installed: {}".format(modules[-1][1].NUMPYINSTALLED))
+    with TemporaryDirectory() as folder:
+        infile = path.join(folder, 'tile.dsf')
+        buildTile(modules[-1][1]).write(infile)
+        written = []
+        for name, X in modules:
+            outfile = path.join(folder, 'tile_{}.dsf'.format(name))
+            readtime, writetime = bench(X, infile, outfile)
+            print("{:8s} read: {:.2f} s   write with all pools changed: {:.2f} s".format(name, readtime, writetime))
+            with open(outfile, 'rb') as f:
+                written.append(f.read())
+        if len(written) > 1:
+            print("written files identical: {}".format(written[0] == written[1]))
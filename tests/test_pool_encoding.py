@@ -0,0 +1,108 @@
+#******************************************************************************
+#
+# test_pool_encoding.py        for muxp
+# ---------------------------------------------------------
+# Compares pools encoded with numpy (_encodePoolArray) byte for byte with the
+# encoding without numpy (XPLNEDSF._encodePool_) and decodes them again.
+#
+# Run from the muxp folder with:  python -m unittest discover tests
+#
+#******************************************************************************
+
+import sys
+import unittest
+from copy import deepcopy
+from os import path
+from random import Random
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+import xplnedsf2
+
+
+class PoolEncodingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dsf = xplnedsf2.XPLNEDSF(statusfunction=None)
+        self.dsf._log_.setLevel('ERROR') #out of range values are logged as warnings
+        self.rnd = Random(20)
+
+    def encodeBoth(self, pool, bit): #returns encoding of pool with and without numpy
+        withNumpy = bytes(self.dsf._encodePool_(deepcopy(pool), bit, 0))
+        xplnedsf2.NUMPYINSTALLED = False
+        try:
+            withoutNumpy = bytes(self.dsf._encodePool_(deepcopy(pool), bit, 0))
+        finally:
+            xplnedsf2.NUMPYINSTALLED = True
+        return withNumpy, withoutNumpy
+
+    def assertRoundTrip(self, pool, bit = 16):
+        withNumpy, withoutNumpy = self.encodeBoth(pool, bit)
+        self.assertEqual(withNumpy, withoutNumpy)
+        self.assertEqual(xplnedsf2._decodePool(withNumpy, bit), pool)
+        self.assertEqual(xplnedsf2._decodePoolArray(withNumpy, bit).tolist(), pool)
+
+    def randomPool(self, nVertices, nPlanes, bit): #pool with repeated, neighbouring, extreme and random values
+        max_int = 1 << bit
+        values = [0, 1, max_int - 2, max_int - 1]
+        prev = [self.rnd.randrange(max_int) for n in range(nPlanes)]
+        pool = []
+        for i in range(nVertices):
+            r = self.rnd.random()
+            if r < 0.4:
+                v = prev[:]
+            elif r < 0.6:
+                v = [min(max(x + self.rnd.choice((-1, 0, 1)), 0), max_int - 1) for x in prev]
+            elif r < 0.7:
+                v = [self.rnd.choice(values) for n in range(nPlanes)]
+            else:
+                v = [self.rnd.randrange(max_int) for n in range(nPlanes)]
+            pool.append(v)
+            prev = v
+        return pool
+
+    @unittest.skipUnless(xplnedsf2.NUMPYINSTALLED, "numpy not installed")
+    def test_randomPools(self):
+        for bit in (16, 32):
+            for trial in range(200):
+                nVertices = self.rnd.choice([1, 2, 3, 126, 127, 128, 129, 254, 255, 256, self.rnd.randrange(1, 3000)])
+                self.assertRoundTrip(self.randomPool(nVertices, self.rnd.randrange(1, 8), bit), bit)
+
+    @unittest.skipUnless(xplnedsf2.NUMPYINSTALLED, "numpy not installed")
+    def test_singleValue(self):
+        for bit in (16, 32):
+            self.assertRoundTrip([[0]], bit)
+            self.assertRoundTrip([[(1 << bit) - 1]], bit)
+            self.assertRoundTrip([[5, 6, 7, 8, 9]], bit)
+
+    @unittest.skipUnless(xplnedsf2.NUMPYINSTALLED, "numpy not installed")
+    def test_longRuns(self): #runs and sequences of individual values around the 127 limit of one run-length byte
+        for bit in (16, 32):
+            for n in (126, 127, 128, 253, 254, 255, 381, 1000):
+                self.assertRoundTrip([[7, 7]] * n, bit)
+                self.assertRoundTrip([[i, 3 * i] for i in range(n)], bit) #constant differences are runs
+                self.assertRoundTrip([[(i * i) % 65536] for i in range(n)], bit) #individual values
+                self.assertRoundTrip([[1]] * n + [[(i * i) % 65536] for i in range(n)] + [[2]] * n, bit)
+
+    @unittest.skipUnless(xplnedsf2.NUMPYINSTALLED, "numpy not installed")
+    def test_planeWidths(self):
+        for bit in (16, 32):
+            for nPlanes in (1, 2, 3, 4, 5, 7, 8, 9, 14):
+                self.assertRoundTrip(self.randomPool(500, nPlanes, bit), bit)
+
+    @unittest.skipUnless(xplnedsf2.NUMPYINSTALLED, "numpy not installed")
+    def test_wrappingDifferences(self): #differences are taken modulo max_int
+        for bit in (16, 32):
+            max_int = 1 << bit
+            self.assertRoundTrip([[max_int - 1], [0], [max_int - 1], [0], [1], [max_int - 1]] * 50, bit)
+
+    @unittest.skipUnless(xplnedsf2.NUMPYINSTALLED, "numpy not installed")
+    def test_firstValueOutOfRange(self): #first values are set into range, same encoding in both cases
+        for bit in (16, 32):
+            max_int = 1 << bit
+            for first in (-7, max_int, max_int + 5):
+                withNumpy, withoutNumpy = self.encodeBoth([[first, 3], [4, 4], [4, 4]], bit)
+                self.assertEqual(withNumpy, withoutNumpy)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -30,21 +30,853 @@
 ###            Checking out of bound when packing raster values (might be removed again!)
 ### NEW 0.5.7: Returning error coder for getDSFproperties()
 ### NEW 0.5.9: Allowing empty DEFN sub atoms, especially for DEMN supporting dsf files for X-Plane 10
+### NEW 0.6.0: Pools are decoded with numpy (if installed) and are in addition available as arrays in VArrays/V32Arrays
+###            Pools are encoded with numpy (if installed), bit-for-bit identical to the encoding without numpy
+###            Raster data with numpy is an array on the bytes of the raster atom; scale and offset applied with first access
+###            Option to read uncompressed dsf files memory mapped, with atoms as memoryviews on the map
+###            7ZIP compressed dsf files are decompressed while reading with lzma module instead of py7zlib
+###            Writing encodes only pools, scalings, rasters, properties and definitions changed since read; others are written as read
+###            Pools with vertices changed in place need to be marked with poolChanged(); pools replaced, changed in size or with changed scalings are found without
+###            Writing does not de-scale the vertices in V and V32 anymore
+###            Commands are stored in compact arrays (XPLNEcmds); CMDS list and commands of read patches are only built when accessed
+###            With numpy patches cache their triangles as array (triangleArray()), trias2cmds() also accepts this array
+###            trias2cmds() groups trias by pool and uses range, strip and fan commands with minimal size; returns this size in bytes
+###            Patches with commands not changed since read are written by copying their bytes from read commands atom
+###            Lazy read mode: pools (V, V32 as XPLNEpools) and without numpy also rasters are only decoded with first access
+###            Read with meshonly extracts only patches from commands; objects, polygons and networks are copied as read or extracted with first access
+###            With numpy _scaleV_ scales and de-scales whole planes as array operations; written pools are de-scaled as arrays
+###            getElevations() returns raster elevations for many points at once (nearest or bilinear); getVertexElevation() uses it
+###            Optional sidecar index <file>.idx of atom offsets (getDSFindex(), write(file, index=True)), used by read(), getDSFproperties() and readDSFatom(); muxp writes it with each update
+###            read(file, cache=XPLNEcache(folder, maxsize)) takes decoded pools, commands and decompressed atoms of 7Zip files from .npz cache; pools decoded after read (e.g. lazy) are added to the cache entry with write()
+###            read(file, workers=n) decodes pools (without numpy also rasters) in n parallel processes
+###            write() encodes atoms per top-level atom while the atoms before are written and md5 hashed in a background thread
+###            Metrics with time, bytes and counts per phase of last read/write (getMetrics()), streamed to optional metricsfunction
 
 from os import path, stat #required to retrieve length of dsf-file
-from struct import pack, unpack #required for binary pack and unpack
+from os import utime, replace, remove, makedirs, listdir #required for cache of decoded dsf files
+from struct import pack, unpack, Struct, error as StructError #required for binary pack and unpack
 from hashlib import md5 #required for md5 hash in dsf file footer
 from logging import StreamHandler, getLogger, Formatter #for output to console and/or file
 from io import BytesIO #required to go through bytes of a read 7ZIP-File
-from math import sin, cos, sqrt, atan2, radians # for distance calculation etc.
+from mmap import mmap, ACCESS_READ #required to read dsf file without copying atoms
+from json import dumps, loads #required for sidecar index file of atoms
+from concurrent.futures import ProcessPoolExecutor #required to decode pools and rasters in parallel processes
+from threading import Thread #required to write file in background while encoding
+from queue import Queue
+from time import perf_counter #required for timing of read and write phases in metrics
+from array import array #required for compact storage of commands
+from math import sin, cos, sqrt, atan2, radians, floor # for distance calculation etc.
 
 try:
-    import py7zlib
+    import lzma #required to decompress 7ZIP-Files
 except ImportError:
-    PY7ZLIBINSTALLED = False
+    LZMAINSTALLED = False
 else:
-    PY7ZLIBINSTALLED = True
+    LZMAINSTALLED = True
 
+try:
+    import numpy as np
+except ImportError:
+    NUMPYINSTALLED = False
+else:
+    NUMPYINSTALLED = True
+
+
+_STRUCTS = {} #compiled structs by format string, for formats used repeatedly when decoding commands
+_INDEXSTRUCTS = [Struct('<{}H'.format(n)) for n in range(511)] #compiled structs for n 16 bit indices, as in patch commands with up to 255 indices or index pairs
+
+
+def _getStruct(fmt): #returns compiled struct for format string fmt, compiled only with first use
+    s = _STRUCTS.get(fmt)
+    if s is None:
+        s = _STRUCTS[fmt] = Struct(fmt)
+    return s
+
+
+def _decodePoolArray(s, bit = 16): #decodes a single pool atom string s to numpy array with shape (vertices, planes); returns None for unknown encoding
+    if bit == 32:
+        dtype = np.dtype('<u4')
+    else: #assuming the standard 16bit Pool case
+        dtype = np.dtype('<u2')
+    size = dtype.itemsize #bytes read per coordinate
+    nArrays, nPlanes = unpack('<IB', s[0:5])
+    pool = np.empty((nArrays, nPlanes), dtype)
+    pos = 5 #position in string s
+    for n in range(nPlanes):
+        encType = s[pos]
+        pos += 1
+        if encType > 3: #encoding not defined
+            return None
+        if encType < 2: #no run-length encoding, all values of plane just follow each other
+            plane = np.frombuffer(s, dtype, nArrays, pos)
+            pos += nArrays * size
+        else: #run-length encoded; expand each run at once into the contiguous plane
+            plane = np.empty(nArrays, dtype)
+            i = 0 #counts how many arrays = vertices have been read in plane n
+            while i < nArrays:
+                runLength = s[pos]
+                pos += 1
+                if runLength > 127: #means the following value is repeated
+                    runLength = min(runLength - 128, nArrays - i)
+                    plane[i : i + runLength] = np.frombuffer(s, dtype, 1, pos)
+                    pos += size
+                else: #now just reading individual values
+                    runLength = min(runLength, nArrays - i)
+                    plane[i : i + runLength] = np.frombuffer(s, dtype, runLength, pos)
+                    pos += runLength * size
+                i += runLength
+        if encType == 1 or encType == 3: #values are also stored differenced
+            plane = np.cumsum(plane, dtype=dtype) #undo differentiation; unsigned integers wrap around modulo 2^16 / 2^32
+        pool[:, n] = plane
+    return pool
+
+
+def _decodePool(s, bit = 16): #decodes a single pool atom string s without numpy to list of vertices with list of plane values; returns None for unknown encoding
+    if bit == 32:
+        ctype = "<L"
+        size = 4 #bytes read per coordinate in 32 bit pool
+        max_int = 4294967296
+    else: #assuming the standard 16bit Pool case
+        ctype = "<H"
+        size = 2 #bytes read per coordinate in 16 bit pool
+        max_int = 65536
+    nArrays, nPlanes = unpack('<IB', s[0:5])
+    pool = [] #the current pool starts empty
+    for i in range(nArrays): ## span up multi-dimensional array for the new pool of required size (number of vertices in pool)
+        pool.append([])
+    pos = 5 #position in string s
+    for n in range(nPlanes):
+        encType, = unpack('<B', s[pos : pos + 1])
+        pos += 1
+        if encType < 0 or encType > 3: #encoding not defined
+            return None
+        i = 0  #counts how many arrays = vertices have been read in plane n
+        while i < nArrays:
+            if encType >= 2: #this means data is run-length encoded
+                runLength, = unpack('<B', s[pos : pos + 1])
+                pos += 1
+            else: #no run-length encoding (not tested yet!!!!!)
+                runLength = 1 #just read single values until end of this plane  
+            if runLength > 127: #means the following value is repeated
+                v, = unpack(ctype, s[pos : pos + size]) #repeated value
+                pos += size
+                runLength -= 128 #only value without 8th bit gives now the number of repetitions
+                while runLength > 0:
+                    pool[i].append(v)
+                    runLength -= 1
+                    i += 1
+            else:
+                while runLength > 0: #now just reading individual values
+                    v, = unpack(ctype, s[pos : pos + size])
+                    pos += size
+                    pool[i].append(v)
+                    runLength -= 1
+                    i += 1
+        if encType == 1 or encType == 3: #values are also stored differenced
+            for i in range (1, nArrays):  
+                pool[i][n] = (pool[i][n] + pool[i-1][n]) % max_int  #undo differntiation and modulo for wrapping two byte unsigned integer
+    return pool
+
+
+def _unpackRaster(atom, ctype, bpp, width, height, scale, offset): #returns values of raster data atom without numpy with scale and offset applied as lists indexed by [pixel x] [pixel y]
+    data = []
+    for x in range(0, bpp * width, bpp): #going x-wise from east to west just the bytes per pixes
+        line = []
+        for y in range(0, bpp * height * width, bpp * width): #going y-wise from south to north, always jumping over the width of each x-line
+            v, = unpack(ctype, atom[y + x : y + x + bpp]) #unpack bpp bytes at position x+y of raster data atom
+            v = v * scale + offset # APPLYING SCALE + OFFSET 
+            line.append(v) #the pixel appended is to a line from south to north (y-line)
+        data.append(line) #south to north lines are appended to each other
+    return data
+
+
+def _scalePool(pool, scalings, bit = 16): #applies scalings to list pool without numpy the same way as XPLNEDSF._scaleV_
+    max_int = (1 << bit) - 1
+    for n in range(len(scalings)):
+        if float(scalings[n][0]) == 0.0: #planes from first plane with scale 0 on are not scaled
+            break
+        for v in pool:
+            v[n] = (v[n] * scalings[n][0] / max_int) + scalings[n][1]
+
+
+def _poolShape(V, p): #returns number of vertices and planes of pool p in V; for lazy read pools without decoding them
+    if isinstance(V, XPLNEpools):
+        return V.shape(p)
+    if len(V[p]) == 0:
+        return 0, 0
+    return len(V[p]), len(V[p][0])
+
+
+def _encodeRunLengthArray(plane, bit = 16): #returns bytes of run-length encoded numpy int64 array plane; same runs as XPLNEDSF._encodeRunLength_
+    if bit == 32:
+        dtype = np.dtype('<u4')
+    else: #assuming the standard 16bit Pool case
+        dtype = np.dtype('<u2')
+    max_int = 1 << bit
+    starts = np.flatnonzero(np.concatenate(([True], plane[1:] != plane[:-1]))) #start index of each run of equal values
+    lengths = np.diff(np.append(starts, len(plane)))
+    full = lengths // 127 #runs are split in pieces of maximal 127 repetitions ...
+    rest = lengths % 127 #... followed by the rest, which is a single individual value if just 1 is left
+    pieces = full + (rest > 0)
+    first_piece = np.cumsum(pieces) - pieces
+    k = np.arange(pieces.sum()) - np.repeat(first_piece, pieces) #number of piece inside its run
+    tok_len = np.where(k < np.repeat(full, pieces), 127, np.repeat(rest, pieces)) #each piece is now a token to be encoded
+    tok_val = np.clip(np.repeat(plane[starts], pieces), 0, max_int - 1)
+    tok_rep = tok_len > 1 #repeated values, all others are individual values
+    ind = ~tok_rep
+    ind_start = ind & ~np.concatenate(([False], ind[:-1])) #first token of a sequence of individual values
+    idx = np.arange(len(tok_len))
+    k = idx - np.maximum.accumulate(np.where(ind_start, idx, 0)) #position inside sequence of individual values
+    seq = np.cumsum(ind_start) - 1
+    remaining = np.bincount(seq[ind], minlength=seq.max() + 1)[seq] - k if ind.any() else k
+    hdr = tok_rep | (ind & (k % 127 == 0)) #individual values are split in pieces of maximal 127 values, each with run-length byte
+    hdr_byte = np.where(tok_rep, tok_len + 128, np.minimum(127, remaining))
+    sizes = hdr + dtype.itemsize
+    offsets = np.cumsum(sizes) - sizes
+    enc = np.empty(int(sizes.sum()), np.uint8)
+    enc[offsets[hdr]] = hdr_byte[hdr]
+    valpos = offsets + hdr
+    enc[valpos[:, None] + np.arange(dtype.itemsize)] = tok_val.astype(dtype).view(np.uint8).reshape(-1, dtype.itemsize)
+    return enc.tobytes()
+
+
+def _encodePoolArray(pool, bit = 16): #returns bytes of differenced and run-length encoded numpy int64 array pool with shape (vertices, planes)
+    max_int = 1 << bit
+    nArrays, nPlanes = pool.shape
+    encpool = bytearray(pack("<IB", nArrays, nPlanes))
+    for n in range(nPlanes):
+        plane = np.empty(nArrays, np.int64)
+        plane[0] = pool[0, n]
+        plane[1:] = np.diff(pool[:, n]) % max_int #differences to previous value taking care of wrapping for unsigned integers
+        encpool.append(3) #plane will be encoded differntiated + runlength
+        encpool.extend(_encodeRunLengthArray(plane, bit))
+    return encpool
+
+
+def _scalePoolArray(pool, scalings, bit = 16): #returns float64 array of numpy array pool with scalings applied to planes the same way as XPLNEDSF._scaleV_
+    max_int = (1 << bit) - 1
+    scaled = pool.astype(np.float64)
+    for n in range(len(scalings)):
+        if float(scalings[n][0]) == 0.0: #planes from first plane with scale 0 on are not scaled
+            break
+        scaled[:, n] = scaled[:, n] * scalings[n][0] / max_int + scalings[n][1]
+    return scaled
+
+
+def _scalePoolList(pool, scalings, bit = 16, reverse = False, asArray = False): #returns list pool with whole planes scaled (or de-scaled with reverse) as array operations the same way as XPLNEDSF._scaleV_; None if pool is no regular array
+    #with asArray the numpy array is returned instead of the list if all planes are scaled
+    max_int = (1 << bit) - 1
+    try:
+        values = np.array(pool, np.float64)
+    except (ValueError, TypeError):
+        return None
+    if values.ndim != 2 or values.shape[1] != len(scalings):
+        return None
+    nScaled = 0 #planes from first plane with scale 0 on are not scaled
+    while nScaled < len(scalings) and float(scalings[nScaled][0]) != 0.0:
+        m, o = scalings[nScaled][0], scalings[nScaled][1]
+        if reverse: #np.rint rounds halfs to even like round()
+            values[:, nScaled] = np.rint((values[:, nScaled] - o) * max_int / m)
+        else:
+            values[:, nScaled] = values[:, nScaled] * m / max_int + o
+        nScaled += 1
+    if reverse:
+        values = values[:, :nScaled].astype(np.int64) #de-scaled values are integers as returned by round()
+    if nScaled == len(scalings):
+        return values if asArray else values.tolist()
+    mixed = np.empty(values.shape[:1] + (len(scalings),), object) #not scaled planes keep their values
+    mixed[:] = pool
+    mixed[:, :nScaled] = values[:, :nScaled]
+    return mixed.tolist()
+
+
+
+class XPLNEcache: #on-disk cache of decoded dsf files as .npz files in folder (requires numpy); least recently used files are removed when all together exceed maxsize bytes
+    def __init__(self, folder, maxsize = 1 << 30):
+        self.folder = folder
+        self.maxsize = maxsize
+
+    def _filename_(self, file): #returns name of cache file for dsf file, keyed by its size and md5 footer
+        size = stat(file).st_size
+        with open(file, "rb") as f:
+            start = f.read(32)
+            f.seek(max(0, size - 16))
+            key = f.read(16)
+        if start.startswith(b'7z\xBC\xAF\x27\x1C'): #for 7ZIP archives start header with crc of archive header (incl. crc of packed file) is added to the key
+            key = md5(start + key).digest()
+        return path.join(self.folder, "{}_{}.npz".format(size, key.hex()))
+
+    def load(self, file): #returns dictionary of arrays cached for dsf file or None
+        name = self._filename_(file)
+        if not path.isfile(name):
+            return None
+        try:
+            with np.load(name, allow_pickle = False) as entry:
+                arrays = {k : entry[k] for k in entry.files}
+        except (OSError, ValueError, EOFError): #also BadZipFile is ValueError, broken cache file is just not used
+            return None
+        utime(name) #modification time of cache file is time of last use
+        return arrays
+
+    def store(self, file, arrays): #stores dictionary of arrays for dsf file, then evicts least recently used cache files
+        makedirs(self.folder, exist_ok = True)
+        self._save_(self._filename_(file), arrays)
+
+    def _save_(self, name, arrays): #saves dictionary of arrays to cache file name, then evicts least recently used cache files
+        with open(name + ".tmp", "wb") as f: #written completely before replacing, so that no incomplete cache file is loaded
+            np.savez(f, **arrays)
+        replace(name + ".tmp", name)
+        self._evict_()
+
+    def _update_(self, name, arrays): #adds dictionary of arrays to existing cache file name (see _filename_), e.g. pools decoded after the entry was stored
+        try:
+            with np.load(name, allow_pickle = False) as entry:
+                stored = {k : entry[k] for k in entry.files}
+        except (OSError, ValueError, EOFError): #cache file evicted or broken in the meantime, nothing to update
+            return
+        stored.update(arrays)
+        self._save_(name, stored)
+
+    def _evict_(self): #removes least recently used cache files until all together do not exceed maxsize
+        entries = []
+        for n in listdir(self.folder):
+            if n.endswith(".npz"):
+                s = stat(path.join(self.folder, n))
+                entries.append((s.st_mtime, s.st_size, n))
+        entries.sort()
+        total = sum(e[1] for e in entries)
+        for mtime, size, n in entries:
+            if total <= self.maxsize:
+                break
+            try:
+                remove(path.join(self.folder, n))
+            except OSError: #e.g. file used in other process, stays in cache
+                continue
+            total -= size
+
+
+
+class XPLNEfileWriter: #writes bytes given with write() in their order to file f in a background thread and updates md5 hash m with them
+    def __init__(self, f, m):
+        self._queue = Queue()
+        self._error = None #first error while writing, raised by write() and close()
+        self.time = 0.0 #seconds spent in thread for hashing and writing
+        self.bytes = 0 #number of bytes written
+        self.count = 0 #number of writes
+        self._thread = Thread(target = self._run_, args = (f, m), daemon = True)
+        self._thread.start()
+
+    def _run_(self, f, m):
+        while True:
+            b = self._queue.get()
+            if b is None:
+                return
+            if self._error is None:
+                start = perf_counter()
+                try:
+                    m.update(b)
+                    f.write(b) #atom is written directly, e.g. from memory map, without copying it
+                    self.bytes += len(b)
+                    self.count += 1
+                except BaseException as err: #any error would otherwise end thread silently and leave a truncated file
+                    self._error = err
+                self.time += perf_counter() - start
+
+    def write(self, b):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(b)
+
+    def close(self): #waits until all bytes are written
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+
+class XPLNEviewReader: #file-like reading of a memoryview, where read() returns slices of the view instead of copies
+    def __init__(self, view):
+        self._view = view
+        self._pos = 0
+    def read(self, size = -1):
+        if size < 0:
+            size = len(self._view) - self._pos
+        start = self._pos
+        self._pos = min(start + size, len(self._view))
+        return self._view[start : self._pos]
+    def tell(self):
+        return self._pos
+    def seek(self, pos):
+        self._pos = pos
+
+
+class XPLNE7zStream: #file-like reading of the first file in a 7ZIP archive, decompressed only as far as read
+    def __init__(self, f, chunksize = 1 << 16):
+        self._f = f #opened archive file
+        self._chunksize = chunksize #bytes read from archive file per decompression step
+        f.seek(0)
+        signature = f.read(32)
+        if len(signature) < 32 or not signature.startswith(b'7z\xBC\xAF\x27\x1C'):
+            raise ValueError("no 7ZIP archive")
+        nextHeaderOffset, nextHeaderSize = unpack('<QQ', signature[12:28])
+        f.seek(32 + nextHeaderOffset)
+        header = f.read(nextHeaderSize)
+        while header[0] == 0x17: #kEncodedHeader, header itself is packed
+            folders, packStreams, unpackSizes = self._readStreamsInfo_(header, 1)[:3]
+            header = self._decompressAll_(folders[0], packStreams[0], unpackSizes[0][0])
+        if header[0] != 0x01: #kHeader
+            raise ValueError("7ZIP header not supported")
+        folders, packStreams, unpackSizes, subSizes, self.name = self._readHeader_(header)
+        if not folders:
+            raise ValueError("7ZIP archive contains no packed file")
+        self.size = subSizes[0] #decompressed length of first file in archive
+        self._packPos_, self._packLeft_ = packStreams[0] #position and length of packed data in archive file
+        self._decompressor_ = self._createDecompressor_(folders[0])
+        self._buffer_ = bytearray() #decompressed but not yet read bytes
+        self._pos_ = 0 #position in decompressed file
+        self.decompressTime = 0.0 #seconds spent for decompression while reading
+        self.decompressCount = 0 #number of decompression steps while reading
+
+    def _readNumber_(self, b, i): #returns 7ZIP encoded number at position i of b and the position after it
+        first = b[i]
+        i += 1
+        mask = 0x80
+        value = 0
+        for n in range(8):
+            if not first & mask:
+                return value | ((first & (mask - 1)) << (8 * n)), i
+            value |= b[i] << (8 * n)
+            i += 1
+            mask >>= 1
+        return value, i
+
+    def _skipDigests_(self, b, i, count): #jumps over CRC values of count streams
+        if b[i]: #all defined
+            defined = count
+            i += 1
+        else:
+            defined = sum(bin(x).count('1') for x in b[i + 1 : i + 1 + (count + 7) // 8])
+            i += 1 + (count + 7) // 8
+        return i + 4 * defined
+
+    def _readStreamsInfo_(self, b, i): #returns folders (list of coders), packed streams, unpack sizes per folder, sizes of first substreams and position after info
+        packPos, packSizes, folders, unpackSizes, numSubStreams, subSizes = 0, [], [], [], [], []
+        while b[i] != 0x00: #kEnd
+            if b[i] == 0x06: #kPackInfo
+                packPos, i = self._readNumber_(b, i + 1)
+                numPackStreams, i = self._readNumber_(b, i)
+                while b[i] != 0x00:
+                    if b[i] == 0x09: #kSize
+                        i += 1
+                        for n in range(numPackStreams):
+                            size, i = self._readNumber_(b, i)
+                            packSizes.append(size)
+                    elif b[i] == 0x0A: #kCRC
+                        i = self._skipDigests_(b, i + 1, numPackStreams)
+                    else:
+                        raise ValueError("7ZIP pack info not supported")
+                i += 1
+            elif b[i] == 0x07: #kUnPackInfo
+                if b[i + 1] != 0x0B or b[i + 3 if b[i + 2] < 0x80 else i + 4] != 0: #kFolder not followed by external = 0
+                    raise ValueError("7ZIP folder info not supported")
+                numFolders, i = self._readNumber_(b, i + 2)
+                i += 1 #external
+                for n in range(numFolders):
+                    numCoders, i = self._readNumber_(b, i)
+                    coders = []
+                    for c in range(numCoders):
+                        flags = b[i]
+                        i += 1
+                        codecId = bytes(b[i : i + (flags & 0x0F)])
+                        i += flags & 0x0F
+                        if flags & 0x10: #complex coder with several in/out streams
+                            raise ValueError("7ZIP complex coders not supported")
+                        props = b''
+                        if flags & 0x20: #coder has properties
+                            size, i = self._readNumber_(b, i)
+                            props = bytes(b[i : i + size])
+                            i += size
+                        coders.append((codecId, props))
+                    for c in range(numCoders - 1): #bind pairs to connect coders
+                        inIndex, i = self._readNumber_(b, i)
+                        outIndex, i = self._readNumber_(b, i)
+                    folders.append(coders)
+                if b[i] != 0x0C: #kCodersUnPackSize
+                    raise ValueError("7ZIP unpack sizes missing")
+                i += 1
+                for coders in folders:
+                    unpackSizes.append([])
+                    for c in coders:
+                        size, i = self._readNumber_(b, i)
+                        unpackSizes[-1].append(size) #first coder in chain provides the final unpacked size
+                while b[i] != 0x00:
+                    if b[i] == 0x0A: #kCRC
+                        i = self._skipDigests_(b, i + 1, len(folders))
+                    else:
+                        raise ValueError("7ZIP unpack info not supported")
+                i += 1
+            elif b[i] == 0x08: #kSubStreamsInfo
+                i += 1
+                numSubStreams = [1] * len(folders)
+                if b[i] == 0x0D: #kNumUnPackStream
+                    i += 1
+                    for n in range(len(folders)):
+                        numSubStreams[n], i = self._readNumber_(b, i)
+                if b[i] == 0x09: #kSize for all substreams except last of each folder
+                    i += 1
+                    for n in range(len(folders)):
+                        for sub in range(numSubStreams[n] - 1):
+                            size, i = self._readNumber_(b, i)
+                            if sub == 0:
+                                subSizes.append(size)
+                        if numSubStreams[n] == 1:
+                            subSizes.append(unpackSizes[n][0])
+                while b[i] != 0x00: #jump over CRCs of substreams
+                    if b[i] == 0x0A:
+                        i = self._skipDigests_(b, i + 1, sum(numSubStreams))
+                    else:
+                        raise ValueError("7ZIP substream info not supported")
+                i += 1
+            else:
+                raise ValueError("7ZIP streams info not supported")
+        if len(packSizes) != len(folders):
+            raise ValueError("7ZIP archives with several packed streams per folder not supported")
+        if not subSizes:
+            subSizes = [sizes[0] for sizes in unpackSizes]
+        packStreams = []
+        for size in packSizes:
+            packStreams.append((32 + packPos, size))
+            packPos += size
+        return folders, packStreams, unpackSizes, subSizes, i + 1
+
+    def _readHeader_(self, b): #returns streams info of main streams and name of first file
+        i = 1
+        folders, packStreams, unpackSizes, subSizes, name = [], [], [], [], ""
+        while b[i] != 0x00:
+            if b[i] == 0x04: #kMainStreamsInfo
+                folders, packStreams, unpackSizes, subSizes, i = self._readStreamsInfo_(b, i + 1)
+            elif b[i] == 0x05: #kFilesInfo
+                numFiles, i = self._readNumber_(b, i + 1)
+                while b[i] != 0x00:
+                    propertyType = b[i]
+                    size, i = self._readNumber_(b, i + 1)
+                    if propertyType == 0x11 and b[i] == 0: #kName not external
+                        end = i + 1
+                        while b[end : end + 2] != b'\x00\x00':
+                            end += 2
+                        name = bytes(b[i + 1 : end]).decode("utf-16-le")
+                    i += size
+                i += 1
+            else:
+                raise ValueError("7ZIP header property {} not supported".format(b[i]))
+        return folders, packStreams, unpackSizes, subSizes, name
+
+    def _createDecompressor_(self, coders): #returns lzma decompressor for coders of a folder
+        if not LZMAINSTALLED:
+            raise ValueError("lzma module not available")
+        filters = []
+        for codecId, props in reversed(coders): #first coder in folder is the last applied when packing
+            if codecId == b'\x03\x01\x01': #LZMA
+                d = props[0]
+                filters.append({'id': lzma.FILTER_LZMA1, 'dict_size': unpack('<I', props[1:5])[0], 'lc': d % 9, 'lp': (d // 9) % 5, 'pb': d // 45})
+            elif codecId == b'\x21': #LZMA2
+                filters.append({'id': lzma.FILTER_LZMA2, 'dict_size': 0xFFFFFFFF if props[0] >= 40 else (2 | (props[0] & 1)) << (props[0] // 2 + 11)})
+            elif codecId == b'\x03\x03\x01\x03': #BCJ x86
+                filters.append({'id': lzma.FILTER_X86})
+            elif codecId == b'\x03': #Delta
+                filters.append({'id': lzma.FILTER_DELTA, 'dist': props[0] + 1})
+            elif codecId != b'\x00': #not just copy
+                raise ValueError("7ZIP coder {} not supported".format(codecId.hex()))
+        if not filters:
+            return None
+        return lzma.LZMADecompressor(format=lzma.FORMAT_RAW, filters=list(reversed(filters)))
+
+    def _decompressAll_(self, coders, packStream, size): #returns complete decompressed data of a folder, used for small packed header
+        self._f.seek(packStream[0])
+        data = self._f.read(packStream[1])
+        decompressor = self._createDecompressor_(coders)
+        if decompressor is None:
+            return data[:size]
+        return decompressor.decompress(data, size)
+
+    def _fill_(self, size): #decompresses until buffer has size bytes or file end is reached
+        while len(self._buffer_) < size and self._pos_ + len(self._buffer_) < self.size:
+            missing = min(size, self.size - self._pos_) - len(self._buffer_)
+            if self._decompressor_ is None or self._decompressor_.needs_input:
+                if self._packLeft_ <= 0:
+                    break #packed data ended before decompressed size is reached
+                self._f.seek(self._packPos_)
+                packed = self._f.read(min(self._chunksize, self._packLeft_))
+                self._packPos_ += len(packed)
+                self._packLeft_ -= len(packed)
+            else:
+                packed = b''
+            if self._decompressor_ is None:
+                self._buffer_.extend(packed)
+            else:
+                start = perf_counter()
+                self._buffer_.extend(self._decompressor_.decompress(packed, max(missing, self._chunksize)))
+                self.decompressTime += perf_counter() - start
+                self.decompressCount += 1
+
+    def read(self, size = -1):
+        if size < 0:
+            size = self.size - self._pos_
+        self._fill_(size)
+        size = min(size, len(self._buffer_), self.size - self._pos_)
+        data = bytes(self._buffer_[:size])
+        del self._buffer_[:size]
+        self._pos_ += size
+        return data
+
+    def tell(self):
+        return self._pos_
+
+
+class XPLNEpools(list): #list of pools V or V32 for lazy read; each pool is decoded from its atom and scaled with first access
+    def __init__(self, atoms, scalings, bit = 16, arrays = None, log = None):
+        super().__init__([None] * len(atoms)) #None for pools not decoded yet
+        self._atoms = list(atoms) #pool atoms as read
+        self._scalings = [[s[:] for s in scal] for scal in scalings] #scalings as read, applied when pool is decoded
+        self._bit = bit
+        self._arrays = arrays #with numpy list of not scaled pool arrays (VArrays), set when pool is decoded
+        self._log = log
+        self.readPools = [None] * len(atoms) #decoded pools as set in list to detect replaced pools; None if not decoded
+        self.scaledPools = 0 #number of first pools that are scaled, set by XPLNEDSF the same way as for pools not read lazy
+        self.cached = {} #with numpy not scaled pool arrays from cache by pool index, used instead of decoding atom
+
+    def decoded(self, p): #returns True if pool p is decoded
+        return list.__getitem__(self, p) is not None
+
+    def shape(self, p): #returns number of vertices and planes of pool p without decoding it
+        pool = list.__getitem__(self, p)
+        if pool is None:
+            return unpack('<IB', self._atoms[p][0:5])
+        if len(pool) == 0:
+            return 0, 0
+        return len(pool), len(pool[0])
+
+    def _decode_(self, p): #decodes and scales pool p from its atom
+        s = self._atoms[p]
+        if NUMPYINSTALLED:
+            pool = self.cached.pop(p, None)
+            if pool is None:
+                pool = _decodePoolArray(s, self._bit)
+            if pool is not None:
+                self._arrays[p] = pool
+                if p < self.scaledPools:
+                    pool = _scalePoolArray(pool, self._scalings[p], self._bit)
+                pool = pool.tolist()
+        else:
+            pool = _decodePool(s, self._bit)
+            if pool is not None:
+                if p < self.scaledPools:
+                    _scalePool(pool, self._scalings[p], self._bit)
+        if pool is None:
+            if self._log is not None: self._log.error("Pool {} has not known encoding of plane and is empty!!!".format(p))
+            pool = []
+        self.readPools[p] = pool
+        list.__setitem__(self, p, pool)
+        return pool
+
+    def _decodeAll_(self):
+        for p in range(len(self)):
+            self[p]
+
+    def __getitem__(self, p):
+        if isinstance(p, slice):
+            for i in range(*p.indices(len(self))):
+                self[i]
+            return list.__getitem__(self, p)
+        pool = list.__getitem__(self, p)
+        if pool is None:
+            pool = self._decode_(p % len(self))
+        return pool
+
+    def __setitem__(self, p, pool):
+        self[p] #decode pool as read to detect changes
+        list.__setitem__(self, p, pool)
+
+    def __iter__(self):
+        for p in range(len(self)):
+            yield self[p]
+
+    def __reversed__(self):
+        for p in range(len(self) - 1, -1, -1):
+            yield self[p]
+
+    def copy(self): #shallow copy with pools not decoded yet
+        c = XPLNEpools([], [], self._bit, self._arrays, self._log)
+        c.extend(list.__iter__(self))
+        c._atoms, c._scalings, c.readPools, c.scaledPools, c.cached = self._atoms, self._scalings, self.readPools, self.scaledPools, self.cached
+        return c
+
+    def __eq__(self, other):
+        self._decodeAll_()
+        return list.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __contains__(self, pool):
+        self._decodeAll_()
+        return list.__contains__(self, pool)
+
+    def __repr__(self):
+        self._decodeAll_()
+        return list.__repr__(self)
+
+    def index(self, *args):
+        self._decodeAll_()
+        return list.index(self, *args)
+
+    def count(self, pool):
+        self._decodeAll_()
+        return list.count(self, pool)
+
+    def pop(self, *args):
+        self._decodeAll_()
+        return list.pop(self, *args)
+
+    def remove(self, pool):
+        self._decodeAll_()
+        list.remove(self, pool)
+
+    def insert(self, p, pool):
+        self._decodeAll_()
+        list.insert(self, p, pool)
+
+    def __delitem__(self, p):
+        self._decodeAll_()
+        list.__delitem__(self, p)
+
+    def sort(self, *args, **kwargs):
+        self._decodeAll_()
+        list.sort(self, *args, **kwargs)
+
+    def reverse(self):
+        self._decodeAll_()
+        list.reverse(self)
+
+    def __add__(self, other):
+        return list(self) + other
+
+    def __reduce_ex__(self, protocol): #copies and pickles are plain lists of decoded pools
+        return list, (list(self),)
+
+
+class XPLNEcmds: #compact storage of unpacked commands in arrays instead of a list of lists
+    def __init__(self):
+        self.ids = array('B') #command id of each command
+        self.starts = array('I', [0]) #index of first value of each command in values, at the end followed by number of all values
+        self.values = array('I') #values of all commands one after each other; floats of command 18 are stored as their 32 bit pattern, chars of commands 32 to 34 as byte values
+        self.positions = array('I') #for commands unpacked from atom byte position of each command in atom, at the end followed by length of atom
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, c): #appends command given as list c in the form of XPLNEDSF.CMDS
+        id = c[0]
+        values = list(c[1:])
+        if id == 18: #floats for LOD stored as bit pattern
+            values[1:3] = unpack('<II', pack('<ff', values[1], values[2]))
+        elif 32 <= id <= 34: #chars stored as byte values
+            values = [v[0] for v in values]
+        elif id == 14: #each winding list stored after its number of indices
+            windings = values[1:]
+            values = [values[0], len(windings)]
+            for w in windings:
+                values.append(len(w))
+                values.extend(w)
+        self.ids.append(id)
+        self.values.extend(values)
+        self.starts.append(len(self.values))
+
+    def value(self, k, n = 0): #returns value number n (without id) of command number k as stored
+        return self.values[self.starts[k] + n]
+
+    def command(self, k): #returns command number k as list in the form of XPLNEDSF.CMDS
+        id = self.ids[k]
+        c = [id]
+        c.extend(self.values[self.starts[k] : self.starts[k + 1]])
+        if id == 18: #LOD values are floats
+            c[2:4] = unpack('<ff', pack('<II', c[2], c[3]))
+        elif 32 <= id <= 34:
+            c[1:] = [bytes([v]) for v in c[1:]]
+        elif id == 14: #windings as lists of indices
+            windings = []
+            i = 3
+            for w in range(c[2]):
+                windings.append(c[i + 1 : i + 1 + c[i]])
+                i += 1 + c[i]
+            c[2:] = windings
+        return c
+
+    def tolist(self): #returns all commands as list of lists
+        return [self.command(k) for k in range(len(self.ids))]
+
+
+class XPLNEcmdList(list): #list of commands of a patch that resets the cached triangles of the patch when commands are set, added or removed
+    _patch = None #patch the commands belong to; class value while list is unpickled or copied before its attributes are set
+
+    def __init__(self, patch, cmds = ()):
+        super().__init__(cmds)
+        self._patch = patch
+
+    def _changed_(self):
+        if self._patch is not None:
+            self._patch._triangleArray = None
+
+    def __setitem__(self, k, c):
+        self._changed_()
+        list.__setitem__(self, k, c)
+
+    def __delitem__(self, k):
+        self._changed_()
+        list.__delitem__(self, k)
+
+    def __iadd__(self, cmds):
+        self._changed_()
+        return list.__iadd__(self, cmds)
+
+    def __imul__(self, n):
+        self._changed_()
+        return list.__imul__(self, n)
+
+    def append(self, c):
+        self._changed_()
+        list.append(self, c)
+
+    def extend(self, cmds):
+        self._changed_()
+        list.extend(self, cmds)
+
+    def insert(self, k, c):
+        self._changed_()
+        list.insert(self, k, c)
+
+    def pop(self, *args):
+        self._changed_()
+        return list.pop(self, *args)
+
+    def remove(self, c):
+        self._changed_()
+        list.remove(self, c)
+
+    def clear(self):
+        self._changed_()
+        list.clear(self)
+
+    def sort(self, *args, **kwargs):
+        self._changed_()
+        list.sort(self, *args, **kwargs)
+
+    def reverse(self):
+        self._changed_()
+        list.reverse(self)
 
 
 class XPLNEpatch:
@@ -55,10 +887,119 @@ class XPLNEpatch:
         self.far = far
         self.defIndex = defIndex
         self.cmds = []
+        self._store = None #compact command storage, if commands of patch are not yet stored as list in cmds
+        self._range = (0, 0) #range of command indices in command storage from first command after patch definition to next patch definition
+        self._pool = None #current pool index when patch was defined
+        self._triangleArray = None #with numpy cached triangles of patch as array, see triangleArray(); reset when commands are changed
+
+    @property
+    def cmds(self): #commands of patch as list of lists (XPLNEcmdList); for read patches list is only built from command storage with first access
+        #a command changed inside (e.g. cmds[k][1] = i) needs to be set again (cmds[k] = c), so that cached triangles are reset
+        if self._cmds is None:
+            self._cmds = XPLNEcmdList(self, self._storedCmds_())
+            self._store = None
+        return self._cmds
+
+    @cmds.setter
+    def cmds(self, cmds):
+        self._cmds = XPLNEcmdList(self, cmds)
+        self._store = None
+        self._triangleArray = None
+
+    def _referCmds_(self, store, first, end, pool): #sets commands of patch to command indices first to end (not included) in command storage store, with pool index pool when patch was defined
+        self._cmds = None
+        self._store = store
+        self._range = (first, end)
+        self._pool = pool
+        self._triangleArray = None
+
+    def _storedCmds_(self): #yields commands of patch from command storage; includes pool change before first and each further pool change as done when extracting commands
+        store = self._store
+        poolIndex = self._pool
+        patchPoolIndex = None
+        for k in range(*self._range):
+            id = store.ids[k]
+            if id == 1: # new pool selection
+                poolIndex = store.value(k)
+            elif 23 <= id <= 31: # the command is about a patch
+                if patchPoolIndex != poolIndex: #change of pool index within patch is possible
+                    yield [1, poolIndex]
+                    patchPoolIndex = poolIndex
+                yield store.command(k)
+
+    def _storedSpan_(self): #returns byte positions start, end of the patch commands in the read commands atom and pool index after them; None if commands are not only stored there
+        store = self._store
+        if store is None or len(store.positions) != len(store.ids) + 1:
+            return None
+        ids = store.ids
+        poolIndex = self._pool
+        last = None #last patch command and pool index after it
+        for k in range(*self._range):
+            id = ids[k]
+            if id == 1:
+                poolIndex = store.value(k)
+            elif 23 <= id <= 31:
+                last = (k, poolIndex)
+            elif last is None: #other commands before first patch command are not part of the patch
+                return None
+            else: #other commands after patch commands belong to following commands
+                break
+        if last is None:
+            return None
+        for k in range(self._range[0], last[0]):
+            if ids[k] != 1 and not 23 <= ids[k] <= 31: #other commands between patch commands would be copied as well
+                return None
+        return store.positions[self._range[0]], store.positions[last[0] + 1], last[1]
+
+    def _iterCmds_(self): #returns iterator over commands of patch without building the list of all commands
+        if self._cmds is None:
+            return self._storedCmds_()
+        return iter(self._cmds)
+
+    def triangleArray(self): #returns triangles of patch as read-only numpy int32 array of shape (n, 3, 2) with pair of pool and vertex index for each vertex; cached until commands change
+        if self._triangleArray is None:
+            self._triangleArray = self._buildTriangleArray_()
+            self._triangleArray.flags.writeable = False
+        return self._triangleArray
+
+    def _buildTriangleArray_(self): #expands triangle, strip, fan and range commands with numpy to same triangles as triangles() without numpy
+        parts = []
+        p = None #current pool needs to be defined with first command
+        for c in self._iterCmds_():
+            if c[0] == 1: # Pool index changed within patch, so change
+                p = c[1]
+                continue
+            elif c[0] in (23, 26, 29): # PATCH TRIANGLE, STRIP or FAN with indices of current pool
+                v = np.array(c[1:], np.int32)
+            elif c[0] in (24, 27, 30): # PATCH TRIANGLE, STRIP or FAN CROSS POOL with pairs of pool and index
+                v = np.array(c[1:], np.int32).reshape(-1, 2)
+            elif c[0] == 25: # PATCH TRIANGLE RANGE
+                v = (np.arange(c[1], c[2] - 1, 3, dtype=np.int32)[:, None] + np.arange(3, dtype=np.int32)).reshape(-1) #last index has one added
+            elif c[0] in (28, 31): # PATCH TRIANGLE STRIP or FAN RANGE
+                v = np.arange(c[1], c[2], dtype=np.int32) #last index has one added
+            else:
+                continue
+            if v.ndim == 1: #add current pool to indices
+                v = np.column_stack((np.full(len(v), p, np.int32), v))
+            if c[0] in (23, 24, 25): # single triangles
+                parts.append(v[: len(v) // 3 * 3].reshape(-1, 3, 2))
+                continue
+            j = np.arange(2, len(v)) #each further vertex adds a triangle
+            if c[0] in (26, 27, 28): # Strip 1,2,3,4,5 refers to triangles 1,2,3 2,4,3 3,4,5
+                even = (j % 2 == 0)[:, None]
+                parts.append(np.stack((v[j - 2], np.where(even, v[j - 1], v[j]), np.where(even, v[j], v[j - 1])), axis=1))
+            else: # Fan with center at first vertex
+                parts.append(np.stack((np.broadcast_to(v[0], (len(j), 2)), v[j - 1], v[j]), axis=1))
+        if not parts:
+            return np.zeros((0, 3, 2), np.int32)
+        return np.concatenate(parts).astype(np.int32)
+
     def triangles(self): #returns triangles as a list l of [3 x vertexes] that are defined by commands c of thte patch where each vertex of triangle is a pair of index to pool p and vertex        
+        if NUMPYINSTALLED: #new lists from cached triangle array
+            return self.triangleArray().tolist()
         l = []
         p = None #current pool needs to be defined with first command
-        for c in self.cmds:
+        for c in self._iterCmds_():
             if c[0] == 1: # Pool index changed within patch, so change
                 p = c[1]
             elif c[0] == 23: # PATCH TRIANGLE
@@ -99,26 +1040,128 @@ class XPLNEpatch:
                     l.append( [ [p, c[1]], [p, v + 1], [p, v + 2] ] )                    
         return l
               
-    def trias2cmds(self, trias): ############## UPDATE FOR MEXP to allow definition of own trias 
-        ### For the moment only uses single tirangle CMDS for different pools ## To be updeated
-        if len(self.cmds) > 0: ############### NEW 03.04.2020 ####################################
-            self.cmds = [self.cmds[0]] #just stay with pool defintion in first command
+    def trias2cmds(self, trias): ############## UPDATE FOR MEXP to allow definition of own trias; trias as list or as array like from triangleArray()
+        #trias are grouped by pool and encoded with range, strip and fan commands where possible; returns size of the commands in bytes
+        triaArray = None
+        if NUMPYINSTALLED and isinstance(trias, np.ndarray):
+            triaArray = trias.astype(np.int32).reshape(-1, 3, 2)
+            trias = triaArray.tolist()
+        groups = {} #for each pool indices of trias with all vertices in this pool, in order of first appearance
+        cross = [] #indices of trias with vertices from different pools
+        for i, t in enumerate(trias):
+            if t[0][0] == t[1][0] == t[2][0]:
+                groups.setdefault(t[0][0], []).append(i)
+            else:
+                cross.append(i)
+        firstcmd = next(self._iterCmds_(), None) #first command without building list of commands from storage
+        if groups and (firstcmd is None or firstcmd[1] not in groups): #pool of first command should be the one of first trias to avoid a further pool change
+            firstcmd = [1, next(iter(groups))]
+        if firstcmd is not None: ############### NEW 03.04.2020 ####################################
+            self.cmds = [firstcmd] #just stay with pool defintion in first command
         else: #first command not yet set
             if len(trias):  # trias might also be empty then this pools stays empty  ### NEW: 14.12.2020 ####
                 self.cmds = [[1, trias[0][0][0]]] #take pool from first vertex in first tria as first command to define pool
-        i = 0 #counts number of trias
-        c = [] #builds single commands
-        for t in trias:
-            if (i % 85) == 0: #start new triangle command at beginning and when max length is reached (3 value pairs per triangle, so 255 / 3 = 85)
-                if len(c) > 1: #are there already values for commands
-                    self.cmds.append(c) #append them the the commands
-                c = [24]
-            c.extend(t[0])
-            c.extend(t[1])
-            c.extend(t[2])
-            i += 1
-        if len(c) > 1:
-            self.cmds.append(c) #add the final command
+        order = [] #indices of trias in the order they are now encoded
+        for p in sorted(groups, key=lambda p: p != self.cmds[0][1]): #start with pool of first command
+            if p != self.cmds[0][1]:
+                self.cmds.append([1, p])
+            self.cmds.extend(self._poolTriasCmds_([(trias[i][0][1], trias[i][1][1], trias[i][2][1]) for i in groups[p]]))
+            order.extend(groups[p])
+        for n in range(0, len(cross), 85): #remaining trias with vertices from different pools as PATCH TRIANGLE CROSS POOL, max 85 trias per command (3 value pairs per triangle, so 255 / 3 = 85)
+            c = [24]
+            for i in cross[n : n + 85]:
+                c.extend(trias[i][0])
+                c.extend(trias[i][1])
+                c.extend(trias[i][2])
+            self.cmds.append(c)
+        order.extend(cross)
+        if triaArray is not None: #given array in encoded order are now exactly the triangles of patch
+            triaArray = triaArray[order] if order != list(range(len(order))) else triaArray
+            triaArray.flags.writeable = False
+            self._triangleArray = triaArray
+        size = 0
+        for c in self._iterCmds_():
+            if c[0] == 1:
+                size += 3
+            elif c[0] in (25, 28, 31): # ranges with id and two unsigned shorts
+                size += 5
+            else: # id, count and unsigned shorts for indices or pairs of pool and index
+                size += 2 + 2 * (len(c) - 1)
+        return size
+
+    @staticmethod
+    def _poolTriasCmds_(trias): #returns commands for trias given as triples of vertex indices in current pool with minimal size; order of trias and their vertices is kept
+        n = len(trias)
+        rng = [0] * (n + 1) #number of trias from this one on as triangle range: v, v+1, v+2 followed by v+3, ...
+        stripE = [0] * (n + 1) #number of trias from this one on as strip, with this tria at even position of strip
+        stripO = [0] * (n + 1) #same with this tria at odd position
+        rstripE = [0] * (n + 1) #as strip but on consecutive vertex indices so a strip range
+        rstripO = [0] * (n + 1)
+        fan = [0] * (n + 1) #number of trias from this one on as fan with center at first vertex
+        rfan = [0] * (n + 1) #as fan with consecutive vertices following center; for a fan range first tria has to be v, v+1, v+2
+        for i in range(n - 1, -1, -1):
+            a, b, c = trias[i]
+            x, y, z = trias[i + 1] if i + 1 < n else (None, None, None)
+            consec = b == a + 1 and c == a + 2
+            contE = x == b and z == c # Strip 1,2,3,4,5 refers to triangles 1,2,3 2,4,3 3,4,5
+            contO = x == c and y == b
+            contF = x == a and y == c
+            rng[i] = 1 + (rng[i + 1] if x == a + 3 else 0) if consec else 0
+            stripE[i] = 1 + (stripO[i + 1] if contE else 0)
+            stripO[i] = 1 + (stripE[i + 1] if contO else 0)
+            rstripE[i] = 1 + (rstripO[i + 1] if contE else 0) if consec else 0
+            rstripO[i] = 1 + (rstripE[i + 1] if contO else 0) if b == a + 2 and c == a + 1 else 0
+            fan[i] = 1 + (fan[i + 1] if contF else 0)
+            rfan[i] = 1 + (rfan[i + 1] if contF and z == c + 1 else 0)
+        #minimal size for trias from i on, without (cost[0]) or with (cost[1]) a PATCH TRIANGLE command open for further single trias
+        cost = [[0] * (n + 1), [0] * (n + 1)]
+        choice = [[None] * n, [None] * n]
+        for i in range(n - 1, -1, -1):
+            a = trias[i][0]
+            runs = [] #options as (size, command id, number of trias)
+            if rng[i] and a + 3 * rng[i] <= 65535: #last index has one added and needs to fit in unsigned short
+                runs.append((5, 25, rng[i]))
+            if rstripE[i] > 1 and a + rstripE[i] + 2 <= 65535:
+                runs.append((5, 28, rstripE[i]))
+            if rstripE[i] and rfan[i] > 1 and a + rfan[i] + 2 <= 65535: #rstripE set means first tria is v, v+1, v+2
+                runs.append((5, 31, rfan[i]))
+            l = min(stripE[i], 252) #max 255 indices per command; even number of trias so that strip can be continued with next command
+            if l > 1:
+                runs.append((4 + 2 * l, 26, l))
+            l = min(fan[i], 253)
+            if l > 1:
+                runs.append((4 + 2 * l, 29, l))
+            best = None
+            for size, id, l in runs:
+                if best is None or size + cost[0][i + l] < best[0]:
+                    best = (size + cost[0][i + l], id, l)
+            for opened in (0, 1):
+                single = 6 + (0 if opened else 2) + cost[1][i + 1] #tria added to PATCH TRIANGLE command, new command needs id and count
+                if best is not None and best[0] <= single:
+                    cost[opened][i], choice[opened][i] = best[0], (best[1], best[2])
+                else:
+                    cost[opened][i], choice[opened][i] = single, (23, 1)
+        cmds = []
+        i = 0
+        opened = 0 #PATCH TRIANGLE command open for further trias
+        while i < n:
+            id, l = choice[opened][i]
+            t = trias[i]
+            if id == 23:
+                if not opened or len(cmds[-1]) == 256: #max 255 indices per command, so 85 trias
+                    cmds.append([23])
+                cmds[-1].extend(t)
+            elif id == 25:
+                cmds.append([25, t[0], t[0] + 3 * l])
+            elif id in (28, 31):
+                cmds.append([id, t[0], t[0] + l + 2])
+            elif id == 26:
+                cmds.append([26, t[0], t[1], t[2]] + [trias[k][1] if (k - i) % 2 else trias[k][2] for k in range(i + 1, i + l)])
+            else:
+                cmds.append([29, t[0], t[1], t[2]] + [trias[k][2] for k in range(i + 1, i + l)])
+            opened = 1 if id == 23 else 0
+            i += l
+        return cmds
 
 
 class XPLNEraster: #Stores data of Raster Atoms (each dsf could have serverl raster layers)
@@ -131,15 +1174,49 @@ class XPLNEraster: #Stores data of Raster Atoms (each dsf could have serverl ras
         self.scale = None #scale factor for height values
         self.offset = None #offset for heigt values
         self.data = [] #will store final raster heigt values (after scaling and adding offset) in 2-dimensional list: [pixel x] [pixel y]
-        
+        self._raw = None #with numpy: array of not scaled raster values [pixel y, pixel x] viewed directly on bytes of raster data atom
+        self._atom = None #without numpy for lazy read: raster data atom, unpacked with first access of data
+        self._ctype = None #format of single value in raster data atom
+
+    @property
+    def data(self): #with numpy scale and offset are applied to raw values with first access of data, then data is numpy array indexed by [pixel x] [pixel y]
+        if self._data is None and self._raw is not None:
+            self._data = self._scaleRaw_()
+        elif self._data is None and self._atom is not None:
+            self._data = self._unpackAtom_()
+        return self._data
+
+    @data.setter
+    def data(self, values):
+        self._data = values
+
+    def _scaleRaw_(self): #returns raw values with scale and offset applied as numpy array indexed by [pixel x] [pixel y]
+        return self._raw.T.astype(np.float64) * self.scale + self.offset
+
+    def _unpackAtom_(self): #returns values of raster data atom with scale and offset applied as lists indexed by [pixel x] [pixel y]
+        return _unpackRaster(self._atom, self._ctype, self.bpp, self.width, self.height, self.scale, self.offset)
+
 
 class XPLNEDSF:   
-    def __init__(self, logname='__XPLNEDSF__', statusfunction = "stdout"):
+    def __init__(self, logname='__XPLNEDSF__', statusfunction = "stdout", metricsfunction = None):
         if logname != "_keep_logger_": self._log_ = self._setLogger_(logname)
         if statusfunction != "_keep_statusfunction_": self._statusfunction_ = statusfunction
+        if metricsfunction != "_keep_metricsfunction_": self._metricsfunction_ = metricsfunction #called with dictionary for each measured phase of read/write
         self._DEBUG_ = True if self._log_.getEffectiveLevel() < 20 else False #have DEBUG value in order to call only logger for debug if DEBUG enabled  --> saves time
+        self.Metrics = {} #time, bytes and counts per phase of last read or write, see _startMetrics_()
+        self._metricsStart_ = 0.0 #start time of last read or write
         self._progress_ = [0, 0, 0] #progress as 3 list items (amount of bytes read/written in percant and shown, read/written but not yet shown as number of bytes) and number of bytes to be processed in total
         self._Atoms_ = {} #dictonary containg for every atom in file the according strings
+        self._Map_ = None #memory map of read file, if read with memorymap; atoms are then memoryviews on this map
+        self._MapFile_ = None #name of memory mapped file
+        self._Cached_ = None #arrays of read file from XPLNEcache, used instead of decoding atoms
+        self._CacheEntry_ = None #cache, name of cache file and keys of pool arrays in it for read file; pools decoded later are added with write
+        self._Archive_ = False #True if read file is 7ZIP archive
+        self._Executor_ = None #while reading with workers process pool to decode pools and rasters in parallel
+        self._Workers_ = 0 #number of processes of _Executor_
+        self._ReadAtoms_ = {} #atoms as read from file; atoms of values not changed since read are written again without encoding
+        self._ReadState_ = {} #copies of values as extracted from read atoms, used to detect changes since read
+        self._PoolsChanged_ = {16 : set(), 32 : set()} #indices of 16 and 32 bit pools marked by poolChanged() as changed in place since read
         self._AtomStructure_ = {'DAEH' : ['PORP'], 'NFED' : ['TRET', 'TJBO', 'YLOP', 'WTEN', 'NMED'], 'DOEG' : ['LOOP', 'LACS', '23OP', '23CS'], 'SMED' : ['IMED', 'DMED'], 'SDMC' : []}
         self._AtomList_ = ['DAEH', 'NFED', 'DOEG', 'SMED', 'SDMC', 'PORP', 'TRET', 'TJBO', 'YLOP', 'WTEN', 'NMED', 'LOOP', 'LACS', '23OP', '23CS', 'IMED', 'DMED']
         self._AtomOfAtoms_ = ['DAEH', 'NFED', 'DOEG', 'SMED']
@@ -147,13 +1224,17 @@ class XPLNEDSF:
         self._CMDStructure_ = {1 : ['H'], 2 : ['L'], 3 : ['B'], 4 : ['H'], 5 : ['L'], 6 : ['B'], 7 : ['H'], 8 : ['HH'], 9 : ['', 'B', 'H'], 10 : ['HH'], 11 : ['', 'B', 'L'], 12 : ['H', 'B', 'H'], 13 : ['HHH'], 15 : ['H', 'B', 'H'], 16 : [''], 17 : ['B'], 18 : ['Bff'], 23 : ['', 'B', 'H'], 24 : ['', 'B', 'HH'], 25 : ['HH'], 26 : ['', 'B', 'H'], 27 : ['', 'B', 'HH'], 28 : ['HH'], 29 : ['', 'B', 'H'], 30 : ['', 'B', 'HH'], 31 : ['HH'], 32 : ['', 'B', 'c'], 33 : ['', 'H', 'c'], 34 : ['', 'L', 'c']}
         self._CMDStructLen_ = {1 : [2], 2 : [4], 3 : [1], 4 : [2], 5 : [4], 6 : [1], 7 : [2], 8 : [4], 9 : [0, 1, 2], 10 : [4], 11 : [0, 1, 4], 12 : [2, 1, 2], 13 : [6], 15 : [2, 1, 2], 16 : [0], 17 : [1], 18 : [9], 23 : [0, 1, 2], 24 : [0, 1, 4], 25 : [4], 26 : [0, 1, 2], 27 : [0, 1, 4], 28 : [4], 29 : [0, 1, 2], 30 :  [0, 1, 4], 31 : [4], 32 : [0, 1, 1], 33 : [0, 2, 1], 34 : [0, 4, 1]}
         self.FileHash = "" #Hash value of dsf file read
-        self.CMDS = [] #unpacked commands
+        self._CMDStore_ = XPLNEcmds() #unpacked commands in compact storage
+        self._CMDSList_ = None #unpacked commands as list of lists, only built when accessed via CMDS
         self.Patches = [] #mesh patches, list of objects of class XPLNEpatch
         self.V = [] # 3 dimensional list of all vertices whith V[PoolID][Vertex][xyz etc coordinates]
         self.V32 = [] # same as V but for 32-bit coordinates
+        self.VArrays = [] # decoded (not scaled) 16-bit pools as numpy arrays of shape (vertices, planes), only filled if numpy is installed
+        self.V32Arrays = [] # same as VArrays but for 32-bit pools
         self.Scalings = [] # 3 dimensional list of all scale multipliers and offsets for all pools and planes with Scalings[PoolID][coordinate Plane][m / o]
         self.Scal32 = [] # same as Scalings but for vertices with 32-bit coordinates
         self.Raster = [] #raster layers of file
+        self._CMDSpans_ = None #byte spans in read commands atom with commands of objects, polygons and networks, if they are not extracted yet (read with meshonly)
         self.Polygons = [] #for each Polygon Definition (same order as in DefPolygon) a list of PoolId, CommandData values of Polygon
         self.Objects = [] #for each Object Definition (same order as in DefObjects) a list of PoolId, CommandData values of Polygon
         self.Networks = [] #list of network junks where in first positions road subtype, Junction offset, PoolIndex are stored, following by commands for these settings
@@ -165,6 +1246,55 @@ class XPLNEDSF:
         self.DefRasters = {}   #dictionary containing for each index number (0 to n-1) the name of Raster definition (for the moment assuing "elevaiton" is first with index 0)
         self._log_.info("Class XPLNEDSF initialized.")
 
+    @property
+    def CMDS(self): #unpacked commands as list of lists, built from compact command storage with first access
+        if self._CMDSList_ is None:
+            self._CMDSList_ = self._CMDStore_.tolist()
+        return self._CMDSList_
+
+    @CMDS.setter
+    def CMDS(self, cmds):
+        self._CMDStore_ = XPLNEcmds()
+        for c in cmds:
+            self._CMDStore_.append(c)
+        self._CMDSList_ = None
+
+    @property
+    def Objects(self): #with read meshonly objects, polygons and networks are extracted from commands with first access
+        if self._CMDSpans_ is not None:
+            self._extractCMDS_(patches = False)
+        return self._Objects_
+
+    @Objects.setter
+    def Objects(self, objects):
+        if self._CMDSpans_ is not None: #extract all before, as their commands are only written with spans
+            self._extractCMDS_(patches = False)
+        self._Objects_ = objects
+
+    @property
+    def Polygons(self):
+        if self._CMDSpans_ is not None:
+            self._extractCMDS_(patches = False)
+        return self._Polygons_
+
+    @Polygons.setter
+    def Polygons(self, polygons):
+        if self._CMDSpans_ is not None:
+            self._extractCMDS_(patches = False)
+        self._Polygons_ = polygons
+
+    @property
+    def Networks(self):
+        if self._CMDSpans_ is not None:
+            self._extractCMDS_(patches = False)
+        return self._Networks_
+
+    @Networks.setter
+    def Networks(self, networks):
+        if self._CMDSpans_ is not None:
+            self._extractCMDS_(patches = False)
+        self._Networks_ = networks
+
     def _setLogger_(self, logname):
         if logname == '__XPLNEDSF__': #define default logger if nothing is set
             logger = getLogger('XPLNEDSF')
@@ -195,6 +1325,34 @@ class XPLNEDSF:
                 print ('[{}%]'.format(self._progress_[0]), end='', flush = True)
             elif self._statusfunction_ != None:
                 self._statusfunction_(self._progress_[0])
+
+
+    def _startMetrics_(self, call, file): #resets metrics for new read or write of file; phases are listed in the order they are processed
+        phases = ["atom scan", "decompression", "rasters", "scalings", "pools", "commands"] if call == "read" else ["encode", "write"]
+        self.Metrics = {"call" : call, "file" : file, "time" : 0.0, "bytes" : 0, "phases" : {p : {"time" : 0.0, "bytes" : 0, "count" : 0} for p in phases}}
+        self._metricsStart_ = perf_counter()
+
+    def _addMetrics_(self, phase, seconds, bytes = 0, count = 0): #adds wall time, processed bytes and number of processed objects to phase and streams them to metricsfunction
+        m = self.Metrics["phases"].setdefault(phase, {"time" : 0.0, "bytes" : 0, "count" : 0})
+        m["time"] += seconds
+        m["bytes"] += bytes
+        m["count"] += count
+        if self._metricsfunction_ != None:
+            self._metricsfunction_({"call" : self.Metrics["call"], "file" : self.Metrics["file"], "phase" : phase, "time" : seconds, "bytes" : bytes, "count" : count})
+
+    def _finishMetrics_(self, bytes): #sets total time and bytes of file read/written
+        self.Metrics["time"] = perf_counter() - self._metricsStart_
+        self.Metrics["bytes"] = bytes
+        if self._metricsfunction_ != None:
+            self._metricsfunction_({"call" : self.Metrics["call"], "file" : self.Metrics["file"], "phase" : "total", "time" : self.Metrics["time"], "bytes" : bytes, "count" : len(self.Metrics["phases"])})
+
+    def _atomBytes_(self, *atomIDs): #returns total length and number of atoms with given ids
+        atoms = [a for k in atomIDs if k in self._Atoms_ for a in (self._Atoms_[k] if k in self._MultiAtoms_ else [self._Atoms_[k]])]
+        return sum(len(a) for a in atoms), len(atoms)
+
+    def getMetrics(self, asJSON = False): #returns metrics of last read or write as dictionary or as JSON string
+        #phases with their wall time in seconds, bytes processed and number of objects (atoms, pools, commands, rasters) processed
+        return dumps(self.Metrics) if asJSON else self.Metrics
     
     
     def _TopAtomLength_(self, id): #calculates the lengthe of an AtomOfAtoms with name id including all sub-atoms
@@ -217,7 +1375,7 @@ class XPLNEDSF:
             j = i
             while atom[j] != 0 and j < len(atom):
                 j += 1
-            l.append(atom[i:j].decode("utf-8"))
+            l.append(bytes(atom[i:j]).decode("utf-8"))
             i = j + 1
         return l
     
@@ -235,6 +1393,9 @@ class XPLNEDSF:
             self.Properties[l[i]] = l[i+1] #the list contains property(dictionary key) and values one after each other
             
     def _encodeProps_(self): #encodes the properties of the dsf and stores them in PORP atom
+        if self._ReadState_.get('PORP') == self.Properties: #properties not changed since read
+            self._Atoms_['PORP'] = self._ReadAtoms_['PORP']
+            return
         b = b'' #binary encoding to be stored in PORP
         for prop in self.Properties:
             b += prop.encode("utf-8")
@@ -273,77 +1434,83 @@ class XPLNEDSF:
         self._updateProgress_(self._TopAtomLength_('NFED'))
 
         
-    def _encodeDefs_(self): #encodes the definition dictionaries in dsf object to (DEFN) atoms
-        self._Atoms_['TRET'] = self._PutStrings_(self.DefTerrains)
-        self._Atoms_['TJBO'] = self._PutStrings_(self.DefObjects)
-        self._Atoms_['YLOP'] = self._PutStrings_(self.DefPolygons)
-        self._Atoms_['WTEN'] = self._PutStrings_(self.DefNetworks)
-        if 'NMED' in self._Atoms_ or len(self.DefRasters) > 0:  # skip writing DEMN atom for XP versions older v 10
-            self._Atoms_['NMED'] = self._PutStrings_(self.DefRasters)
-        else:
-            self._log_.warning("No DEMN atom (raster definition) was present and none defined so skipped writing it!")
+    def _DefsOfAtoms_(self): #returns pairs of definition atom id and according definition dictionary
+        return [('TRET', self.DefTerrains), ('TJBO', self.DefObjects), ('YLOP', self.DefPolygons), ('WTEN', self.DefNetworks), ('NMED', self.DefRasters)]
+
+    def _encodeDefs_(self): #encodes the definition dictionaries in dsf object to (DEFN) atoms; definitions not changed since read keep their read atom
+        for atomID, defs in self._DefsOfAtoms_():
+            if atomID == 'NMED' and 'NMED' not in self._Atoms_ and len(defs) == 0:  # skip writing DEMN atom for XP versions older v 10
+                self._log_.warning("No DEMN atom (raster definition) was present and none defined so skipped writing it!")
+            elif self._ReadState_.get(atomID) == defs:
+                self._Atoms_[atomID] = self._ReadAtoms_[atomID]
+            else:
+                self._Atoms_[atomID] = self._PutStrings_(defs)
 
 
 
         
-    def _extractPools_(self, bit = 16):  
+    def _extractPools_(self, bit = 16, lazy = False): #with lazy pools are just prepared to be decoded with first access; scalings have then to be extracted before
         if bit == 32:
             self._log_.info("Start to unpack and extract {} pools ({} bit)...".format(len(self._Atoms_['23OP']), bit))
             atomstring = self._Atoms_['23OP']
             V = self.V32
-            ctype = "<L"
-            size = 4 #bytes read per coordinate in 32 bit pool
-            max_int = 4294967296
+            VArrays = self.V32Arrays
         else: #assuming the standard 16bit Pool case
             self._log_.info("Start to unpack and extract {} pools ({} bit)...".format(len(self._Atoms_['LOOP']), bit))
             atomstring = self._Atoms_['LOOP']
             V = self.V
-            ctype = "<H"
-            size = 2 #bytes read per coordinate in 16 bit pool
-            max_int = 65536
-        for s in atomstring: #goes through all Pools read; string s has to be unpacked
-            nArrays, nPlanes = unpack('<IB', s[0:5])
-            if self._DEBUG_: self._log_.debug("Pool number {} has {} Arrays (vertices) with {} Planes (coordinates per vertex)!".format(len(V), nArrays, nPlanes))
-            V.append([]) #the current pool starts empty
-            for i in range(nArrays): ## span up multi-dimensional array for the new pool of required size (number of vertices in pool)
-                V[-1].append([])
-            pos = 5 #position in string s
-            for n in range(nPlanes):
-                encType, = unpack('<B', s[pos : pos + 1])
-                pos += 1
-                if self._DEBUG_: self._log_.debug("Plane {} is encoded: {}".format(n, encType))
-                if encType < 0 or encType > 3: #encoding not defined
+            VArrays = self.VArrays
+        if lazy:
+            if NUMPYINSTALLED:
+                VArrays.extend([None] * len(atomstring)) #set when pool is decoded
+            V = XPLNEpools(atomstring, self.Scal32 if bit == 32 else self.Scalings, bit, VArrays if NUMPYINSTALLED else None, self._log_)
+            if self._Cached_ is not None:
+                V.cached = {p : self._Cached_["pool{}_{}".format(bit, p)] for p in range(len(V)) if "pool{}_{}".format(bit, p) in self._Cached_}
+            V.scaledPools = self._scaledPools_(V, self.Scal32 if bit == 32 else self.Scalings)
+            if bit == 32:
+                self.V32 = V
+            else:
+                self.V = V
+            self._log_.info("{} pools will be decoded with first access.".format(len(V)))
+            return
+        if NUMPYINSTALLED:
+            for s, pool in zip(atomstring, self._decodedPools_(atomstring, bit, _decodePoolArray)): #decode complete planes of each pool with numpy
+                if pool is None:
                     self._log_.error("Stopp reading pool because not known encoding of plane found!!!")
-                    return [] ##This means we return empty pool, which can be used to detect error        
-                i = 0  #counts how many arrays = vertices have been read in plane n
-                while i < nArrays:
-                    if encType >= 2: #this means data is run-length encoded
-                        runLength, = unpack('<B', s[pos : pos + 1])
-                        pos += 1
-                    else: #no run-length encoding (not tested yet!!!!!)
-                        runLength = 1 #just read single values until end of this plane  
-                    if runLength > 127: #means the following value is repeated
-                        v, = unpack(ctype, s[pos : pos + size]) #repeated value
-                        pos += size
-                        runLength -= 128 #only value without 8th bit gives now the number of repetitions
-                        while runLength > 0:
-                            V[-1][i].append(v)
-                            runLength -= 1
-                            i += 1
-                    else:
-                        while runLength > 0: #now just reading individual values
-                            v, = unpack(ctype, s[pos : pos + size])
-                            pos += size
-                            V[-1][i].append(v)
-                            runLength -= 1
-                            i += 1
-                if encType == 1 or encType == 3: #values are also stored differenced
-                    for i in range (1, nArrays):  
-                        V[-1][i][n] = (V[-1][i][n] + V[-1][i-1][n]) % max_int  #undo differntiation and modulo for wrapping two byte unsigned integer
-                                                         ##### NEW TBD #### FOR 32 Bit Pools adapt Moduls ??!! #################### NEW TBD ######################## NEW TBD ########
+                    V[:] = [pool.tolist() for pool in VArrays] #pools decoded so far stay not scaled
+                    return [] ##This means we return empty pool, which can be used to detect error
+                if self._DEBUG_: self._log_.debug("Pool number {} has {} Arrays (vertices) with {} Planes (coordinates per vertex)!".format(len(V), pool.shape[0], pool.shape[1]))
+                VArrays.append(pool)
+                V.append(pool) #replaced by list of vertices when scaled
+                self._updateProgress_(len(s))
+            Scalings = self.Scal32 if bit == 32 else self.Scalings
+            self._scaleV_(bit, False, V) #scaled directly from the arrays without converting them to lists first
+            for p in range(self._scaledPools_(VArrays, Scalings), len(V)): #pools not scaled
+                V[p] = V[p].tolist()
+            return
+        for s, pool in zip(atomstring, self._decodedPools_(atomstring, bit, _decodePool)): #goes through all Pools read; string s has to be unpacked
+            if pool is None:
+                self._log_.error("Stopp reading pool because not known encoding of plane found!!!")
+                return [] ##This means we return empty pool, which can be used to detect error
+            if self._DEBUG_: self._log_.debug("Pool number {} has {} Arrays (vertices) with {} Planes (coordinates per vertex)!".format(len(V), len(pool), len(pool[0]) if pool else 0))
+            V.append(pool)
             self._updateProgress_(len(s))
 
 
+    def _decodedPools_(self, atomstring, bit, decode): #yields pools of atoms in atomstring in their order, decoded with function decode or taken from cache; with workers they are decoded in parallel processes
+        todo = [p for p in range(len(atomstring)) if self._Cached_ is None or "pool{}_{}".format(bit, p) not in self._Cached_]
+        if self._Executor_ is not None and len(todo) > 1:
+            self._log_.info("Decoding {} pools in {} processes.".format(len(todo), self._Workers_))
+            decoded = self._Executor_.map(decode, [bytes(atomstring[p]) for p in todo], [bit] * len(todo), chunksize = max(1, len(todo) // (4 * self._Workers_)))
+        else:
+            decoded = (decode(atomstring[p], bit) for p in todo)
+        for p in range(len(atomstring)):
+            if self._Cached_ is not None and "pool{}_{}".format(bit, p) in self._Cached_:
+                yield self._Cached_["pool{}_{}".format(bit, p)]
+            else:
+                yield next(decoded)
+
+
     def _encodeRunLength_(self, l):  # yields runlength encoded value pairs of list l
         count = 1 #counting repetitions
         prev = l[0] #the previous value in list starts with first value in the list
@@ -368,61 +1535,114 @@ class XPLNEDSF:
             yield(len(individuals), individuals)
         
     
-    def _encodePools_(self, bit = 16): #overwrites current 16 (default) or 32 bit Pool atom with actual values of all vertices
+    def _encodePool_(self, p, bit, poolIndex): #returns binary encoding of the de-scaled vertices of single pool p with index poolIndex; values of first vertex are kept in range
         if bit == 32:
-            atom = '23OP'
-            V = self.V32
             ctype = "<L"
             max_int = 4294967296
         else: #assuming the standard 16bit Pool case
-            atom = 'LOOP'
-            V = self.V
             ctype = "<H"
-            max_int = 65536            
-        self._log_.info("Start to encode {}  {}bit pools... (read values of vertices are overwritten)".format(len(V), bit))
-        self._Atoms_[atom] = [] #start new (future version also think of creating Pool atom in case it new dsf file will be created !!!!!!!!!!)
+            max_int = 65536
+        if len(p) == 0: #some standard dsf files have empty pools, keep them
+            self._log_.info("Empty pool number {} encoded.".format(poolIndex))
+            return pack("<IB",0,0) #pool has no vertices with no planes (is empty)
+        if NUMPYINSTALLED:
+            try:
+                poolarray = np.array(p, dtype=np.int64)
+            except (ValueError, TypeError, OverflowError): #e.g. vertices with different number of planes, encode them below
+                poolarray = None
+            if poolarray is not None and poolarray.ndim == 2:
+                for n in range(len(p[0])): #first values are only checked for their range, as all other differences are taken modulo
+                    if p[0][n] < 0:
+                        self._log_.warning("In pool {} negative value {} to be encoded. Set to 0.".format(poolIndex, p[0][n]))
+                        p[0][n] = 0
+                    if p[0][n] >= max_int:
+                        self._log_.warning("In pool {} exceeding value {}  to be encoded. Set to {}.".format(poolIndex, p[0][n], max_int-1))
+                        p[0][n] = max_int - 1
+                return _encodePoolArray(poolarray, bit)
         ####### This version only stores pools in differentiated run-length encoding !!! #############
-        ## Start with differentiation of all values ##
-        for p in V: # go through all pools
-            if len(p) == 0: #some standard dsf files have empty pools, keep them
-                self._log_.info("Empty pool number {} encoded.".format(V.index(p)))
-                encpool = pack("<IB",0,0) #pool has no vertices with no planes (is empty)
-                self._Atoms_[atom].append(encpool)
+        encpool = bytearray() ### NEW ###
+        encpool.extend(pack("<IB",len(p),len(p[0]))) ### NEW ###  ## start string of binary encoded pool number of arrays and number of planes (taken from first vertex)
+        for n in range(len(p[0])): # go through all planes; number of planes just taken from first vertex in pool
+            plane = [p[0][n]] #set plane to first value (for starts with second value to calculete differences)
+            for i in range(1, len(p)): #go through all values of a plane for differntiation and append to current plane
+                plane.append((p[i][n] - p[i-1][n]) % max_int)  #Calculate difference to previous value AND take care of wrapping for two byte unsigned integer
+            encpool.extend(pack('<B',3)) #### NEW ### #plane will be encoded differntiated + runlength
+            if p[0][n] < 0:  #### NEW 4.3 #####
+                self._log_.warning("In pool {} negative value {} to be encoded. Set to 0.".format(poolIndex, p[0][n]))
+                p[0][n] = 0
+            if p[0][n] >= max_int: #### NEW 4.3 #####
+                self._log_.warning("In pool {} exceeding value {}  to be encoded. Set to {}.".format(poolIndex, p[0][n], max_int-1))
+                p[0][n] = max_int - 1
+            ## Now perform run-length encoding ##
+            for rlpair in self._encodeRunLength_(plane):
+                encpool.extend(pack('<B', rlpair[0]))  ### NEW ###
+                for v in rlpair[1]:
+                    if v < 0:   #### NEW 4.3 #####
+                        self._log_.warning("In pool {} negative value {} to be encoded. Set to 0.".format(poolIndex, v))
+                        v = 0
+                    if v >= max_int: #### NEW 4.3 #####
+                        self._log_.warning("In pool {} exceeding value {}  to be encoded. Set to {}.".format(poolIndex, v, max_int-1))
+                        v = max_int - 1
+                    encpool.extend(pack(ctype, v)) ##### NEW ###
+        return encpool
+
+
+    def _scaledPools_(self, V, Scalings): #returns number of first pools in V that are scaled by _scaleV_ (scaling stops at first empty pool or error)
+        if len(V) != len(Scalings):
+            return 0
+        for p in range(len(V)):
+            nVertices, nPlanes = _poolShape(V, p)
+            if nVertices == 0 or nPlanes != len(Scalings[p]):
+                return p
+        return len(V)
+
+
+    def poolChanged(self, p, bit = 16): #marks 16 (default) or 32 bit pool p as changed since read, so that it is encoded with write
+        #required after values of vertices in a read pool were changed in place (e.g. V[p][i][2] = e); added vertices, replaced pools and changed scalings are detected without
+        self._PoolsChanged_[bit].add(p)
+
+
+    def _changedPools_(self, bit = 16): #returns set of indices of 16 (default) or 32 bit pools marked as changed, replaced, changed in size or with changed scalings since read
+        if bit == 32:
+            V, Scalings, atom, scalatom = self.V32, self.Scal32, '23OP', '23CS'
+        else: #assuming the standard 16bit Pool case
+            V, Scalings, atom, scalatom = self.V, self.Scalings, 'LOOP', 'LACS'
+        readPools, readLengths = self._ReadState_.get(atom, ([], []))
+        readScalings = self._ReadState_.get(scalatom, [])
+        changed = set(p for p in self._PoolsChanged_[bit] if p < len(V))
+        for p in range(len(V)):
+            if p >= len(readPools) or p >= len(readScalings) or p >= len(Scalings) or Scalings[p] != readScalings[p]:
+                changed.add(p)
                 continue
-            encpool = bytearray() ### NEW ###
-            encpool.extend(pack("<IB",len(p),len(p[0]))) ### NEW ###  ## start string of binary encoded pool number of arrays and number of planes (taken from first vertex)
-            #encpool = pack("<IB",len(p),len(p[0])) ## start string of binary encoded pool number of arrays and number of planes (taken from first vertex)
-            for n in range(len(p[0])): # go through all planes; number of planes just taken from first vertex in pool
-                #if atom=="23OP": self._log_.info("Encoding plane: {}".format(n)) ###### ERROR 32 bit pool checking ####################
-                plane = [p[0][n]] #set plane to first value (for starts with second value to calculete differences)
-                for i in range(1, len(p)): #go through all values of a plane for differntiation and append to current plane
-                    plane.append((p[i][n] - p[i-1][n]) % max_int)  #Calculate difference to previous value AND take care of wrapping for two byte unsigned integer
-                #encpool += pack('<B',3) #plane will be encoded differntiated + runlength
-                encpool.extend(pack('<B',3)) #### NEW ### #plane will be encoded differntiated + runlength
-                if p[0][n] < 0:  #### NEW 4.3 #####
-                    self._log_.warning("In pool {} negative value {} to be encoded. Set to 0.".format(self.V.index(p), p[0][n]))   
-                    p[0][n] = 0
-                if p[0][n] >= max_int: #### NEW 4.3 #####
-                    self._log_.warning("In pool {} exceeding value {}  to be encoded. Set to {}.".format(self.V.index(p), p[0][n], max_int-1))
-                    p[0][n] = max_int - 1 
-                pack(ctype,p[0][n])  ########### WHAT IS THIS FOR ??? ################
-                ## Now perform run-length encoding ##
-                #encdata = bytearray() ##### NEW ####
-                #encdata.extend(encpool) #### NEW ####
-                for rlpair in self._encodeRunLength_(plane):
-                    #encpool += pack('<B', rlpair[0]) #encode runlength value  ### OLD ###
-                    encpool.extend(pack('<B', rlpair[0]))  ### NEW ###
-                    for v in rlpair[1]:
-                        if v < 0:   #### NEW 4.3 #####
-                            self._log_.warning("In pool {} negative value {} to be encoded. Set to 0.".format(self.V.index(p), v))  
-                            v = 0
-                        if v >= max_int: #### NEW 4.3 #####
-                            self._log_.warning("In pool {} exceeding value {}  to be encoded. Set to {}.".format(self.V.index(p), v, max_int-1))
-                            v = max_int - 1                               
-                        #encpool += pack(ctype, v)  ### OLD ###
-                        encpool.extend(pack(ctype, v)) ##### NEW ###
-            self._updateProgress_(len(encpool))  
-            self._Atoms_[atom].append(encpool)   
+            pool = list.__getitem__(V, p) if isinstance(V, XPLNEpools) else V[p] #pools of lazy read are not decoded for the check
+            if pool is None: #pool of lazy read not decoded since read
+                continue
+            if pool is not readPools[p] or len(pool) != readLengths[p]:
+                changed.add(p)
+        return changed
+
+
+    def _encodePools_(self, bit = 16): #sets current 16 (default) or 32 bit Pool atom to actual values of all vertices; only pools changed since read are encoded
+        if bit == 32:
+            atom = '23OP'
+            V = self.V32
+        else: #assuming the standard 16bit Pool case
+            atom = 'LOOP'
+            V = self.V
+        changed = self._changedPools_(bit)
+        self._log_.info("Start to encode {} of {} {}bit pools that changed since read...".format(len(changed), len(V), bit))
+        descaled = V.copy() #changed pools are copied to be de-scaled, so values in V stay scaled; pools of lazy read are not decoded for the copy
+        for p in changed:
+            descaled[p] = V[p] if NUMPYINSTALLED else [v[:] for v in V[p]] #with numpy _scaleV_ does not change pools in place
+        self._scaleV_(bit, True, descaled, changed, True) #with numpy de-scaled pools are kept as arrays for encoding
+        self._Atoms_[atom] = [] #start new (future version also think of creating Pool atom in case it new dsf file will be created !!!!!!!!!!)
+        for p in range(len(V)):
+            if p in changed:
+                encpool = self._encodePool_(descaled[p], bit, p)
+                self._updateProgress_(len(encpool))
+            else: #pool as read
+                encpool = self._ReadAtoms_[atom][p]
+            self._Atoms_[atom].append(encpool)
         self._log_.info("Encoding of {} bit pools finished.".format(bit))
  
 
@@ -440,33 +1660,33 @@ class XPLNEDSF:
                 m, o = unpack('<ff', s[ i*8 : i*8 + 8] )  #retrieve multiplier and offset
                 Scalings[-1].append([m, o])
 
-    def _packAllScalings_(self): #packs the all Scalings incl. Scal32 values to binary atom strings to be later written to file 
+    def _packAllScalings_(self): #packs the all Scalings incl. Scal32 values to binary atom strings to be later written to file; scalings not changed since read keep their read atom
         self._log_.info("Start to pack all scalings for pools.")
-        self._Atoms_['LACS'] = []
-        self._Atoms_['23CS'] = []
-        for s in self.Scalings:
-            encscal = b''
-            for i in s:
-                encscal += pack('<ff', i[0], i[1])
-            self._Atoms_['LACS'].append(encscal)
-        for s in self.Scal32:
-            encscal = b''
-            for i in s:
-                encscal += pack('<ff', i[0], i[1])
-            self._Atoms_['23CS'].append(encscal)                    
+        for atom, Scalings in [('LACS', self.Scalings), ('23CS', self.Scal32)]:
+            readScalings = self._ReadState_.get(atom, [])
+            self._Atoms_[atom] = []
+            for p in range(len(Scalings)):
+                if p < len(readScalings) and Scalings[p] == readScalings[p]:
+                    self._Atoms_[atom].append(self._ReadAtoms_[atom][p])
+                    continue
+                encscal = b''
+                for i in Scalings[p]:
+                    encscal += pack('<ff', i[0], i[1])
+                self._Atoms_[atom].append(encscal)
 
                 
-    def _scaleV_(self, bit = 16, reverse = False): #applies scaling to the vertices stored in V and V32
+    def _scaleV_(self, bit = 16, reverse = False, V = None, pools = None, arrays = False): #applies scaling to the vertices stored in V and V32 or to given pools V; if pools is set only pools with these indices are scaled
+        #with numpy scaled pools are replaced in V by new lists, or by numpy arrays if arrays is set
         if reverse:
             self._log_.info("Start to de-scale all {} bit pools.".format(bit))
         else:
             self._log_.info("Start to scale all {} bit pools.".format(bit))
         if bit == 32:
-            V = self.V32
+            if V is None: V = self.V32
             Scalings = self.Scal32
             max_int = 4294967296 - 1 
         else: #assuming the standard 16bit Pool case
-            V = self.V
+            if V is None: V = self.V
             Scalings = self.Scalings
             max_int = 65536 - 1
             
@@ -474,12 +1694,21 @@ class XPLNEDSF:
             self._log_.error("Amount of Scale atoms does not equal amount of Pools!!")
             return 1
         for p in range(len(V)): #for all Pools
-            if V[p] == []: ###There can exist empty pools that have to be skipped for scaling!!!
+            nVertices, nPlanes = _poolShape(V, p) #pools of lazy read are not decoded for this
+            if nVertices == 0: ###There can exist empty pools that have to be skipped for scaling!!!
                 self._log_.info("Empty pool number {} not scaled!".format(p))
                 break
-            if len(V[p][0]) != len(Scalings[p]): #take first vertex as example to determine number of coordinate planes in current pool
+            if nPlanes != len(Scalings[p]): #take first vertex as example to determine number of coordinate planes in current pool
                 self._log_.error("Amount of scale values for pool {} does not equal the number of coordinate planes!!!".format(p))
                 return 2
+            if pools is not None and p not in pools:
+                continue
+            if NUMPYINSTALLED: #whole planes are scaled as array operations
+                scaled = _scalePoolList(V[p], Scalings[p], bit, reverse, arrays)
+                if scaled is not None:
+                    V[p] = scaled
+                    continue
+                V[p] = [v[:] for v in V[p]] #also pools that are no regular array are not changed in place
             for n in range(len(Scalings[p])): #for all scale tuples for that pool = all coordinate planes in pool
                 if self._DEBUG_: self._log_.debug("Will now scale pool {} plane {} with multiplier: {} and offset: {}".format(p, n ,Scalings[p][n][0], Scalings[p][n][1]))                              
                 if float(Scalings[p][n][0]) == 0.0:
@@ -492,7 +1721,7 @@ class XPLNEDSF:
                         V[p][v][n] = (V[p][v][n] * Scalings[p][n][0] / max_int) + Scalings[p][n][1]  #scale vertex v in pool p for plane n with multiplyer and offset
                
                 
-    def _extractRaster_(self):  #extracts alll rasters from atoms and stores them in list
+    def _extractRaster_(self, lazy = False):  #extracts alll rasters from atoms and stores them in list; with lazy and without numpy values are unpacked with first access
         self._log_.info("Extracting {} raster layers...".format(len(self._Atoms_['IMED'])))
         if len(self._Atoms_['IMED']) != len(self._Atoms_['DMED']):
             self._log_.error("Number of raster info atoms not equal to number of raster data atoms!!!")
@@ -529,19 +1758,41 @@ class XPLNEDSF:
                     self._log_.error("Not allowed bytes per pixel in Raster Definition!!!")
                     return 4
 
-            for x in range(0, R.bpp * R.width, R.bpp): #going x-wise from east to west just the bytes per pixes
-                line = []
-                for y in range(0, R.bpp * R.height * R.width, R.bpp * R.width): #going y-wise from south to north, always jumping over the width of each x-line
-                    v, = unpack(ctype, self._Atoms_['DMED'][rn][y + x : y + x + R.bpp]) #unpack R.bpp bytes at position x+y of raster data atom number rn
-                    v = v * R.scale + R.offset # APPLYING SCALE + OFFSET 
-                    line.append(v) #the pixel appended is to a line from south to north (y-line)
-                R.data.append(line) #south to north lines are appended to each other
-                self._updateProgress_(R.bpp * R.width) #update progress with number of bytes per raster line
+            if NUMPYINSTALLED: #just view raster data atom as array, scale and offset are applied with first access of R.data
+                R._raw = np.frombuffer(self._Atoms_['DMED'][rn], np.dtype(ctype), R.width * R.height).reshape(R.height, R.width)
+                R.data = None
+                self.Raster.append(R)
+                self._updateProgress_(R.bpp * R.width * R.height)
+                continue
+            R._atom = self._Atoms_['DMED'][rn]
+            R._ctype = ctype
+            R.data = None
+            if not lazy and self._Executor_ is None:
+                R.data = R._unpackAtom_()
+                R._atom = None
+            self._updateProgress_(R.bpp * R.width * R.height)
             self.Raster.append(R) #so raster list of list is returned to be indexed by [x][y]
+        if not lazy and self._Executor_ is not None and not NUMPYINSTALLED: #rasters are unpacked in parallel processes
+            self._log_.info("Unpacking {} raster layers in {} processes.".format(len(self.Raster), self._Workers_))
+            for R, data in zip(self.Raster, self._Executor_.map(_unpackRaster, [bytes(R._atom) for R in self.Raster], *zip(*[(R._ctype, R.bpp, R.width, R.height, R.scale, R.offset) for R in self.Raster]))):
+                R.data = data
+                R._atom = None
         self._log_.info("Finished extracting Rasters.")
    
    
-    def _packRaster_(self):  #packs all rasters from lists into atoms
+    def _rasterUnchanged_(self, rn, encrasterinfo): #returns True if raster number rn with packed info encrasterinfo is unchanged since read
+        readRasters = self._ReadState_.get('DMED', [])
+        if rn >= len(readRasters) or self.Raster[rn] is not readRasters[rn][0] or encrasterinfo != bytes(self._ReadAtoms_['IMED'][rn]):
+            return False
+        R = self.Raster[rn]
+        if R._raw is not None: #with numpy raster data is unchanged if not accessed or still equal to raw values
+            return R._data is None or np.array_equal(R._data, R._scaleRaw_())
+        if readRasters[rn][1] is None: #lazy read without numpy, raster data is unchanged if not accessed or still equal to unpacked values
+            return R._data is None or R._data == R._unpackAtom_()
+        return R.data == readRasters[rn][1]
+
+
+    def _packRaster_(self):  #packs all rasters from lists into atoms; rasters not changed since read keep their read atom
         self._log_.info("Packing {} raster layers...".format(len(self.Raster)))
         self._Atoms_['DMED'] = []
         self._Atoms_['IMED'] = []
@@ -551,6 +1802,9 @@ class XPLNEDSF:
             self._Atoms_['IMED'].append(encrasterinfo)
             #if self._DEBUG_: self._log_.debug("Info of packed raster layer: {} {} {} {} {} {} {}".format(R.ver, R.bpp, R.flags, R.width, R.height, R.scale, R.offset))
             self._log_.info("Info of packed raster layer: {} {} {} {} {} {} {}".format(R.ver, R.bpp, R.flags, R.width, R.height, R.scale, R.offset))
+            if self._rasterUnchanged_(rn, encrasterinfo):
+                self._Atoms_['DMED'].append(self._ReadAtoms_['DMED'][rn]) #raster data as read
+                continue
             if R.flags & 1:  #signed integers to be read
                 if R.bpp == 1:
                     ctype = "<b"
@@ -577,7 +1831,23 @@ class XPLNEDSF:
                 else:
                     self._log_.error("Not allowed bytes per pixel in Raster Definition!!!")
                     return 4
-                
+
+            if NUMPYINSTALLED:
+                if R._data is None and R._raw is not None: #raster values were not accessed, so raw values are still valid
+                    encdata = memoryview(R._raw).cast("B") #no copy of values, e.g. when still on memory map
+                else: #pack all values of raster at once
+                    values = (np.asarray(R.data, np.float64).T - R.offset) / R.scale # APPLYING SCALE + OFFSET to all raster values
+                    if R.flags & 1 or R.flags & 2: #integers to be packed
+                        values = np.trunc(values)
+                        limits = np.iinfo(np.dtype(ctype))
+                        outofbounds = np.count_nonzero((values < limits.min) | (values > limits.max))
+                        if outofbounds:
+                            self._log_.error("Raster {} has {} elevations out of bounds for {} ---> set to {} or {}".format(rn, outofbounds, ctype, limits.min, limits.max))
+                            values = np.clip(values, limits.min, limits.max)
+                    encdata = values.astype(np.dtype(ctype)).tobytes()
+                self._updateProgress_(len(encdata))
+                self._Atoms_['DMED'].append(encdata)
+                continue
             encdata = bytearray()
 
             for y in range(R.height): #going x-wise from east to west just the bytes per pixes ################# YYYYYYY
@@ -611,64 +1881,105 @@ class XPLNEDSF:
         self._log_.info("Finished packing Rasters.")   
    
    
-    def _unpackCMDS_(self):
-        i = 0 #position in CMDS String
+    def _unpackCMDS_(self): #decodes commands with precompiled structs per command id directly from the atom without slicing it into compact command storage
         self._log_.info("Start unpacking of Commands.")
+        atom = self._Atoms_['SDMC']
+        store = XPLNEcmds()
+        if self._Cached_ is not None and "cmdids" in self._Cached_: #commands as unpacked with earlier read
+            for a, k in [(store.ids, "cmdids"), (store.starts, "cmdstarts"), (store.values, "cmdvalues"), (store.positions, "cmdpositions")]:
+                del a[:]
+                a.frombytes(self._Cached_[k].tobytes())
+            self._updateProgress_(len(atom) // 2) #count only half of the length, other half by extractCMDS
+            self._CMDStore_ = store
+            self._CMDSList_ = None
+            self._log_.info("{} commands taken from cache.".format(len(store)))
+            return
+        ids, starts, values = store.ids, store.starts, store.values
+        CMDTable = {} #for each command id the struct for fixed values, the struct for the count of variable values and the format of one variable value
+        for id in self._CMDStructure_:
+            structure = [f.replace('f', 'I').replace('c', 'B') for f in self._CMDStructure_[id]] #floats are stored as bit pattern and chars as byte values
+            fixed = _getStruct('<' + structure[0]) if structure[0] else None
+            if len(structure) == 3: #command with variable length
+                CMDTable[id] = (fixed, _getStruct('<' + structure[1]), structure[2])
+            else:
+                CMDTable[id] = (fixed, None, None)
+        indicesPerCount = {23 : 1, 24 : 2, 26 : 1, 27 : 2, 29 : 1, 30 : 2} #patch commands with one byte count of 16 bit indices or pairs of pool and index
+        rangeIDs = (25, 28, 31) #patch commands with range of two 16 bit indices
+        rangeStruct = _getStruct('<HH')
+        debug = self._DEBUG_
+        end = len(self._Atoms_['SDMC'])
+        i = 0 #position in CMDS atom
         current100kBjunk = 1 #counts processed bytes in 100kB junks
-        while i < len(self._Atoms_['SDMC']):
-            id, = unpack('<B', self._Atoms_['SDMC'][i : i+1])
-            self.CMDS.append([id])
-            i += 1
-            if id in self._CMDStructure_:
-                l = self._CMDStructLen_[id][0] #length of bytes to read
-                if l > 0:
-                    y = unpack('<' + self._CMDStructure_[id][0], self._Atoms_['SDMC'][i : i + l])
-                    self.CMDS[-1].extend(y)
-                    i += l
-                if len(self._CMDStructLen_[id]) == 3: #read command with variable length
-                    l = self._CMDStructLen_[id][1] #length of repeating value n to read
-                    n, = unpack('<' + self._CMDStructure_[id][1], self._Atoms_['SDMC'][i : i + l]) #number n of repetitions
-                    if id == 15:
-                        n += 1 #id = 15 seems a special case that there is one index more than windings  ########??????????
-                    i += l
-                    l = self._CMDStructLen_[id][2] #length of repeated bytes
-                    for j in range(n): 
-                       y = unpack('<' + self._CMDStructure_[id][2], self._Atoms_['SDMC'][i : i + l])
-                       self.CMDS[-1].extend(y)
-                       i += l
+        positions = store.positions
+        while i < end:
+            id = atom[i]
+            ids.append(id)
+            positions.append(i)
+            n = indicesPerCount.get(id)
+            if n: #fast path for patch triangles
+                s = _INDEXSTRUCTS[n * atom[i + 1]]
+                values.extend(s.unpack_from(atom, i + 2))
+                i += 2 + s.size
+            elif id in rangeIDs: #fast path for patch triangles as range
+                values.extend(rangeStruct.unpack_from(atom, i + 1))
+                i += 5
             else:
-                if id == 14: #special double packed case, which is explicetly treated separate and has special format returning lists inside commands !!!
-                             ###### not tested yet !!!!!!!! ########
-                    parameter, windings = unpack('<HB', self._Atoms_['SDMC'][i : i + 3])
+                i += 1
+                if id in CMDTable:
+                    fixed, count, valtype = CMDTable[id]
+                    if fixed is not None:
+                        values.extend(fixed.unpack_from(atom, i))
+                        i += fixed.size
+                    if count is not None: #read command with variable length
+                        n, = count.unpack_from(atom, i) #number n of repetitions
+                        if id == 15:
+                            n += 1 #id = 15 seems a special case that there is one index more than windings  ########??????????
+                        i += count.size
+                        s = _getStruct('<{}{}'.format(n * len(valtype), valtype[0])) #repeated values are all of the same type
+                        values.extend(s.unpack_from(atom, i))
+                        i += s.size
+                elif id == 14: #special double packed case, which is explicetly treated separate and has special format returning lists inside commands !!!
+                               ###### not tested yet !!!!!!!! ########
+                    parameter, windings = _getStruct('<HB').unpack_from(atom, i)
                     i += 3
-                    self.CMDS[-1].extend(parameter)
+                    values.extend((parameter, windings))
                     for w in range(windings):
-                        indices, = unpack('<B', self._Atoms_['SDMC'][i : i + 1])
-                        i += 1
-                        windinglist = []
-                        for m in range(indices):
-                            y, = unpack('<H', self._Atoms_['SDMC'][i : i + 2])
-                            i += 2
-                            windinglist.extend(y)
-                        self.CMDS[-1].append(windinglist)
+                        s = _INDEXSTRUCTS[atom[i]] #number of indices in winding
+                        values.append(atom[i])
+                        values.extend(s.unpack_from(atom, i + 1))
+                        i += 1 + s.size
                 else: #command id not tretated here until now
                     self._log_.warning("Unknown command ID {} ignored!".format(id))
-                    self.CMDS[-1] #delete already written id
-            if self._DEBUG_: self._log_.debug("CMD id {}: {} (string pos next cmd: {})".format(self.CMDS[-1][0], self.CMDS[-1][1:], i))
+            starts.append(len(values))
+            if debug: self._log_.debug("CMD id {}: {} (string pos next cmd: {})".format(id, store.command(len(ids) - 1)[1:], i))
             if i > current100kBjunk * 100000:
                 self._updateProgress_(50000) #count only half of the length, other half by extractCMDS
                 current100kBjunk += 1
-        self._log_.info("{} commands haven been unpacked.".format(len(self.CMDS)))
+        positions.append(i)
+        self._CMDStore_ = store
+        self._CMDSList_ = None
+        self._log_.info("{} commands haven been unpacked.".format(len(store)))
 
 
-    def _extractCMDS_(self): # extract CMDS and stores it as Mesh-Patches, Polygons, ...
+    def _extractCMDS_(self, patches = True, others = True): # extract CMDS and stores it as Mesh-Patches, Polygons, ...; patches just refer to their commands in command storage
+        #without others objects, polygons and networks are not extracted, their commands are kept as byte spans of read commands atom in _CMDSpans_
         self._log_.info("Start to extract CMDS")
-        for i in range(len(self.DefPolygons)):
-            self.Polygons.append([]) #span list of empty lists for all defined poygon types
-        for i in range(len(self.DefObjects)): 
-            self.Objects.append([]) #span list of empty lists for all defined poygon types
+        if others:
+            self._Objects_, self._Polygons_, self._Networks_ = [], [], []
+            self._CMDSpans_ = None
+            for i in range(len(self.DefPolygons)):
+                self.Polygons.append([]) #span list of empty lists for all defined poygon types
+            for i in range(len(self.DefObjects)): 
+                self.Objects.append([]) #span list of empty lists for all defined poygon types
+        else:
+            self._CMDSpans_ = []
+            positions = self._CMDStore_.positions
+            stateSpans = {} #for each kind of state command the span of its last command, only needed if followed by object, polygon or network command
+            stateKinds = {1 : 1, 2 : 2, 3 : 3, 4 : 3, 5 : 3, 6 : 6} #state commands of same kind replace each other
 
-        patchPoolIndex = None #poolIndex currently used in current patch; if different from current in CMDS then change command is written to cmds of patch
+        store = self._CMDStore_
+        ids = store.ids
+        patch = None #current patch that refers to range of commands in storage
 
         flag_physical = None #1 if physical, 2 if overlay
         nearLOD = None  
@@ -678,58 +1989,74 @@ class XPLNEDSF:
         subroadtype = 0
         junctionoffset = 0
         counter = 0
-        amount_of_two_percent_CMDS = int(len(self.CMDS)/50)  ### NEW ###
+        amount_of_two_percent_CMDS = int(len(ids)/50)  ### NEW ###
         if amount_of_two_percent_CMDS == 0:                  ### NEW ###
             amount_of_two_percent_CMDS = 1 #have 1 as minimal value in order to avoid devision by zero below   ### NEW ###
-        for c in self.CMDS:
-            if c[0] == 1: # new pool selection
-                poolIndex = c[1]
-            elif c[0] == 2: # new junction offset
-                junctionoffset = c[1]
-            elif 3 <= c[0] <= 5: # new definition index
-                defIndex = c[1]
-            elif c[0] == 6: # new subtype for road
-                subroadtype = c[1]
-            elif 7 <= c[0] <= 8: #Object Command
+        for k in range(len(ids)):
+            id = ids[k]
+            if not others and id <= 15: #keep byte span of command instead of extracting it
+                if id in stateKinds:
+                    stateSpans[stateKinds[id]] = (positions[k], positions[k + 1])
+                else: #state commands that are valid for this command are needed before
+                    for span in sorted(stateSpans.values()) + [(positions[k], positions[k + 1])]:
+                        if self._CMDSpans_ and self._CMDSpans_[-1][1] == span[0]: #join with previous span
+                            self._CMDSpans_[-1] = (self._CMDSpans_[-1][0], span[1])
+                        else:
+                            self._CMDSpans_.append(span)
+                    stateSpans = {}
+            if id == 1: # new pool selection
+                poolIndex = store.value(k)
+            elif id == 2: # new junction offset
+                junctionoffset = store.value(k)
+            elif 3 <= id <= 5: # new definition index
+                defIndex = store.value(k)
+            elif id == 6: # new subtype for road
+                subroadtype = store.value(k)
+            elif id <= 15 and not others:
+                pass
+            elif id >= 16 and not patches:
+                pass
+            elif 7 <= id <= 8: #Object Command
                 self.Objects[defIndex].append([poolIndex]) #new Polygond added for defIndex type and it starts with poolIndex from which its vertices are
-                self.Objects[defIndex][-1].extend(c) #followed by the complete command to build it
-            elif 9 <= c[0] <= 11: #Network Commands ### NEW: each Network command put in sublists, addtional [] inclueded !!!! 
+                self.Objects[defIndex][-1].extend(store.command(k)) #followed by the complete command to build it
+            elif 9 <= id <= 11: #Network Commands ### NEW: each Network command put in sublists, addtional [] inclueded !!!! 
                 if self.Networks == []: #first network command, so start with first entry
                     self.Networks.append([[subroadtype, junctionoffset, poolIndex]])
                 elif self.Networks[-1][0][0] != subroadtype or self.Networks[-1][0][1] != junctionoffset or self.Networks[-1][0][2] != poolIndex: #chang of relevant base settings
                     self.Networks.append([[subroadtype, junctionoffset, poolIndex]]) #sp new entry with new base-settings
-                self.Networks[-1].extend([c]) #append complete command to build this network part on current base settings
-            elif 12 <= c[0] <= 15: #Polygon Commands
+                self.Networks[-1].append(store.command(k)) #append complete command to build this network part on current base settings
+            elif 12 <= id <= 15: #Polygon Commands
                 if len(self.Polygons) > defIndex:  # NEW 13.05.21 seems to exist dsf file with polygons that have not been defined
                     self.Polygons[defIndex].append([poolIndex]) #new Polygond added for defIndex type and it starts with poolIndex from which its vertices are
-                    self.Polygons[defIndex][-1].extend(c) #followed by the complete command to build it
+                    self.Polygons[defIndex][-1].extend(store.command(k)) #followed by the complete command to build it
                 else:
                     self._log_.warning("dsf file includes polygon with defindex {} that was not defined. Polygon is ignored.".format(defIndex))
-            elif 16 <= c[0] <= 18:  # Add new Terrain Patch
-                patchPoolIndex = None #poolIndex for new patch needs to be set as first command
-                if c[0] == 17: # New Patch with new physical flag
-                    flag_physical = c[1]
-                elif c[0] == 18: # New Patch with new flag and LOD
-                    flag_physical = c[1]
-                    nearLOD = c[2]
-                    farLOD = c[3]    
-                p = XPLNEpatch(flag_physical, nearLOD, farLOD, poolIndex, defIndex)
-                self.Patches.append(p)
-            elif c[0] >= 23 and c[0] <= 31: # the command is about a patch, so store it to current patch
-                if patchPoolIndex != poolIndex: #change of pool index within patch is possible
-                    self.Patches[-1].cmds.append( [1, poolIndex] ) #change pool with patch via according command
-                    patchPoolIndex = poolIndex #now within patch also current pool will be used
+            elif 16 <= id <= 18:  # Add new Terrain Patch
+                if patch is not None:
+                    patch._range = (patch._range[0], k) #commands of previous patch end here
+                if id == 17: # New Patch with new physical flag
+                    flag_physical = store.value(k)
+                elif id == 18: # New Patch with new flag and LOD
+                    flag_physical, nearLOD, farLOD = store.command(k)[1:4]
+                patch = XPLNEpatch(flag_physical, nearLOD, farLOD, poolIndex, defIndex)
+                patch._referCmds_(store, k + 1, len(ids), poolIndex) #commands following until next patch definition
+                self.Patches.append(patch)
+            elif 23 <= id <= 31: # the command is about a patch, it stays in storage referred by current patch
                 if self.Patches[-1].defIndex != defIndex:
+                    patch._range = (patch._range[0], k)
                     self._log_.error("Definition Index changed within patch. Aborted command extraction!")
                     return 1
-                self.Patches[-1].cmds.append(c) 
             counter += 1
-            if not counter % amount_of_two_percent_CMDS: #after every 2% processed of commands update progress  --> RAISES ERROR when less than 50 CMDS
+            if patches and not counter % amount_of_two_percent_CMDS: #after every 2% processed of commands update progress  --> RAISES ERROR when less than 50 CMDS
                 self._updateProgress_(round(len(self._Atoms_['SDMC']) / 100)) #count only half of the length, other half by unpackCMDS
-        self._log_.info("{} patches extracted from commands.".format(len(self.Patches)))
-        self._log_.info("{} different Polygon types including there definitions extracted from commands.".format(len(self.Polygons)))
-        self._log_.info("{} different Objects with placements coordinates extracted from commands.".format(len(self.Objects)))
-        self._log_.info("{} different Network subtypes extracted from commands (could include double count).".format(len(self.Networks)))
+        if patches:
+            self._log_.info("{} patches extracted from commands.".format(len(self.Patches)))
+        if others:
+            self._log_.info("{} different Polygon types including there definitions extracted from commands.".format(len(self.Polygons)))
+            self._log_.info("{} different Objects with placements coordinates extracted from commands.".format(len(self.Objects)))
+            self._log_.info("{} different Network subtypes extracted from commands (could include double count).".format(len(self.Networks)))
+        else:
+            self._log_.info("Objects, polygons and networks are kept in {} byte spans of commands and extracted with first access.".format(len(self._CMDSpans_)))
 
     def _packCMDS_(self): #packs all CMDS of Object, Polygons, Networks and Patches in binary string to be later written to file #####NEW FUCTION### NEW ####
         ################################# TBD: Check function for polygons and object placements !!!!!! #############################################################
@@ -743,6 +2070,7 @@ class XPLNEDSF:
         subroadtype = None
         junctionoffset = None  #### set to 0 if directly set below as in X-Plane standard dsf files
         enccmds = bytearray() #these will be the encoded CMDS to be returned  
+        readCMDS = self._ReadAtoms_.get('SDMC') #commands of patches not changed since read are copied from there
         ### local function for single CMD encoding ###
         def encCMD(c): #encodes single CMD in array c and returns its binary
             ecmd = b'' 
@@ -778,42 +2106,49 @@ class XPLNEDSF:
                 return b''
             return ecmd
         ### end of inner function to pack single CMDS ###   
-        for d in self.DefObjects: #for each object definition write according CMDS
-            enccmds.extend(encCMD([3, d])) #definition set according to current definition id; function will handle if id > 255
-            for c in self.Objects[d]:
-                if c[0] != poolIndex: #Pool-Index is written before CMD; adapt index if it changes
-                    enccmds.extend(encCMD([1, c[0]]))
-                    poolIndex = c[0]
-                enccmds.extend(encCMD(c[1:])) #now according command to place objects is encoded  #### TO BE TESTED if it works as part of array???????
-        for d in self.DefPolygons: #for each polygon definition write according CMDS
-            enccmds.extend(encCMD([3, d])) #definition set according to current definition id; function will handle if id > 255
-            for c in self.Polygons[d]:
-                if c[0] != poolIndex: #Pool-Index is written before CMD; adapt index if it changes
-                    enccmds.extend(encCMD( [1, c[0]] ))
-                    poolIndex = c[0]
-                enccmds.extend(encCMD(c[1:])) #now according command to place objects is encoded  #### TO BE TESTED if it works as part of array???????        
-        for d in self.Networks:
-            if d[0][1] != junctionoffset: ## Order in org X-Plane files is with CMD id 2 at first
-                enccmds.extend(encCMD([2, d[0][1]]))
-                junctionoffset = d[0][1]
-            if defIndex != 0:
-                enccmds.extend(encCMD([3, 0])) #Currently there is only one Road-Defintion --> DefIndex set to 0
-                defIndex = 0
-            if d[0][2] != poolIndex:
-                enccmds.extend(encCMD([1, d[0][2]]))
-                poolIndex = d[0][2]
-            if d[0][0] != subroadtype:  ## Order in org X-Plane files is with 6 at last
-                enccmds.extend(encCMD([6, d[0][0]]))
-                subroadtype = d[0][0]
-            for c in d[1:]:
-                enccmds.extend(encCMD(c))
+        if self._CMDSpans_ is not None: #objects, polygons and networks not extracted, so their commands are copied as read including the state commands for them
+            for start, end in self._CMDSpans_:
+                enccmds.extend(readCMDS[start : end])
+        else:
+            for d in self.DefObjects: #for each object definition write according CMDS
+                enccmds.extend(encCMD([3, d])) #definition set according to current definition id; function will handle if id > 255
+                for c in self.Objects[d]:
+                    if c[0] != poolIndex: #Pool-Index is written before CMD; adapt index if it changes
+                        enccmds.extend(encCMD([1, c[0]]))
+                        poolIndex = c[0]
+                    enccmds.extend(encCMD(c[1:])) #now according command to place objects is encoded  #### TO BE TESTED if it works as part of array???????
+            for d in self.DefPolygons: #for each polygon definition write according CMDS
+                enccmds.extend(encCMD([3, d])) #definition set according to current definition id; function will handle if id > 255
+                for c in self.Polygons[d]:
+                    if c[0] != poolIndex: #Pool-Index is written before CMD; adapt index if it changes
+                        enccmds.extend(encCMD( [1, c[0]] ))
+                        poolIndex = c[0]
+                    enccmds.extend(encCMD(c[1:])) #now according command to place objects is encoded  #### TO BE TESTED if it works as part of array???????        
+            for d in self.Networks:
+                if d[0][1] != junctionoffset: ## Order in org X-Plane files is with CMD id 2 at first
+                    enccmds.extend(encCMD([2, d[0][1]]))
+                    junctionoffset = d[0][1]
+                if defIndex != 0:
+                    enccmds.extend(encCMD([3, 0])) #Currently there is only one Road-Defintion --> DefIndex set to 0
+                    defIndex = 0
+                if d[0][2] != poolIndex:
+                    enccmds.extend(encCMD([1, d[0][2]]))
+                    poolIndex = d[0][2]
+                if d[0][0] != subroadtype:  ## Order in org X-Plane files is with 6 at last
+                    enccmds.extend(encCMD([6, d[0][0]]))
+                    subroadtype = d[0][0]
+                for c in d[1:]:
+                    enccmds.extend(encCMD(c))
         for d in self.Patches:
             if defIndex != d.defIndex:
                 enccmds.extend(encCMD([3, d.defIndex])) #definition set according to current definition id; function will handle if id > 255
                 defIndex = d.defIndex
-            if len(d.cmds) and poolIndex != d.cmds[0][1]: #Pool-Index is defined by first command and required to be defined directly before new Patch is defined!
-                enccmds.extend(encCMD([1, d.cmds[0][1]])) #include command for changing poolIndex
-                poolIndex = d.cmds[0][1] #update state variable
+            cmds = d._iterCmds_() #commands of patch, for read patches directly from command storage
+            firstcmd = next(cmds, None)
+            span = d._storedSpan_() if readCMDS is not None else None #commands of patch not changed since read
+            if firstcmd is not None and poolIndex != firstcmd[1]: #Pool-Index is defined by first command and required to be defined directly before new Patch is defined!
+                enccmds.extend(encCMD([1, firstcmd[1]])) #include command for changing poolIndex
+                poolIndex = firstcmd[1] #update state variable
             if nearLOD == d.near and farLOD == d.far:
                 if flag_physical == d.flag:
                     enccmds.extend(encCMD([16]))
@@ -825,7 +2160,11 @@ class XPLNEDSF:
                 farLOD = d.far
                 nearLOD = d.near
                 flag_physical = d.flag
-            for c in d.cmds[1:]:   ##skip first command as this is pool defintion written above
+            if span is not None: #bytes of commands as read are copied
+                enccmds.extend(readCMDS[span[0] : span[1]])
+                poolIndex = span[2]
+                continue
+            for c in cmds:   ##first command already taken above as this is pool defintion
                 enccmds.extend(encCMD(c))
                 if c[0] == 1: #change of poolIndex can happen within patch commands    
                     poolIndex = c[1] #therefore also state variable has to be adapted        
@@ -834,7 +2173,7 @@ class XPLNEDSF:
  ########### END of NEW function _packCMDS_() #################               
                 
 
-    def _unpackAtoms_(self): #starts all functions to unpack and extract data froms strings in Atoms
+    def _unpackAtoms_(self, lazy = False, meshonly = False): #starts all functions to unpack and extract data froms strings in Atoms; with lazy pools and rasters are decoded with first access, with meshonly objects, polygons and networks
         self._log_.info("Extracting properties and definitions.")
         if 'PORP' in self._Atoms_:
             self._extractProps_()
@@ -845,73 +2184,192 @@ class XPLNEDSF:
         else:
             self._log_.warning("This dsf file has no definitions.") 
         if 'IMED' in self._Atoms_:
-            self._extractRaster_()
+            start = perf_counter()
+            self._extractRaster_(lazy)
+            self._addMetrics_("rasters", perf_counter() - start, self._atomBytes_('DMED')[0], len(self.Raster))
         else:
             self._log_.info("This dsf file has no raster layers.")
-        if 'LOOP' in self._Atoms_:
-            self._extractPools_(16)
-            self._extractScalings_(16)
-            self._scaleV_(16, False) #False that scaling is not reversed
-            self._updateProgress_(len(self._Atoms_['LACS']))
-        else:
-            self._log_.warning("This dsf file has no coordinate pools (16-bit) defined!") 
-        if '23OP' in self._Atoms_:
-            self._extractPools_(32)
-            self._extractScalings_(32)
-            self._scaleV_(32, False) #False that scaling is not reversed
-            self._updateProgress_(len(self._Atoms_['23CS']))
-        else:
-            self._log_.info("This dsf file has no 32-bit pools.")
+        for bit, poolatom, scalatom in [(16, 'LOOP', 'LACS'), (32, '23OP', '23CS')]:
+            if poolatom not in self._Atoms_:
+                if bit == 16:
+                    self._log_.warning("This dsf file has no coordinate pools (16-bit) defined!")
+                else:
+                    self._log_.info("This dsf file has no 32-bit pools.")
+                continue
+            start = perf_counter()
+            if lazy or NUMPYINSTALLED: #with numpy pools are scaled when extracted, lazy pools when decoded
+                self._extractScalings_(bit)
+                scaled = perf_counter()
+                self._extractPools_(bit, lazy)
+                scalingtime, pooltime = scaled - start, perf_counter() - scaled
+            else:
+                self._extractPools_(bit)
+                extracted = perf_counter()
+                self._extractScalings_(bit)
+                scaled = perf_counter()
+                self._scaleV_(bit, False) #False that scaling is not reversed
+                scalingtime, pooltime = scaled - extracted, extracted - start + perf_counter() - scaled
+            self._addMetrics_("scalings", scalingtime, *self._atomBytes_(scalatom))
+            self._addMetrics_("pools", pooltime, *self._atomBytes_(poolatom))
+            if not lazy: self._updateProgress_(len(self._Atoms_[scalatom]))
         if 'SDMC' in self._Atoms_:
+            start = perf_counter()
             self._unpackCMDS_()
-            self._extractCMDS_()
+            self._extractCMDS_(others = not meshonly)
+            self._addMetrics_("commands", perf_counter() - start, self._atomBytes_('SDMC')[0], len(self._CMDStore_))
         else:
             self._log_.warning("This dsf file has no commands defined.")
         return 0
         
 
-    def _packAtoms_(self): #starts all functions to write all variables to strings (for later been written to file)
-        ###### TBD: only pack atoms if changed --> saves time !! ############
+    def _storeReadState_(self): #keeps read atoms and copies of extracted values, so that atoms of values not changed since read are written without encoding
+        self._ReadAtoms_ = {}
+        for k in self._Atoms_:
+            if k in self._MultiAtoms_:
+                self._ReadAtoms_[k] = list(self._Atoms_[k])
+            elif k not in self._AtomOfAtoms_:
+                self._ReadAtoms_[k] = self._Atoms_[k]
+        self._ReadState_ = {}
+        if 'PORP' in self._Atoms_:
+            self._ReadState_['PORP'] = dict(self.Properties)
+        for atomID, defs in self._DefsOfAtoms_():
+            if atomID in self._Atoms_:
+                self._ReadState_[atomID] = dict(defs)
+        for atom, V, VArrays, scalatom, Scalings in [('LOOP', self.V, self.VArrays, 'LACS', self.Scalings), ('23OP', self.V32, self.V32Arrays, '23CS', self.Scal32)]:
+            if atom in self._Atoms_:
+                #pools as read and their number of vertices; values are not copied, pools changed in place are marked with poolChanged()
+                if isinstance(V, XPLNEpools): #pools of lazy read are set when decoded
+                    self._ReadState_[atom] = (V.readPools, [V.shape(p)[0] for p in range(len(V))])
+                else:
+                    self._ReadState_[atom] = (list(V), [len(pool) for pool in V])
+                self._ReadState_[scalatom] = [[s[:] for s in scal] for scal in Scalings]
+        if 'DMED' in self._Atoms_: #with numpy raw values of raster are kept anyway, otherwise copy of raster data
+            self._ReadState_['DMED'] = [(R, None if R._raw is not None or R._atom is not None else [line[:] for line in R.data]) for R in self.Raster]
+
+
+    def _atomEncoders_(self): #returns for each top-level atom the functions that encode its values to its (sub-)atoms
+        return {'DAEH' : [self._encodeProps_], 'NFED' : [self._encodeDefs_], 'DOEG' : [lambda: self._encodePools_(16), lambda: self._encodePools_(32), self._packAllScalings_],
+                'SMED' : [self._packRaster_], 'SDMC' : [self._packCMDS_]}
+
+
+    def _packAtoms_(self): #starts all functions to write all variables to strings (for later been written to file); only changed values are encoded
         self._log_.info("Preparing data to be written to file.")
         self._log_.info("This version does not yet support nested polygons (Command ID 14)!")
-        self._encodeProps_()
-        self._encodeDefs_() 
-        self._scaleV_(16, True) #de-scale again      
-        self._scaleV_(32, True)
-        self._encodePools_(16)
-        self._encodePools_(32)
-        self._packAllScalings_()
-        self._packCMDS_()
-        self._packRaster_()
+        for encoders in self._atomEncoders_().values():
+            for encode in encoders:
+                encode()
         return 0
                                               
   
     def getVertexElevation(self, x, y, z = -32768): #gets Elevation at point (x,y) from raster grid Elevation or from Vertex itself if assigned to vertex
         if int(z) != -32768: #in case z vertex is different from -32768 than this is the right height and not taken from raster
             return z
-        if "sim/west" not in self.Properties:
-            self._log_.error("Cannot get elevation as properties like sim/west not defined!!!")
-            return None
-        if not (int(self.Properties["sim/west"]) <= x <= int(self.Properties["sim/east"])):
-            self._log_.error("Cannot get elevation as x coordinate is not within boundaries!!!")
+        elev = self.getElevations([x], [y])
+        if elev is None or elev[0] is None: #no raster or point is out of bounds
             return None
-        if not (int(self.Properties["sim/south"]) <= y <= int(self.Properties["sim/north"])):
-            self._log_.error("Cannot get elevation as y coordinate is not within boundaries!!!")
-            return None
-        if len(self.DefRasters) == 0: #No raster defined, use elevation from trias  #### NEW 7 ####
-            self._log_.error("getVertexElevation: dsf includes no raster, elevation returned is None")
+        return float(elev[0])
+
+
+    def getElevations(self, xs, ys, zs = None, method = "nearest"): #gets Elevations at points with coordinates xs, ys from raster grid Elevation with method "nearest" or "bilinear"; elevations zs of vertices different from -32768 are taken instead
+        #returns list of elevations with None for points out of bounds; if raster or properties are missing returns None, or with zs list of the vertex elevations with None for the others
+        if method not in ("nearest", "bilinear"):
+            self._log_.error("Cannot get elevations with unknown method {}!!!".format(method))
             return None
-        else: # use raster to get elevation; THIS VERSION IS ASSUMING THAT ELEVATION RASTER IS THE FIRST RASTER-LAYER (index 0), if it is not called "elevation" a warning is raised ###
-            if self.DefRasters[0] != "elevation":
-                self._log_.warning("Warning: The first raster layer is not called elevation, but used to determine elevation!")
-            x = abs(x - int(self.Properties["sim/west"])) * (self.Raster[0].width - 1) # -1 from widht required, because pixels cover also boundaries of dsf lon/lat grid
-            y = abs(y - int(self.Properties["sim/south"])) * (self.Raster[0].height - 1) # -1 from height required, because pixels cover also boundaries of dsf lon/lat grid
-            if self.Raster[0].flags & 4: #when bit 4 is set, then the data is stored post-centric, meaning the center of the pixel lies on the dsf-boundaries, rounding should apply
-                x = round(x, 0)
-                y = round(y, 0)
-            x = int(x) #for point-centric, the outer edges of the pixels lie on the boundary of dsf, and just cutting to int should be right
-            y = int(y)
-            return self.Raster[0].data[x][y]   
+        if "sim/west" not in self.Properties or len(self.DefRasters) == 0 or len(self.Raster) == 0:
+            if "sim/west" not in self.Properties:
+                self._log_.error("Cannot get elevation as properties like sim/west not defined!!!")
+            else: #No raster defined, use elevation from trias  #### NEW 7 ####
+                self._log_.error("getElevations: dsf includes no raster, elevations returned are None")
+            if zs is None:
+                return None
+            return [z if int(z) != -32768 else None for z in zs] #elevations of vertices can still be returned
+        if self.DefRasters[0] != "elevation": # THIS VERSION IS ASSUMING THAT ELEVATION RASTER IS THE FIRST RASTER-LAYER (index 0)
+            self._log_.warning("Warning: The first raster layer is not called elevation, but used to determine elevation!")
+        R = self.Raster[0]
+        west, east = int(self.Properties["sim/west"]), int(self.Properties["sim/east"])
+        south, north = int(self.Properties["sim/south"]), int(self.Properties["sim/north"])
+        postcentric = R.flags & 4 #when bit 4 is set, then the data is stored post-centric, meaning the center of the pixel lies on the dsf-boundaries
+        if NUMPYINSTALLED and len(xs) > 8: #few points like single points of getVertexElevation are faster without arrays
+            x, y = np.asarray(xs, np.float64), np.asarray(ys, np.float64)
+            inside = (west <= x) & (x <= east) & (south <= y) & (y <= north)
+            if not inside.all():
+                self._log_.error("Cannot get elevation for {} of {} points not within boundaries!!!".format(len(x) - np.count_nonzero(inside), len(x)))
+                x, y = np.where(inside, x, west), np.where(inside, y, south) #any pixel is taken for these points, their elevation is set to nan below
+            if method == "nearest" or R.width < 2 or R.height < 2:
+                x = np.abs(x - west) * (R.width - 1) # -1 from widht required, because pixels cover also boundaries of dsf lon/lat grid
+                y = np.abs(y - south) * (R.height - 1)
+                if postcentric: #rounding should apply
+                    x, y = np.rint(x), np.rint(y)
+                x = np.clip(x, 0, R.width - 1).astype(np.int64) #for point-centric, the outer edges of the pixels lie on the boundary of dsf, and just cutting to int should be right
+                y = np.clip(y, 0, R.height - 1).astype(np.int64)
+                elev = self._rasterValues_(R, x, y)
+            else: #bilinear between the four pixel centers around each point
+                if postcentric:
+                    x = np.abs(x - west) * (R.width - 1)
+                    y = np.abs(y - south) * (R.height - 1)
+                else: #pixel centers lie half a pixel inside the dsf boundaries
+                    x = np.clip(np.abs(x - west) * R.width - 0.5, 0, R.width - 1)
+                    y = np.clip(np.abs(y - south) * R.height - 0.5, 0, R.height - 1)
+                x0 = np.clip(np.floor(x), 0, R.width - 2).astype(np.int64)
+                y0 = np.clip(np.floor(y), 0, R.height - 2).astype(np.int64)
+                fx, fy = np.clip(x - x0, 0, 1), np.clip(y - y0, 0, 1)
+                elev = (self._rasterValues_(R, x0, y0) * (1 - fx) + self._rasterValues_(R, x0 + 1, y0) * fx) * (1 - fy) + \
+                       (self._rasterValues_(R, x0, y0 + 1) * (1 - fx) + self._rasterValues_(R, x0 + 1, y0 + 1) * fx) * fy
+            elev = np.where(inside, elev, np.nan)
+            if zs is not None:
+                z = np.asarray(zs, np.float64)
+                elev = np.where(np.trunc(z) != -32768, z, elev)
+            return [None if e != e else e for e in elev.tolist()] #same list with None for points out of bounds as without arrays
+        elevs = []
+        outside = 0
+        for i in range(len(xs)):
+            if zs is not None and int(zs[i]) != -32768:
+                elevs.append(zs[i])
+                continue
+            if not (west <= xs[i] <= east and south <= ys[i] <= north):
+                outside += 1
+                elevs.append(None)
+                continue
+            if method == "nearest" or R.width < 2 or R.height < 2:
+                x = abs(xs[i] - west) * (R.width - 1)
+                y = abs(ys[i] - south) * (R.height - 1)
+                if postcentric:
+                    x, y = round(x, 0), round(y, 0)
+                elevs.append(R.data[min(int(x), R.width - 1)][min(int(y), R.height - 1)])
+                continue
+            if postcentric:
+                x = abs(xs[i] - west) * (R.width - 1)
+                y = abs(ys[i] - south) * (R.height - 1)
+            else:
+                x = min(max(abs(xs[i] - west) * R.width - 0.5, 0), R.width - 1)
+                y = min(max(abs(ys[i] - south) * R.height - 0.5, 0), R.height - 1)
+            x0, y0 = min(int(floor(x)), R.width - 2), min(int(floor(y)), R.height - 2)
+            fx, fy = min(x - x0, 1), min(y - y0, 1)
+            elevs.append((R.data[x0][y0] * (1 - fx) + R.data[x0 + 1][y0] * fx) * (1 - fy) + (R.data[x0][y0 + 1] * (1 - fx) + R.data[x0 + 1][y0 + 1] * fx) * fy)
+        if outside:
+            self._log_.error("Cannot get elevation for {} of {} points not within boundaries!!!".format(outside, len(xs)))
+        return elevs
+
+
+    def _rasterValues_(self, R, x, y): #returns float array of values of raster R at pixel index arrays x, y; raw values of raster read with numpy are scaled only at these pixels
+        if R._data is None and R._raw is not None:
+            return R._raw[y, x].astype(np.float64) * R.scale + R.offset
+        if isinstance(R.data, np.ndarray):
+            return R.data[x, y].astype(np.float64)
+        return np.array([R.data[i][j] for i, j in zip(x.tolist(), y.tolist())], np.float64)
+
+
+    def getPoolBounds(self): #returns for each 16 bit pool [lonW, lonE, latS, latN] that its vertices lie in or None if unknown; bounds are taken from scalings, so pools of lazy read are not decoded
+        bounds = []
+        scaledPools = self._scaledPools_(self.V, self.Scalings)
+        for p in range(len(self.V)):
+            if p >= scaledPools or len(self.Scalings[p]) < 2 or float(self.Scalings[p][0][0]) == 0.0 or float(self.Scalings[p][1][0]) == 0.0:
+                bounds.append(None) #coordinates not scaled, so bounds unknown
+                continue
+            (xm, xo), (ym, yo) = self.Scalings[p][0:2] #scaled coordinates of pool lie between offset and offset + multiplier
+            e = 1e-9 #tolerance for rounding when scaling
+            bounds.append([min(xo, xo + xm) - e, max(xo, xo + xm) + e, min(yo, yo + ym) - e, max(yo, yo + ym) + e])
+        return bounds
 
 
     def getPolys(self, type): #returns all polygons of one type (numbered as in DefPolys) in a list and for each poly parameter following all vertices as reference [poolId, index]
@@ -981,38 +2439,116 @@ class XPLNEDSF:
                     yield(c)
         
                     
-    def read(self, file):  
-        self.__init__("_keep_logger_","_keep_statusfunction_") #make sure all values are initialized again in case additional read
+    def _releaseMap_(self): #copies all atoms and raster values still referring to memory map and closes the map
+        if self._Map_ is None:
+            return
+        self._log_.info("Releasing memory map of file {}.".format(self._MapFile_))
+        copies = {} #copied atoms by id of their view, as the same view can be in read and in current atoms
+        def copyAtom(a):
+            if not isinstance(a, memoryview):
+                return a
+            if id(a) not in copies:
+                copies[id(a)] = bytes(a)
+            return copies[id(a)]
+        for atoms in [self._ReadAtoms_, self._Atoms_]:
+            for k in atoms:
+                if k in self._MultiAtoms_:
+                    atoms[k] = [copyAtom(a) for a in atoms[k]]
+                else:
+                    atoms[k] = copyAtom(atoms[k])
+        for V in [self.V, self.V32]:
+            if isinstance(V, XPLNEpools):
+                V._atoms = [copyAtom(a) for a in V._atoms]
+        for R in self.Raster:
+            if R._raw is not None:
+                R._raw = R._raw.copy()
+            R._atom = copyAtom(R._atom)
+        try:
+            self._Map_.close()
+        except BufferError: #still memoryviews on the map outside, map will be closed when they are released
+            pass
+        self._Map_ = None
+        self._MapFile_ = None
+
+
+    def read(self, file, memorymap = False, lazy = False, meshonly = False, cache = None, workers = 0): #with memorymap uncompressed files are mapped and atoms are just memoryviews on the map; with lazy pools and rasters are only decoded when accessed
+        #with meshonly only patches are extracted from commands, objects, polygons and networks with first access; with cache (XPLNEcache) decoded values are taken from or stored to cache
+        #with workers > 1 pools (and without numpy rasters) are decoded in parallel in that many processes
+        self._releaseMap_()
+        self.__init__("_keep_logger_","_keep_statusfunction_","_keep_metricsfunction_") #make sure all values are initialized again in case additional read
+        self._startMetrics_("read", file)
         if not path.isfile(file):
             self._log_.error("File does not exist!".format(file))
             return 1
+        if cache is not None and not NUMPYINSTALLED:
+            self._log_.warning("Cache for dsf files requires numpy, file is read without cache.")
+            cache = None
+        if cache is not None:
+            self._Cached_ = cache.load(file)
+            self._log_.info("Decoded values of file {} in cache.".format("found" if self._Cached_ is not None else "not"))
+        start = perf_counter()
+        if self._Cached_ is not None and "atomids" in self._Cached_: #decompressed atoms of 7ZIP archive
+            self._cachedAtoms_()
+        else:
+            try:
+                err = self._readAtoms_(file, memorymap)
+            except (lzma.LZMAError if LZMAINSTALLED else EOFError, EOFError, StructError) as err: #truncated or corrupt 7ZIP archive or file is only found while decompressing atoms
+                self._log_.error("File is truncated or corrupt! Could not read atoms: {}".format(err))
+                return 2 if self._Archive_ else 3
+            if err:
+                return err
+        scantime = perf_counter() - start - self.Metrics["phases"]["decompression"]["time"] #time for decompression is measured separately
+        self._addMetrics_("atom scan", scantime, self._progress_[2], sum(len(a) if k in self._MultiAtoms_ else 1 for k, a in self._Atoms_.items()))
+        self._log_.info("Finished pure file reading.")
+        if workers > 1 and not lazy: #with lazy nothing to be decoded while reading
+            with ProcessPoolExecutor(workers) as self._Executor_:
+                self._Workers_ = workers
+                self._unpackAtoms_(lazy, meshonly)
+            self._Executor_ = None
+        else:
+            self._unpackAtoms_(lazy, meshonly)
+        self._storeReadState_()
+        if cache is not None and self._Cached_ is None:
+            self._Cached_ = self._cacheArrays_()
+            cache.store(file, self._Cached_)
+        if cache is not None: #name is kept, as key of cache file changes when read file is overwritten
+            self._CacheEntry_ = (cache, cache._filename_(file), set(k for k in self._Cached_ if k.startswith("pool")))
+        self._Cached_ = None #arrays of pools not decoded yet are kept by XPLNEpools
+        self._finishMetrics_(stat(file).st_size)
+        return 0 #file successfull read
+
+
+    def _readAtoms_(self, file, memorymap = False): #reads all atoms of file to _Atoms_; returns error code of read
         flength = stat(file).st_size #length of dsf-file   
         self._progress_ = [0, 0, flength] #initilize progress start for reading
         with open(file, "rb") as f:    ##Open Tile as binary fily for reading
             self._log_.info("Opened file {} with {} bytes.".format(file, flength))
             start = f.read(12)
+            if memorymap and flength > 12 and not start.startswith(b'7z\xBC\xAF\x27\x1C'):
+                self._Map_ = mmap(f.fileno(), 0, access=ACCESS_READ)
+                self._MapFile_ = file
+                f = XPLNEviewReader(memoryview(self._Map_))
+                start = f.read(12).tobytes()
+                self._log_.info("File is memory mapped, atoms are not copied.")
             if start.startswith(b'7z\xBC\xAF\x27\x1C'):
-                if PY7ZLIBINSTALLED:
-                    f.seek(0)
-                    archive = py7zlib.Archive7z(f)
-                    filedata = archive.getmember(archive.getnames()[0]).read()
-                    self._log_.info("File is 7Zip archive. Extracted and read file {} from archive with decompressed length {}.".format(archive.getnames()[0], len(filedata)))
-                    f.close()
-                    f = BytesIO(filedata)
-                    self._progress_ = [0, 0, len(filedata)] #set progress maximum to decompressed length
-                    flength = len(filedata) #also update to decompressed length
-                    start = f.read(12)
-                else:
-                    self._log_.error("File is 7Zip encoded! py7zlib not installed to decode.")
+                try:
+                    f = XPLNE7zStream(f) #atoms are read while decompressing
+                except (ValueError, IndexError, lzma.LZMAError if LZMAINSTALLED else ValueError) as err:
+                    self._log_.error("File is 7Zip encoded! Could not decode it: {}".format(err))
                     return 2
+                self._log_.info("File is 7Zip archive. Reading file {} from archive with decompressed length {}.".format(f.name, f.size))
+                self._Archive_ = True
+                self._progress_ = [0, 0, f.size] #set progress maximum to decompressed length
+                flength = f.size #also update to decompressed length
+                start = f.read(12)
             identifier, version = unpack('<8sI',start)
             if identifier.decode("utf-8") != "XPLNEDSF" or version != 1:
-                self._log_.error("File is no X-Plane dsf-file Version 1 !!!")  
-                return 3            
-            while f.tell() < flength - 16: #read chunks until reaching last 16 bytes hash value
-                bytes = f.read(8)
-                atomID, atomLength = unpack('<4sI',bytes)        
-                atomID = atomID.decode("utf-8")
+                self._log_.error("File is no X-Plane dsf-file Version 1 !!!")
+                return 3
+            index = None if self._Archive_ else _loadDSFindex(file)
+            if index is not None:
+                self._log_.info("Atoms are read at their offsets from sidecar index {}.".format(file + DSFINDEXEXTENSION))
+            for atomID, atomLength in self._atomHeaders_(f, flength, index):
                 if atomID in self._AtomStructure_.keys():
                     if self._DEBUG_: self._log_.debug("Reading top-level atom {} with length of {} bytes.".format(atomID, atomLength))
                 else:
@@ -1032,48 +2568,148 @@ class XPLNEDSF:
                     self._log_.warning("Jumping over unknown Atom ID (reversed): {} with length {}!!".format(atomID, atomLength))
                     bytes = f.read(atomLength-8)
                     #return 4
+            if index is not None:
+                f.seek(flength - 16)
             self.FileHash = f.read(16)
+            if self._Archive_:
+                self._addMetrics_("decompression", f.decompressTime, f.size, f.decompressCount)
+            if isinstance(self.FileHash, memoryview):
+                self.FileHash = self.FileHash.tobytes()
             if self._DEBUG_: self._log_.debug("Reached FOOTER with Hash-Value: {}".format(self.FileHash))
-        self._log_.info("Finished pure file reading.")
-        self._unpackAtoms_()
-        return 0 #file successfull read
+        return 0
 
-    
-    def write(self, file): #writes data to dsf file with according file-name
+
+    def _atomHeaders_(self, f, flength, index = None): #yields id and length of each atom in f and leaves f at start of its data; with index (see getDSFindex) f is set to offsets from index instead of scanning all headers
+        if index is not None:
+            for atomID, offset, atomLength, atomHash in index["atoms"]:
+                f.seek(offset + 8)
+                yield atomID, atomLength
+            return
+        while f.tell() < flength - 16: #read chunks until reaching last 16 bytes hash value
+            atomID, atomLength = unpack('<4sI', f.read(8))
+            yield atomID.decode("utf-8"), atomLength
+
+
+    def _cachedAtoms_(self): #sets _Atoms_ and FileHash to decompressed atoms of 7ZIP archive from cache
+        data = memoryview(self._Cached_["atoms"])
+        self._progress_ = [0, 0, len(data)]
+        self._Archive_ = True
+        offset = 0
+        for atomID, atomLength in zip(self._Cached_["atomids"].tolist(), self._Cached_["atomlengths"].tolist()):
+            if atomLength < 0: #atom of atoms
+                self._Atoms_[atomID] = []
+            elif atomID in self._MultiAtoms_:
+                self._Atoms_.setdefault(atomID, []).append(data[offset : offset + atomLength])
+            else:
+                self._Atoms_[atomID] = data[offset : offset + atomLength]
+            offset += max(atomLength, 0)
+        self.FileHash = self._Cached_["filehash"].tobytes()
+        self._updateProgress_(len(data))
+        self._log_.info("Atoms of 7Zip archive taken from cache.")
+
+
+    def _cacheArrays_(self): #returns dictionary of arrays with decoded values to be stored in XPLNEcache
+        arrays = {}
+        if self._Archive_: #decompressed atoms are stored as well
+            ids, lengths, data = [], [], []
+            for k in self._Atoms_:
+                for a in (self._Atoms_[k] if k in self._MultiAtoms_ else [self._Atoms_[k]]):
+                    ids.append(k)
+                    lengths.append(-1 if k in self._AtomOfAtoms_ else len(a))
+                    if k not in self._AtomOfAtoms_:
+                        data.append(a)
+            arrays["atomids"] = np.array(ids)
+            arrays["atomlengths"] = np.array(lengths, np.int64)
+            arrays["atoms"] = np.frombuffer(b''.join(data), np.uint8)
+            arrays["filehash"] = np.frombuffer(self.FileHash, np.uint8)
+        for a, k in [(self._CMDStore_.ids, "cmdids"), (self._CMDStore_.starts, "cmdstarts"), (self._CMDStore_.values, "cmdvalues"), (self._CMDStore_.positions, "cmdpositions")]:
+            arrays[k] = np.frombuffer(a, "u{}".format(a.itemsize)) if len(a) else np.zeros(0, "u{}".format(a.itemsize))
+        for bit, VArrays in [(16, self.VArrays), (32, self.V32Arrays)]:
+            for p, pool in enumerate(VArrays):
+                if pool is not None: #pools of lazy read are only stored if decoded
+                    arrays["pool{}_{}".format(bit, p)] = pool
+        return arrays
+
+
+    def _updateCache_(self): #adds pools decoded since read (e.g. with lazy read) to cache entry of read file
+        if self._CacheEntry_ is None:
+            return
+        cache, name, keys = self._CacheEntry_
+        arrays = {}
+        for bit, VArrays in [(16, self.VArrays), (32, self.V32Arrays)]:
+            for p, pool in enumerate(VArrays):
+                if pool is not None and "pool{}_{}".format(bit, p) not in keys:
+                    arrays["pool{}_{}".format(bit, p)] = pool
+        if arrays:
+            self._log_.info("Adding {} decoded pools to cache entry of read file.".format(len(arrays)))
+            cache._update_(name, arrays)
+            keys.update(arrays)
+
+
+    def _writeAtom_(self, writer, k): #writes atom(s) with id k with their header to writer
+        if k in self._AtomOfAtoms_:
+            if self._DEBUG_: self._log_.debug("Writing atom of atoms {} with length {} bytes.".format(k, self._TopAtomLength_(k)))
+            writer.write(pack('<4sI', k.encode("utf-8"), self._TopAtomLength_(k))) # for AtomsOfAtoms just store header (id + length including sub-atoms)
+            return
+        for a in (self._Atoms_[k] if k in self._MultiAtoms_ else [self._Atoms_[k]]):
+            if self._DEBUG_: self._log_.debug("Writing atom {} with length {} bytes.".format(k, len(a) + 8))
+            writer.write(pack('<4sI', k.encode("utf-8"), len(a) + 8)) # add 8 for atom header length (id+length)
+            writer.write(a) #header and atom are written one after the other without concatenating them
+            self._updateProgress_(len(a) + 8)
+
+
+    def _encodeAtom_(self, atomID, encoders): #runs encoders of top-level atom and adds their time and length of its encoded atoms to metrics
+        start = perf_counter()
+        for encode in encoders:
+            encode()
+        self._addMetrics_("encode", perf_counter() - start, *self._atomBytes_(*(self._AtomStructure_[atomID] or [atomID])))
+
+
+    def write(self, file, index = False): #writes data to dsf file with according file-name; with index also sidecar index of atoms is written (see getDSFindex)
+        #atoms are encoded per top-level atom in file order, while the atoms encoded before are written and hashed in background
+        self._updateCache_() #before file might be overwritten; not part of write metrics
+        self._startMetrics_("write", file)
         self._progress_[0] = 0
         self._progress_[1] = 0 #keep original file length as goal to reach in progress[2]
-        self._packAtoms_() #first write values of Atom strings that below will written to file   
+        if self._Map_ is not None and path.exists(file) and path.samefile(file, self._MapFile_):
+            self._releaseMap_() #memory mapped file will be overwritten, so atoms need to be copied before
+        self._log_.info("Preparing data to be written to file.")
+        self._log_.info("This version does not yet support nested polygons (Command ID 14)!")
+        encoders = self._atomEncoders_()
+        parent = {sub_id : id for id in self._AtomStructure_ for sub_id in self._AtomStructure_[id]}
+        keys = list(self._Atoms_.keys()) #atoms added while encoding are written at the end
         m = md5() #m will at the end contain the new md5 checksum of all data in file
         with open(file, "w+b") as f:    ##Open Tile as binary fily for writing and allow overwriting of existing file
             self._log_.info("Write now DSF in file: {}".format(file)  )
-            s = pack('<8sI', 'XPLNEDSF'.encode("utf-8"),1)  #file header
-            m.update(s)
-            f.write(s)
-            for k in self._Atoms_.keys():
-                if k in self._AtomOfAtoms_:
-                    if self._DEBUG_: self._log_.debug("Writing atom of atoms {} with length {} bytes.".format(k, self._TopAtomLength_(k)))
-                    s = pack('<4sI', k.encode("utf-8"), self._TopAtomLength_(k)) # for AtomsOfAtoms just store header (id + length including sub-atoms)
-                    m.update(s)
-                    f.write(s)
-                elif k in self._MultiAtoms_:
-                    for a in self._Atoms_[k]:
-                        if self._DEBUG_: self._log_.debug("Writing multi atom {} with length {} bytes.".format(k, len(a) + 8))
-                        s = pack('<4sI', k.encode("utf-8"), len(a) + 8) + a # add 8 for atom header length (id+length)
-                        m.update(s)
-                        f.write(s)
-                        self._updateProgress_(len(s))
-                else: #just single instance atom with plane data
-                        if k in self._AtomStructure_.keys():
-                            if self._DEBUG_: self._log_.debug("Writing top-level atom {} with length {} bytes.".format(k, len(self._Atoms_[k]) + 8))
-                        else:
-                            if self._DEBUG_: self._log_.debug("Writing single atom {} with length {} bytes.".format(k, len(self._Atoms_[k]) + 8))
-                        s = pack('<4sI', k.encode("utf-8"), len(self._Atoms_[k]) + 8) + self._Atoms_[k] # add 8 for atom header length (id+length)
-                        m.update(s)
-                        f.write(s) 
-                        self._updateProgress_(len(s))
+            writer = XPLNEfileWriter(f, m)
+            try:
+                writer.write(pack('<8sI', 'XPLNEDSF'.encode("utf-8"),1))  #file header
+                k = 0
+                while True:
+                    if k == len(keys):
+                        keys.extend(a for a in self._Atoms_ if a not in keys)
+                    if k < len(keys):
+                        top = parent.get(keys[k], keys[k])
+                        if top in encoders: #values of top-level atom are encoded before its first atom is written
+                            self._encodeAtom_(top, encoders.pop(top))
+                        self._writeAtom_(writer, keys[k])
+                        k += 1
+                    elif encoders: #values of top-level atoms not read are encoded, their new atoms are then written at the end
+                        top = next(iter(encoders))
+                        self._encodeAtom_(top, encoders.pop(top))
+                    else:
+                        break
+            finally:
+                writer.close()
+            self._addMetrics_("write", writer.time, writer.bytes, writer.count)
             if self._DEBUG_: self._log_.debug("New md5 value appended to file is: {}".format(m.digest()))
             f.write(m.digest())
         self._log_.info("Finished writing dsf-file.")
+        if index:
+            err, idx = getDSFindex(file, True)
+            if err:
+                self._log_.error(idx)
+        self._finishMetrics_(writer.bytes + 16) #written bytes including md5 footer
         return 0
 
 
@@ -1124,20 +2760,27 @@ def getDSFproperties(file):
     """
     if not path.isfile(file):
         return -1, "ERROR in getDSFproperties: File {} does not exist!".format(file)
+    index = _loadDSFindex(file)
+    if index is not None:  # with sidecar index properties atom is read directly at its offset
+        for atomID, offset, atomLength, atomHash in index["atoms"]:
+            if atomID == "PORP":
+                with open(file, "rb") as f:
+                    f.seek(offset + 8)
+                    x = f.read(atomLength - 8).split(b'\x00')
+                props_dict = dict()
+                for i in range(0, len(x)-1, 2):
+                    props_dict[x[i].decode("utf-8")]=x[i+1].decode("utf-8")
+                return 0, props_dict  # 0 for no error
     flength = stat(file).st_size  # length of dsf-file
     with open(file, "rb") as f:  # Open Tile as binary file for reading
         start = f.read(12)
         if start.startswith(b'7z\xBC\xAF\x27\x1C'):
-            if PY7ZLIBINSTALLED:
-                f.seek(0)
-                archive = py7zlib.Archive7z(f)
-                filedata = archive.getmember(archive.getnames()[0]).read()
-                f.close()
-                f = BytesIO(filedata)
-                flength = len(filedata)  # also update to decompressed length
-                start = f.read(12)
-            else:
-                return -2, "ERROR in getDSFproperties: File {} is 7Zip encoded! py7zlib not installed to decode.".format(file)
+            try:
+                f = XPLNE7zStream(f)  # decompression stops when properties are read
+            except (ValueError, IndexError, lzma.LZMAError if LZMAINSTALLED else ValueError) as err:
+                return -2, "ERROR in getDSFproperties: File {} is 7Zip encoded! Could not decode it: {}".format(file, err)
+            flength = f.size  # also update to decompressed length
+            start = f.read(12)
         identifier, version = unpack('<8sI',start)
         if identifier.decode("utf-8") != "XPLNEDSF" or version != 1:
             return -3, "ERROR in getDSFproperties: File {} is no X-Plane dsf-file Version 1!".format(file)
@@ -1165,3 +2808,92 @@ def getDSFproperties(file):
             else:
                 bytes = f.read(atomLength-8)  # Continue reading, Length includes 8 bytes header
     return -4, "ERROR in getDSFproperties: File {} does not have an HEADER/PROPERTIES atom; no vaild dsf file!".format(file)
+
+
+DSFINDEXEXTENSION = ".idx"  # sidecar index of dsf file <file> is stored in <file>.idx
+
+
+def _loadDSFindex(file): #returns index of dsf file from its sidecar file <file>.idx if it fits to the dsf file (see getDSFindex), otherwise None
+    indexfile = file + DSFINDEXEXTENSION
+    if not path.isfile(indexfile):
+        return None
+    fstat = stat(file)
+    try:
+        with open(file, "rb") as f:
+            f.seek(-16, 2)
+            footer = f.read(16).hex()
+        with open(indexfile, "r") as i:
+            index = loads(i.read())
+        if index["version"] == 1 and index["size"] == fstat.st_size and index["mtime"] == fstat.st_mtime_ns and index["md5"] == footer:
+            return index
+    except (ValueError, KeyError, TypeError, OSError):  # index not readable is treated as stale
+        pass
+    return None
+
+
+def getDSFindex(file, create = False):
+    """
+    This function returns error code and the index of all atoms of an uncompressed dsf file as dict or error-string in case error != 0.
+    The index has the size, modification time and md5 footer of the dsf file and under "atoms" a list with [id, offset, length, md5]
+    of each atom, where offset is the position of its header and length includes header (atoms of atoms have md5 None).
+    Index is taken from sidecar file <file>.idx if it fits to the dsf file; otherwise it is built by scanning the atoms
+    and the sidecar file is (re-)written if it already existed or create is True.
+    """
+    if not path.isfile(file):
+        return -1, "ERROR in getDSFindex: File {} does not exist!".format(file)
+    index = _loadDSFindex(file)
+    if index is not None:
+        return 0, index
+    fstat = stat(file)
+    indexfile = file + DSFINDEXEXTENSION
+    if path.isfile(indexfile):  # stale index is rebuilt
+        create = True
+    with open(file, "rb") as f:
+        if fstat.st_size >= 28:
+            f.seek(-16, 2)
+            footer = f.read(16).hex()
+        else:
+            footer = None
+        f.seek(0)
+        start = f.read(12)
+        if start.startswith(b'7z\xBC\xAF\x27\x1C'):
+            return -2, "ERROR in getDSFindex: File {} is 7Zip encoded! Atoms can not be accessed directly.".format(file)
+        if len(start) < 12 or unpack('<8sI', start) != (b"XPLNEDSF", 1):
+            return -3, "ERROR in getDSFindex: File {} is no X-Plane dsf-file Version 1!".format(file)
+        atoms = []
+        while f.tell() < fstat.st_size - 16:  # read chunks until reaching last 16 bytes hash value
+            offset = f.tell()
+            atomID, atomLength = unpack('<4sI', f.read(8))
+            atomID = atomID.decode("utf-8")
+            if atomLength < 8 or offset + atomLength > fstat.st_size - 16:
+                return -4, "ERROR in getDSFindex: File {} has atom {} with invalid length {}!".format(file, atomID, atomLength)
+            if atomID in ('DAEH', 'NFED', 'DOEG', 'SMED'):  # atoms of atoms, sub-atoms follow
+                atoms.append([atomID, offset, atomLength, None])
+            else:
+                atoms.append([atomID, offset, atomLength, md5(f.read(atomLength - 8)).hexdigest()])
+    index = {"version": 1, "size": fstat.st_size, "mtime": fstat.st_mtime_ns, "md5": footer, "atoms": atoms}
+    if create:
+        try:
+            with open(indexfile, "w") as i:
+                i.write(dumps(index))
+        except OSError as err:
+            return -5, "ERROR in getDSFindex: Index file {} could not be written: {}".format(indexfile, err)
+    return 0, index
+
+
+def readDSFatom(file, atomID, number = 0):
+    """
+    This function returns error code and the bytes (without header) of atom with atomID (reversed as in file, e.g. "PORP"
+    for the properties) of a dsf file or error-string in case error != 0. For atoms like pools (LOOP) or rasters (DMED)
+    that exist several times, number selects which of them. Atom is read directly at its offset from the index of getDSFindex.
+    """
+    err, index = getDSFindex(file)
+    if err:
+        return err, index
+    found = [a for a in index["atoms"] if a[0] == atomID]
+    if number >= len(found):
+        return -6, "ERROR in readDSFatom: File {} has no atom {} number {}!".format(file, atomID, number)
+    atomID, offset, atomLength, atomHash = found[number]
+    with open(file, "rb") as f:
+        f.seek(offset + 8)
+        return 0, f.read(atomLength - 8)